@@ -0,0 +1,252 @@
+import datetime
+import math
+import os
+import random
+import zlib
+from argparse import ArgumentParser
+from typing import Iterable, List, NamedTuple, NoReturn, Optional
+
+from external_sort import parse_size
+
+LINES_PER_BATCH = 10_000
+ESTIMATED_LINE_SIZE = 220
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+URL_TEMPLATES = (
+    "/api/v2/banner/{id}",
+    "/api/v2/banner/{id}/statistic/?date_from={date}&date_to={date}",
+    "/api/v2/internal/banner/{id}/info",
+    "/api/v2/slot/{id}/groups",
+    "/api/v2/group/{id}/banners",
+    "/api/1/photogenic_banners/list/?server_name=WIN{id}",
+    "/api/1/campaigns/?id={id}",
+    "/export/appinstall_raw/{date}/",
+)
+USER_AGENTS = (
+    "Lynx/2.8.8dev.9 libwww-FM/2.14 SSL-MM/1.4.1 GNUTLS/2.10.5",
+    "Python-urllib/2.7",
+    "Slotovod",
+    "Mozilla/5.0 (Windows NT 6.1; WOW64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/59.0.3071.115 Safari/537.36",
+    "-",
+)
+STATUSES = ("200",) * 18 + ("302", "404")
+
+
+class LogGeneratorSettings(NamedTuple):
+
+    """
+    Class with settings of synthetic nginx log such as:
+    - size: approximate size of uncompressed log in bytes, used if num_lines is None
+    - num_lines: exact number of lines
+    - num_urls: number of unique urls (url popularity follows Zipf law)
+    - latency_median: median of request time in seconds
+    - latency_sigma: sigma of log-normal distribution of request time
+    - malformed_ratio: share of lines that analyzer fails to parse
+    - compress: write gzip log instead of plain one
+    - gzip_member_size: uncompressed size of gzip members, None for single member file
+    - date: date of log, used in its name and timestamps
+    - seed: seed of random generator, the same settings and seed give the same log
+    """
+
+    size: int = 100 * 1024 * 1024
+    num_lines: Optional[int] = None
+    num_urls: int = 10_000
+    latency_median: float = 0.15
+    latency_sigma: float = 1.0
+    malformed_ratio: float = 0.001
+    compress: bool = False
+    gzip_member_size: Optional[int] = None
+    date: datetime.date = datetime.date(year=2017, month=6, day=30)
+    seed: int = 0
+
+
+def generate_log_name(output_dir: str, settings: LogGeneratorSettings) -> str:
+
+    """
+    Generates name of log that analyzer can find in LOG_DIR
+    :param output_dir: directory for log
+    :param settings: log settings
+    :return: path to log
+    """
+
+    extension = "gz" if settings.compress else "log"
+
+    return os.path.join(output_dir, f"nginx-access-ui.log-{settings.date.strftime('%Y%m%d')}.{extension}")
+
+
+def generate_urls(rnd: random.Random, settings: LogGeneratorSettings) -> List[str]:
+
+    """
+    Generates unique urls from templates of real API
+    :param rnd: random generator
+    :param settings: log settings
+    :return: list of unique urls
+    """
+
+    date = settings.date.isoformat()
+    urls = set()
+    while len(urls) < settings.num_urls:
+        template = rnd.choice(URL_TEMPLATES)
+        urls.add(template.format(id=rnd.randint(1, 10 * settings.num_urls + 100), date=date))
+
+    return sorted(urls)
+
+
+def generate_log_lines(settings: LogGeneratorSettings) -> Iterable[str]:
+
+    """
+    Generates batches of log lines in format of ui nginx log (ui_short with request time at the end).
+    Lines are generated in batches, so that random choices and string formatting are done in bulk
+    :param settings: log settings
+    :return: generator of batches of lines joined in one string
+    """
+
+    rnd = random.Random(settings.seed)
+    urls = generate_urls(rnd=rnd, settings=settings)
+    cum_weights = list()
+    total_weight = 0.0
+    for rank in range(1, len(urls) + 1):
+        total_weight += 1 / rank
+        cum_weights.append(total_weight)
+
+    expected_lines = settings.num_lines or max(settings.size // ESTIMATED_LINE_SIZE, 1)
+    seconds_per_line = 24 * 60 * 60 / expected_lines
+    day_start = datetime.datetime.combine(settings.date, datetime.time())
+    latency_mu = math.log(settings.latency_median)
+
+    num_lines = 0
+    size = 0
+    while True:
+        if settings.num_lines is not None:
+            batch_size = min(LINES_PER_BATCH, settings.num_lines - num_lines)
+        else:
+            batch_size = LINES_PER_BATCH if size < settings.size else 0
+        if batch_size <= 0:
+            break
+
+        batch_urls = rnd.choices(urls, cum_weights=cum_weights, k=batch_size)
+        batch_agents = rnd.choices(USER_AGENTS, k=batch_size)
+        batch_statuses = rnd.choices(STATUSES, k=batch_size)
+        lines = list()
+        last_second = None
+        timestamp = None
+        for line_number, (url, user_agent, status) in enumerate(
+                zip(batch_urls, batch_agents, batch_statuses),
+                start=num_lines
+        ):
+            second = int(line_number * seconds_per_line)
+            if second != last_second:
+                last_second = second
+                timestamp = (day_start + datetime.timedelta(seconds=second)).strftime("%d/%b/%Y:%H:%M:%S +0300")
+            remote_addr = f"1.{rnd.randrange(256)}.{rnd.randrange(256)}.{rnd.randrange(256)}"
+            request_id = f"{1498697422 + second}-{rnd.getrandbits(32)}-4708-{line_number}"
+            if rnd.random() < settings.malformed_ratio:
+                lines.append(
+                    f'{remote_addr} -  - [{timestamp}] "-" 400 0 "-" "-" "-" "{request_id}" "-" -\n'
+                )
+                continue
+            request_time = rnd.lognormvariate(latency_mu, settings.latency_sigma)
+            lines.append(
+                f'{remote_addr} -  - [{timestamp}] "GET {url} HTTP/1.1" {status} {rnd.randrange(20000)} '
+                f'"-" "{user_agent}" "-" "{request_id}" "-" {request_time:.3f}\n'
+            )
+
+        batch = "".join(lines)
+        num_lines += batch_size
+        size += len(batch)
+        yield batch
+
+
+def write_log(output_dir: str, settings: LogGeneratorSettings) -> str:
+
+    """
+    Writes synthetic log into directory. Gzip log is written as concatenated members
+    of gzip_member_size bytes if it is set (like bgzip does), otherwise as single member
+    :param output_dir: directory for log
+    :param settings: log settings
+    :return: path to written log
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+    log_name = generate_log_name(output_dir=output_dir, settings=settings)
+    temporary_log_name = f"{log_name}.tmp"
+
+    with open(temporary_log_name, "wb") as log_file:
+        compressor = zlib.compressobj(wbits=GZIP_WBITS) if settings.compress else None
+        member_size = 0
+        for batch in generate_log_lines(settings=settings):
+            data = batch.encode("utf-8")
+            if compressor is None:
+                log_file.write(data)
+                continue
+            log_file.write(compressor.compress(data))
+            member_size += len(data)
+            if settings.gzip_member_size is not None and member_size >= settings.gzip_member_size:
+                log_file.write(compressor.flush())
+                compressor = zlib.compressobj(wbits=GZIP_WBITS)
+                member_size = 0
+        if compressor is not None:
+            log_file.write(compressor.flush())
+    os.replace(temporary_log_name, log_name)
+
+    return log_name
+
+
+def main() -> NoReturn:
+    defaults = LogGeneratorSettings()
+    parser = ArgumentParser(description="Generates synthetic nginx log for benchmarks")
+    parser.add_argument("--output-dir", default="./benchmark_logs", help="Directory for generated log")
+    parser.add_argument("--size", default="100MB", help="Approximate size of uncompressed log, e.g. 500MB, 10GB")
+    parser.add_argument("--lines", type=int, default=None, help="Exact number of lines, overrides --size")
+    parser.add_argument("--urls", type=int, default=defaults.num_urls, help="Number of unique urls")
+    parser.add_argument(
+        "--latency-median",
+        type=float,
+        default=defaults.latency_median,
+        help="Median of request time in seconds"
+    )
+    parser.add_argument(
+        "--latency-sigma",
+        type=float,
+        default=defaults.latency_sigma,
+        help="Sigma of log-normal distribution of request time"
+    )
+    parser.add_argument(
+        "--malformed-ratio",
+        type=float,
+        default=defaults.malformed_ratio,
+        help="Share of malformed lines"
+    )
+    parser.add_argument("--gzip", action="store_true", help="Write gzip log")
+    parser.add_argument(
+        "--gzip-member-size",
+        default=None,
+        help="Uncompressed size of gzip members, e.g. 64MB (single member by default)"
+    )
+    parser.add_argument(
+        "--date",
+        type=lambda date: datetime.datetime.strptime(date, "%Y%m%d").date(),
+        default=defaults.date,
+        help="Date of log in YYYYMMDD format"
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="Seed of random generator")
+    args = parser.parse_args()
+
+    settings = LogGeneratorSettings(
+        size=parse_size(args.size),
+        num_lines=args.lines,
+        num_urls=args.urls,
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        malformed_ratio=args.malformed_ratio,
+        compress=args.gzip,
+        gzip_member_size=parse_size(args.gzip_member_size) if args.gzip_member_size else None,
+        date=args.date,
+        seed=args.seed
+    )
+    print(write_log(output_dir=args.output_dir, settings=settings))
+
+
+if __name__ == "__main__":
+    main()
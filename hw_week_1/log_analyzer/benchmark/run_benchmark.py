@@ -0,0 +1,223 @@
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from argparse import ArgumentParser, FileType
+from typing import Callable, Dict, List, NoReturn, Optional, Tuple, Union
+
+from log_analyzer import CONFIG, LOG_FILE_PATTERN, Config, LatestLogFile, get_config_parameters
+from log_analyzer import accumulate_log_file, build_url_stats, find_latest_log, parse_log_file_by_config
+from log_analyzer import accumulate_heavy_hitters, accumulate_log_sample, accumulate_with_spilling
+from log_analyzer import iter_heavy_hitter_url_stats, iter_sampled_url_stats, iter_spilled_url_stats
+from log_analyzer import generate_report_name, render_report
+from metrics import get_peak_rss
+
+
+def get_commit() -> Optional[str]:
+
+    """
+    Gets commit of analyzer sources the benchmark is run for
+    :return: commit hash or None if sources are not in git repository
+    """
+
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            check=True,
+            text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(stage: Callable) -> Tuple[float, object]:
+
+    """
+    Measures wall time of stage
+    :param stage: function without parameters
+    :return: wall time in seconds and result of stage
+    """
+
+    started_at = time.perf_counter()
+    result = stage()
+
+    return time.perf_counter() - started_at, result
+
+
+def count_parsed_lines(cfg: Config, log_file: LatestLogFile) -> Tuple[int, int]:
+
+    """
+    Drains parser without aggregation
+    :param cfg: application config
+    :param log_file: file with logs to parse
+    :return: number of lines and number of failed lines
+    """
+
+    num_lines = num_failures = 0
+    # Parser yields time bucket or client address as the fourth item in some modes
+    for parsed_line in parse_log_file_by_config(log_file=log_file, cfg=cfg):
+        num_lines += 1
+        num_failures += parsed_line[2]
+
+    return num_lines, num_failures
+
+
+def get_aggregation_mode(cfg: Config, log_file: LatestLogFile) -> str:
+
+    """
+    Chooses aggregation of log the same way as normal run does
+    :param cfg: application config
+    :param log_file: file with logs to analyze
+    :return: "sample", "heavy_hitters", "spilling" or "in_memory"
+    """
+
+    if cfg.sample_rate is not None and log_file.extension != ".gz":
+        return "sample"
+    if cfg.heavy_hitters_capacity is not None:
+        return "heavy_hitters"
+    if cfg.memory_limit is not None:
+        return "spilling"
+
+    return "in_memory"
+
+
+def calculate_url_stats_by_mode(
+        cfg: Config,
+        log_file: LatestLogFile,
+        mode: str
+) -> List[Dict[str, Union[int, float, str, list]]]:
+
+    """
+    Parses and aggregates log with aggregation of mode
+    :param cfg: application config
+    :param log_file: file with logs to analyze
+    :param mode: aggregation mode from get_aggregation_mode
+    :return: url stats for report
+    """
+
+    if mode == "sample":
+        return list(iter_sampled_url_stats(sample=accumulate_log_sample(log_file=log_file, cfg=cfg), cfg=cfg))
+    if mode == "heavy_hitters":
+        return list(
+            iter_heavy_hitter_url_stats(heavy_hitters=accumulate_heavy_hitters(log_file=log_file, cfg=cfg), cfg=cfg)
+        )
+    if mode == "spilling":
+        return list(
+            iter_spilled_url_stats(spilled_url_stats=accumulate_with_spilling(log_file=log_file, cfg=cfg), cfg=cfg)
+        )
+
+    return build_url_stats(accumulator=accumulate_log_file(log_file=log_file, cfg=cfg), cfg=cfg)
+
+
+def run_benchmark(cfg: Config) -> Dict[str, Union[int, float, str, dict, None]]:
+
+    """
+    Runs stages of analyzer one after another for the latest log in LOG_DIR.
+    Stages are streamed into each other in normal run, here each of them is measured separately:
+    parse_log_file only parses lines (serially), calculate_url_stats parses and aggregates them
+    with WORKERS and aggregation mode (SAMPLE_RATE, HEAVY_HITTERS_CAPACITY, MEMORY_LIMIT) from config
+    the same way as normal run does, render_report writes report into REPORT_DIR
+    :param cfg: application config
+    :return: benchmark results
+    """
+
+    stage_times = dict()
+    stage_peak_rss = dict()
+
+    stage_times["find_latest_log"], log_file = measure(
+        lambda: find_latest_log(log_dir=cfg.log_dir, log_file_pattern=LOG_FILE_PATTERN)
+    )
+    stage_peak_rss["find_latest_log"] = get_peak_rss()
+    if log_file is None:
+        raise FileNotFoundError(f"No log file in {cfg.log_dir}")
+
+    stage_times["parse_log_file"], (num_lines, num_failures) = measure(
+        lambda: count_parsed_lines(cfg=cfg, log_file=log_file)
+    )
+    stage_peak_rss["parse_log_file"] = get_peak_rss()
+
+    mode = get_aggregation_mode(cfg=cfg, log_file=log_file)
+    stage_times["calculate_url_stats"], url_stats = measure(
+        lambda: calculate_url_stats_by_mode(cfg=cfg, log_file=log_file, mode=mode)
+    )
+    stage_peak_rss["calculate_url_stats"] = get_peak_rss()
+
+    report_name = generate_report_name(cfg=cfg, log_file=log_file)
+    stage_times["render_report"], _ = measure(
+        lambda: render_report(url_stats_for_json=url_stats, cfg=cfg, report_name=report_name)
+    )
+    stage_peak_rss["render_report"] = get_peak_rss()
+
+    log_size = os.path.getsize(log_file.path)
+    analysis_time = stage_times["calculate_url_stats"]
+
+    return {
+        "log_file": log_file.path,
+        "log_size": log_size,
+        "aggregation_mode": mode,
+        "lines": num_lines,
+        "failed_lines": num_failures,
+        "unique_urls": len(url_stats),
+        "stage_times": stage_times,
+        "stage_peak_rss": stage_peak_rss,
+        "lines_per_second": num_lines / analysis_time,
+        "parsed_lines_per_second": num_lines / stage_times["parse_log_file"],
+        "megabytes_per_second": log_size / analysis_time / 1024 / 1024,
+        "peak_rss": get_peak_rss()
+    }
+
+
+def main() -> NoReturn:
+    parser = ArgumentParser(description="Measures throughput of log analyzer stages")
+    parser.add_argument("--log-dir", required=True, help="Directory with log to analyze (see generate_log)")
+    parser.add_argument("--config", type=FileType("rt"), default=None, help="Path to analyzer config file")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes to parse log with")
+    parser.add_argument("--output", default=None, help="Path to JSON file with results")
+    args = parser.parse_args()
+
+    config_from_file = json.load(args.config) if args.config is not None else dict()
+    config_from_file["LOG_DIR"] = args.log_dir
+    if args.workers is not None:
+        config_from_file["WORKERS"] = args.workers
+
+    with tempfile.TemporaryDirectory() as report_dir:
+        template_dir = config_from_file.get("REPORT_DIR", CONFIG["REPORT_DIR"])
+        shutil.copy(os.path.join(template_dir, "report.html"), os.path.join(report_dir, "report.html"))
+        config_from_file["REPORT_DIR"] = report_dir
+        # Failed lines are logged as in normal run, the log is thrown away with reports
+        logging.basicConfig(
+            filename=os.path.join(report_dir, "log_analyzer.log"),
+            format="[%(asctime)s] %(levelname).1s %(message)s",
+            level=logging.INFO
+        )
+        cfg = get_config_parameters(default_config=CONFIG, config_from_file_=config_from_file)
+        results = run_benchmark(cfg=cfg)
+
+    results.update(
+        commit=get_commit(),
+        started_at=datetime.datetime.now().isoformat(timespec="seconds"),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        cpu_count=os.cpu_count(),
+        config=dict(
+            {key: value for key, value in cfg._asdict().items() if key not in ("report_dir", "log_file")},
+            url_normalization=cfg.url_normalization._asdict()
+        )
+    )
+
+    output = args.output or f"benchmark-{results['started_at'].replace(':', '')}.json"
+    with open(output, "wt", encoding="utf-8") as results_file:
+        json.dump(results, results_file, indent=2, default=str)
+    print(json.dumps({key: results[key] for key in ("stage_times", "lines_per_second", "peak_rss")}, indent=2))
+    print(f"Results are saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
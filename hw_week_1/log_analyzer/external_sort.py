@@ -0,0 +1,300 @@
+import heapq
+import os
+import re
+import struct
+import sys
+from array import array
+from typing import Iterable, Iterator, List, NoReturn, Tuple, Union
+
+# Run record: position of line, request time and length of url followed by url bytes
+RUN_RECORD_HEADER = struct.Struct("<qdI")
+# Approximate memory of buffered record besides url: tuple, position, request time and list item
+RUN_RECORD_OVERHEAD = 136
+# Approximate memory of buffered request time: float, list item with overallocation and pointer of sort
+DURATION_RECORD_OVERHEAD = 40
+# Number of runs merged at once, more runs are merged in several passes to bound open files and buffers
+MAX_MERGE_RUNS = 64
+MIN_RUN_BUFFER_SIZE = 64 * 1024
+MAX_RUN_BUFFER_SIZE = 1024 * 1024
+# Memory of analyzer besides buffered records: read buffers of log and runs, parser and merge state
+SPILL_HEADROOM = 8 * 1024 * 1024
+
+SIZE_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)\s*([KMGT]?)B?$", re.IGNORECASE)
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+RunRecord = Tuple[bytes, int, float]
+DURATION_SIZE = array("d").itemsize
+
+
+def parse_size(size: Union[int, str]) -> int:
+
+    """
+    Parses human readable size of memory or file
+    :param size: number of bytes or size like 512MB, 2G or 10GB
+    :return: size in bytes
+    """
+
+    if isinstance(size, int):
+        return size
+    size_matches = SIZE_PATTERN.match(size.strip())
+    if size_matches is None:
+        raise ValueError(f"Wrong size: {size}")
+
+    number, unit = size_matches.groups()
+
+    return int(float(number) * SIZE_UNITS[unit.upper()])
+
+
+def write_run(run_name: str, records: Iterable[RunRecord]) -> NoReturn:
+
+    """
+    Writes sorted records to run file, records may be a stream of merged runs
+    :param run_name: path to run file
+    :param records: (url, position, request time) records sorted by url and position
+    """
+
+    pack = RUN_RECORD_HEADER.pack
+    with open(run_name, "wb", buffering=MAX_RUN_BUFFER_SIZE) as run_file:
+        write = run_file.write
+        for url, position, duration in records:
+            write(pack(position, duration, len(url)))
+            write(url)
+
+
+def read_run(run_name: str, buffer_size: int) -> Iterator[RunRecord]:
+
+    """
+    Reads records of run file one by one
+    :param run_name: path to run file
+    :param buffer_size: size of read buffer
+    :return: generator of (url, position, request time) records in order of run
+    """
+
+    header_size = RUN_RECORD_HEADER.size
+    unpack = RUN_RECORD_HEADER.unpack
+    with open(run_name, "rb", buffering=buffer_size) as run_file:
+        read = run_file.read
+        while True:
+            header = read(header_size)
+            if not header:
+                return
+            position, duration, url_length = unpack(header)
+            yield read(url_length), position, duration
+
+
+def write_duration_run(run_name: str, durations: Iterable[float]) -> NoReturn:
+
+    """
+    Writes sorted request times to run file as doubles, request times may be a stream of merged runs
+    :param run_name: path to run file
+    :param durations: sorted request times
+    """
+
+    batch_length = MAX_RUN_BUFFER_SIZE // DURATION_SIZE
+    with open(run_name, "wb") as run_file:
+        batch = array("d")
+        for duration in durations:
+            batch.append(duration)
+            if len(batch) == batch_length:
+                batch.tofile(run_file)
+                batch = array("d")
+        batch.tofile(run_file)
+
+
+def read_duration_run(run_name: str, buffer_size: int) -> Iterator[float]:
+
+    """
+    Reads request times of run file one by one
+    :param run_name: path to run file
+    :param buffer_size: size of read buffer
+    :return: generator of request times in order of run
+    """
+
+    read_size = max(DURATION_SIZE, buffer_size - buffer_size % DURATION_SIZE)
+    with open(run_name, "rb", buffering=0) as run_file:
+        while True:
+            chunk = run_file.read(read_size)
+            if not chunk:
+                return
+            batch = array("d")
+            batch.frombytes(chunk)
+            yield from batch
+
+
+class SpillingRuns:
+
+    """
+    Sorts (url, position, request time) records of log in bounded memory: records are buffered
+    until their approximate size exceeds memory budget, then buffer is sorted by url and position
+    and spilled to run file in spill directory. Runs are merged with k-way merge, in several passes
+    if there are more than MAX_MERGE_RUNS of them
+    """
+
+    run_prefix = "run"
+
+    def __init__(self, memory_budget: int, spill_dir: str):
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.records: List[RunRecord] = list()
+        self.buffered_size = 0
+        self.run_names: List[str] = list()
+        self.num_runs_written = 0
+
+    def add(self, url: bytes, position: int, duration: float) -> NoReturn:
+
+        """
+        Adds record, spills buffered records if they exceed memory budget
+        :param url: url as utf-8 bytes
+        :param position: number of line in log
+        :param duration: request time
+        """
+
+        self.records.append((url, position, duration))
+        self.buffered_size += sys.getsizeof(url) + RUN_RECORD_OVERHEAD
+        if self.buffered_size >= self.memory_budget:
+            self.spill()
+
+    def _new_run_name(self) -> str:
+
+        """
+        Generates name of next run file
+        :return: path to run file in spill directory
+        """
+
+        self.num_runs_written += 1
+
+        return os.path.join(self.spill_dir, f"{self.run_prefix}-{self.num_runs_written:06d}.bin")
+
+    def _write_run(self, run_name: str, records: Iterable) -> NoReturn:
+
+        """
+        Writes sorted records to run file
+        :param run_name: path to run file
+        :param records: sorted records
+        """
+
+        write_run(run_name=run_name, records=records)
+
+    def _read_run(self, run_name: str, buffer_size: int) -> Iterator:
+
+        """
+        Reads records of run file
+        :param run_name: path to run file
+        :param buffer_size: size of read buffer
+        :return: generator of records in order of run
+        """
+
+        return read_run(run_name=run_name, buffer_size=buffer_size)
+
+    def spill(self) -> NoReturn:
+
+        """
+        Sorts buffered records and writes them to new run file
+        """
+
+        if not self.records:
+            return
+        self.records.sort()
+        run_name = self._new_run_name()
+        self._write_run(run_name=run_name, records=self.records)
+        self.run_names.append(run_name)
+        self.records = list()
+        self.buffered_size = 0
+
+    def _buffer_size(self, num_runs: int) -> int:
+
+        """
+        Gets size of read buffer of every merged run
+        :param num_runs: number of runs merged at once
+        :return: buffer size in bytes
+        """
+
+        return min(MAX_RUN_BUFFER_SIZE, max(MIN_RUN_BUFFER_SIZE, self.memory_budget // (2 * num_runs)))
+
+    def merged(self) -> Iterator[RunRecord]:
+
+        """
+        Merges all records. Records that fit in memory budget are never written to disk
+        :return: generator of (url, position, request time) records sorted by url and position
+        """
+
+        if not self.run_names:
+            self.records.sort()
+            records, self.records = self.records, list()
+            yield from records
+            return
+
+        self.spill()
+        while len(self.run_names) > MAX_MERGE_RUNS:
+            merged_run_names = self.run_names[:MAX_MERGE_RUNS]
+            run_name = self._new_run_name()
+            self._write_run(
+                run_name=run_name,
+                records=heapq.merge(*(
+                    self._read_run(run_name=merged_run_name, buffer_size=self._buffer_size(num_runs=MAX_MERGE_RUNS))
+                    for merged_run_name in merged_run_names
+                ))
+            )
+            for merged_run_name in merged_run_names:
+                os.remove(merged_run_name)
+            self.run_names = self.run_names[MAX_MERGE_RUNS:] + [run_name]
+
+        buffer_size = self._buffer_size(num_runs=len(self.run_names))
+        yield from heapq.merge(*(
+            self._read_run(run_name=run_name, buffer_size=buffer_size) for run_name in self.run_names
+        ))
+
+
+class SpillingDurations(SpillingRuns):
+
+    """
+    Sorts request times of one url in bounded memory the same way as SpillingRuns sorts records of log.
+    Sorter is cleared and reused for the next url, so that disk keeps runs of one url at most
+    """
+
+    run_prefix = "durations"
+
+    def add(self, duration: float) -> NoReturn:
+
+        """
+        Adds request time, spills buffered request times if they exceed memory budget
+        :param duration: request time
+        """
+
+        self.records.append(duration)
+        self.buffered_size += DURATION_RECORD_OVERHEAD
+        if self.buffered_size >= self.memory_budget:
+            self.spill()
+
+    def _write_run(self, run_name: str, records: Iterable[float]) -> NoReturn:
+
+        """
+        Writes sorted request times to run file
+        :param run_name: path to run file
+        :param records: sorted request times
+        """
+
+        write_duration_run(run_name=run_name, durations=records)
+
+    def _read_run(self, run_name: str, buffer_size: int) -> Iterator[float]:
+
+        """
+        Reads request times of run file
+        :param run_name: path to run file
+        :param buffer_size: size of read buffer
+        :return: generator of request times in order of run
+        """
+
+        return read_duration_run(run_name=run_name, buffer_size=buffer_size)
+
+    def clear(self) -> NoReturn:
+
+        """
+        Drops buffered request times and removes run files
+        """
+
+        for run_name in self.run_names:
+            os.remove(run_name)
+        self.run_names = list()
+        self.records = list()
+        self.buffered_size = 0
@@ -0,0 +1,300 @@
+import gzip
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import zlib
+from typing import Iterable, List, NamedTuple, NoReturn, Optional, Tuple
+
+COMPRESSED_BLOCK_SIZE = 1024 * 1024
+DECOMPRESSED_BLOCKS_QUEUE_SIZE = 16
+GZIP_INDEX_VERSION = 1
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+class GzipMember(NamedTuple):
+
+    """
+    Class with seek point of gzip file (beginning of gzip member) such as:
+    - compressed_offset: offset of member in gzip file
+    - uncompressed_offset: offset of member data in decompressed stream
+    - first_line_skip: number of bytes before the first line that starts in member,
+      None if no line starts in member
+    """
+
+    compressed_offset: int
+    uncompressed_offset: int
+    first_line_skip: Optional[int]
+
+
+class GzipIndex(NamedTuple):
+
+    """
+    Class with seek points of gzip file such as:
+    - file_size, file_mtime_ns: fingerprint of indexed file
+    - uncompressed_size: size of decompressed stream
+    - members: seek points at member boundaries
+    """
+
+    file_size: int
+    file_mtime_ns: int
+    uncompressed_size: int
+    members: List[GzipMember]
+
+
+def generate_gzip_index_name(gzip_file_path: str) -> str:
+
+    """
+    Generates name for sidecar file with gzip index
+    :param gzip_file_path: path to gzip file
+    :return: path to index next to gzip file
+    """
+
+    return f"{gzip_file_path}.gzidx"
+
+
+def build_gzip_index(gzip_file_path: str) -> GzipIndex:
+
+    """
+    Decompresses gzip file once and finds seek points. Python zlib can't resume inflate
+    in the middle of deflate stream, so seek points are gzip member boundaries: files of
+    concatenated members (bgzip, gzip chunks joined with cat) can be parsed in parallel,
+    single member file has the only seek point
+    :param gzip_file_path: path to gzip file
+    :return: gzip index
+    """
+
+    file_stat = os.stat(gzip_file_path)
+    members = list()
+    compressed_offset = 0
+    uncompressed_offset = 0
+    member_start = 0
+    member_uncompressed_start = 0
+    previous_data_ends_with_line_break = True
+    first_line_skip = 0
+    decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+
+    with open(gzip_file_path, "rb") as gzip_file:
+        while True:
+            compressed_data = gzip_file.read(COMPRESSED_BLOCK_SIZE)
+            if not compressed_data:
+                break
+            while compressed_data:
+                data = decompressor.decompress(compressed_data)
+                if data:
+                    if first_line_skip is None:
+                        line_break_position = data.find(b"\n")
+                        if line_break_position != -1:
+                            member_data_size = uncompressed_offset - member_uncompressed_start
+                            first_line_skip = member_data_size + line_break_position + 1
+                    uncompressed_offset += len(data)
+                    previous_data_ends_with_line_break = data.endswith(b"\n")
+                if not decompressor.eof:
+                    compressed_offset += len(compressed_data)
+                    break
+
+                compressed_offset += len(compressed_data) - len(decompressor.unused_data)
+                members.append(GzipMember(member_start, member_uncompressed_start, first_line_skip))
+                compressed_data = decompressor.unused_data
+                decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+                member_start = compressed_offset
+                member_uncompressed_start = uncompressed_offset
+                first_line_skip = 0 if previous_data_ends_with_line_break else None
+
+    return GzipIndex(
+        file_size=file_stat.st_size,
+        file_mtime_ns=file_stat.st_mtime_ns,
+        uncompressed_size=uncompressed_offset,
+        members=members
+    )
+
+
+def load_or_build_gzip_index(gzip_file_path: str) -> GzipIndex:
+
+    """
+    Loads gzip index from sidecar file or builds it and caches next to gzip file
+    :param gzip_file_path: path to gzip file
+    :return: gzip index
+    """
+
+    index_name = generate_gzip_index_name(gzip_file_path=gzip_file_path)
+    file_stat = os.stat(gzip_file_path)
+
+    if os.path.exists(index_name):
+        try:
+            with open(index_name, "rt", encoding="utf-8") as index_file:
+                raw_index = json.load(index_file)
+            if (
+                raw_index["version"] == GZIP_INDEX_VERSION
+                and raw_index["file_size"] == file_stat.st_size
+                and raw_index["file_mtime_ns"] == file_stat.st_mtime_ns
+            ):
+                return GzipIndex(
+                    file_size=raw_index["file_size"],
+                    file_mtime_ns=raw_index["file_mtime_ns"],
+                    uncompressed_size=raw_index["uncompressed_size"],
+                    members=[GzipMember(*member) for member in raw_index["members"]]
+                )
+            logging.info("Gzip index %s is outdated", index_name)
+        except (ValueError, KeyError, TypeError):
+            logging.exception("Failed to load gzip index %s", index_name)
+
+    logging.info("Building gzip index for %s", gzip_file_path)
+    gzip_index = build_gzip_index(gzip_file_path=gzip_file_path)
+
+    try:
+        with open(index_name, "wt", encoding="utf-8") as index_file:
+            json.dump(
+                {
+                    "version": GZIP_INDEX_VERSION,
+                    "file_size": gzip_index.file_size,
+                    "file_mtime_ns": gzip_index.file_mtime_ns,
+                    "uncompressed_size": gzip_index.uncompressed_size,
+                    "members": gzip_index.members
+                },
+                index_file
+            )
+    except OSError:
+        logging.warning("Can't save gzip index %s, it will be rebuilt next time", index_name)
+
+    return gzip_index
+
+
+def split_gzip_index(gzip_index: GzipIndex, num_regions: int) -> List[Tuple[int, Optional[int]]]:
+
+    """
+    Splits gzip file into regions of members with approximately equal uncompressed size.
+    Regions start only at members where some line starts
+    :param gzip_index: gzip index
+    :param num_regions: desired number of regions
+    :return: list of (first member, first member of next region or None for the last region)
+    """
+
+    region_starts = [0]
+    for region_number in range(1, num_regions):
+        approximate_boundary = gzip_index.uncompressed_size * region_number // num_regions
+        for member_number in range(region_starts[-1] + 1, len(gzip_index.members)):
+            member = gzip_index.members[member_number]
+            if member.first_line_skip is not None and member.uncompressed_offset >= approximate_boundary:
+                region_starts.append(member_number)
+                break
+
+    region_ends = region_starts[1:] + [None]
+
+    return list(zip(region_starts, region_ends))
+
+
+def read_gzip_region(
+        gzip_file_path: str,
+        gzip_index: GzipIndex,
+        first_member: int,
+        end_member: Optional[int]
+) -> Iterable[bytes]:
+
+    """
+    Reads lines that start in region of gzip members. The last line may continue in next members
+    :param gzip_file_path: path to gzip file
+    :param gzip_index: gzip index
+    :param first_member: first member of region
+    :param end_member: first member of next region or None for the last region
+    :return: generator of raw lines
+    """
+
+    start_member = gzip_index.members[first_member]
+    if end_member is None:
+        region_end = gzip_index.uncompressed_size
+    else:
+        next_region_member = gzip_index.members[end_member]
+        region_end = next_region_member.uncompressed_offset + next_region_member.first_line_skip
+
+    with open(gzip_file_path, "rb") as gzip_file:
+        gzip_file.seek(start_member.compressed_offset)
+        with gzip.GzipFile(fileobj=gzip_file, mode="rb") as analyzed_log:
+            analyzed_log.read(start_member.first_line_skip)
+            position = start_member.uncompressed_offset + start_member.first_line_skip
+            for line_ in analyzed_log:
+                if position >= region_end:
+                    break
+                position += len(line_)
+                yield line_
+
+
+def _decompress_blocks(gzip_file_path: str, blocks_queue: queue.Queue, stop_event: threading.Event) -> NoReturn:
+
+    """
+    Decompresses gzip file block by block into bounded queue. Runs in separate thread,
+    zlib releases GIL while decompressing so parsing goes on at the same time.
+    Exception is passed to queue instead of data, file that ends in the middle of gzip member
+    is truncated and gets EOFError like gzip.open does
+    :param gzip_file_path: path to gzip file
+    :param blocks_queue: queue for decompressed blocks, None marks end of data
+    :param stop_event: event set by reader that doesn't need data anymore
+    """
+
+    try:
+        decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+        is_member_started = False
+        with open(gzip_file_path, "rb") as gzip_file:
+            while not stop_event.is_set():
+                compressed_data = gzip_file.read(COMPRESSED_BLOCK_SIZE)
+                if not compressed_data:
+                    if is_member_started:
+                        raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+                    break
+                while compressed_data:
+                    is_member_started = True
+                    data = decompressor.decompress(compressed_data)
+                    if data:
+                        blocks_queue.put(data)
+                    if not decompressor.eof:
+                        break
+                    compressed_data = decompressor.unused_data
+                    decompressor = zlib.decompressobj(wbits=GZIP_WBITS)
+                    is_member_started = False
+        blocks_queue.put(None)
+    except Exception as error:
+        blocks_queue.put(error)
+
+
+def read_gzip_lines_pipelined(gzip_file_path: str) -> Iterable[bytes]:
+
+    """
+    Reads lines of gzip file while decompression runs in separate thread
+    with bounded queue of decompressed blocks between them
+    :param gzip_file_path: path to gzip file
+    :return: generator of raw lines
+    """
+
+    blocks_queue = queue.Queue(maxsize=DECOMPRESSED_BLOCKS_QUEUE_SIZE)
+    stop_event = threading.Event()
+    decompressing_thread = threading.Thread(
+        target=_decompress_blocks,
+        args=(gzip_file_path, blocks_queue, stop_event),
+        daemon=True
+    )
+    decompressing_thread.start()
+
+    try:
+        unfinished_line = b""
+        while True:
+            block = blocks_queue.get()
+            if block is None:
+                break
+            if isinstance(block, Exception):
+                raise block
+            data = unfinished_line + block
+            lines_end = data.rfind(b"\n") + 1
+            unfinished_line = data[lines_end:]
+            yield from io.BytesIO(data[:lines_end])
+        if unfinished_line:
+            yield unfinished_line
+    finally:
+        stop_event.set()
+        # Unblocking decompressing thread that may wait for free place in queue
+        while decompressing_thread.is_alive():
+            try:
+                blocks_queue.get_nowait()
+            except queue.Empty:
+                decompressing_thread.join(timeout=0.01)
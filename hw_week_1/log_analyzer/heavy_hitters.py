@@ -0,0 +1,185 @@
+import heapq
+import math
+from typing import Dict, List, NoReturn, Union
+
+from quantiles import HdrHistogram
+
+# 2 ** 14 registers (16 KB) estimate number of distinct urls of log with 0.8% standard error,
+# 2 ** 10 registers (1 KB per tracked url) estimate number of its distinct clients with 3.3% one
+DISTINCT_URLS_PRECISION = 14
+DISTINCT_CLIENTS_PRECISION = 10
+
+HASH_MASK = (1 << 64) - 1
+
+
+class HyperLogLog:
+
+    """
+    HyperLogLog estimator of number of distinct values in fixed memory of 2 ** precision one byte registers,
+    standard error of estimate is 1.04 / sqrt(2 ** precision). Values are hashed with built-in hash,
+    so that estimators are comparable within one process only
+    """
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision: int):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: Union[str, bytes]) -> NoReturn:
+
+        """
+        Adds value to estimator
+        :param value: value to count
+        """
+
+        hashed = hash(value) & HASH_MASK
+        remaining_bits = 64 - self.precision
+        register = hashed >> remaining_bits
+        # Rank is position of the first set bit of remaining hash bits, counted from the highest one
+        rank = remaining_bits - (hashed & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[register]:
+            self.registers[register] = rank
+
+    def estimate(self) -> int:
+
+        """
+        Estimates number of distinct added values, small numbers are counted by empty registers (linear counting)
+        :return: estimate
+        """
+
+        num_registers = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / num_registers)
+        raw_estimate = alpha * num_registers ** 2 / sum(2.0 ** -rank for rank in self.registers)
+        num_empty_registers = self.registers.count(0)
+        if raw_estimate <= 2.5 * num_registers and num_empty_registers:
+            return round(num_registers * math.log(num_registers / num_empty_registers))
+
+        return round(raw_estimate)
+
+
+class HeavyHitters:
+
+    """
+    Space-Saving summary of urls with the biggest total request time in memory of capacity counters.
+    Url that isn't tracked takes counter with the smallest total request time when all counters are taken,
+    and inherits its total request time and count as overestimation error. So tracked total of url is never
+    below the true one and exceeds it by time_errors of url at most, which is below total request time
+    of all lines divided by capacity. Every url whose total request time is bigger than that is tracked.
+    Maximum, quantiles and distinct clients of url are counted since url took its counter.
+    Number of distinct urls of the whole log is estimated with HyperLogLog
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.num_requests = 0
+        self.num_failures = 0
+        self.all_requests_time = 0
+        self.slot_by_url: Dict[Union[str, bytes], int] = dict()
+        self.urls: List[Union[str, bytes]] = list()
+        self.counts: List[int] = list()
+        self.count_errors: List[int] = list()
+        self.time_sums: List[float] = list()
+        self.time_errors: List[float] = list()
+        self.time_maxes: List[float] = list()
+        self.time_estimators: List[HdrHistogram] = list()
+        self.clients: List[HyperLogLog] = list()
+        # Min-heap of (total request time, slot): totals only grow, so entry of slot is refreshed
+        # lazily when it comes to the top with outdated total
+        self.heap: List[tuple] = list()
+        self.distinct_urls = HyperLogLog(precision=DISTINCT_URLS_PRECISION)
+
+    def _take_smallest_slot(self, url: Union[str, bytes]) -> int:
+
+        """
+        Gives counter with the smallest total request time to url
+        :param url: url that isn't tracked
+        :return: slot of url
+        """
+
+        heap = self.heap
+        time_sums = self.time_sums
+        while True:
+            time_sum, slot = heap[0]
+            if time_sum == time_sums[slot]:
+                break
+            heapq.heapreplace(heap, (time_sums[slot], slot))
+
+        del self.slot_by_url[self.urls[slot]]
+        self.slot_by_url[url] = slot
+        self.urls[slot] = url
+        self.count_errors[slot] = self.counts[slot]
+        self.time_errors[slot] = time_sum
+        self.time_maxes[slot] = 0
+        self.time_estimators[slot] = HdrHistogram()
+        self.clients[slot] = HyperLogLog(precision=DISTINCT_CLIENTS_PRECISION)
+
+        return slot
+
+    def add(self, url: Union[str, bytes], duration: float, client: Union[str, bytes]) -> NoReturn:
+
+        """
+        Adds request to summary
+        :param url: url of request
+        :param duration: request time
+        :param client: address of client
+        """
+
+        self.num_requests += 1
+        self.all_requests_time += duration
+        self.distinct_urls.add(url)
+
+        slot = self.slot_by_url.get(url)
+        if slot is None:
+            if len(self.urls) < self.capacity:
+                slot = self.slot_by_url[url] = len(self.urls)
+                self.urls.append(url)
+                self.counts.append(0)
+                self.count_errors.append(0)
+                self.time_sums.append(0.0)
+                self.time_errors.append(0.0)
+                self.time_maxes.append(0)
+                self.time_estimators.append(HdrHistogram())
+                self.clients.append(HyperLogLog(precision=DISTINCT_CLIENTS_PRECISION))
+                heapq.heappush(self.heap, (duration, slot))
+            else:
+                slot = self._take_smallest_slot(url=url)
+                heapq.heapreplace(self.heap, (self.time_sums[slot] + duration, slot))
+
+        self.counts[slot] += 1
+        self.time_sums[slot] += duration
+        if duration > self.time_maxes[slot]:
+            self.time_maxes[slot] = duration
+        self.time_estimators[slot].add(duration)
+        self.clients[slot].add(client)
+
+    def top_slots(self, size: int) -> List[int]:
+
+        """
+        Selects slots with the biggest tracked total request time
+        :param size: number of slots to select
+        :return: slots in descending order of tracked total request time
+        """
+
+        return heapq.nlargest(size, range(len(self.urls)), key=self.time_sums.__getitem__)
+
+    def max_time_error(self) -> float:
+
+        """
+        Bound of overestimation of total request time of any url
+        :return: total request time of all requests divided by capacity
+        """
+
+        return self.all_requests_time / self.capacity
+
+    def url(self, slot: int) -> str:
+
+        """
+        Gets url of slot as string
+        :param slot: slot of url
+        :return: decoded url
+        """
+
+        url = self.urls[slot]
+
+        return url.decode("utf-8", errors="replace") if isinstance(url, bytes) else url
@@ -0,0 +1,188 @@
+import logging
+import os
+from typing import Callable, Dict, Iterator, List, NoReturn, Optional
+
+FOLLOW_READ_BLOCK_SIZE = 1024 * 1024
+
+
+class LogFollower:
+
+    """
+    Follows log file that is still being written, like tail -F does.
+    File is polled by size and inode: lines appended since the last poll are read,
+    partial last line is kept until it is completed. If file is rotated (path points to
+    another inode) the rest of old file is read first and then new file is followed from
+    its beginning, truncated file is followed from its beginning too
+    """
+
+    def __init__(self, log_file_path: str, from_end: bool = True):
+        self.log_file_path = log_file_path
+        self.from_end = from_end
+        self.log_file = None
+        self.inode: Optional[int] = None
+        self.offset = 0
+        self.partial_line = b""
+
+    def _open(self, stat_result: os.stat_result, from_end: bool) -> NoReturn:
+
+        """
+        Opens followed file
+        :param stat_result: stat of file at followed path
+        :param from_end: skip lines written before file was opened
+        """
+
+        self.log_file = open(self.log_file_path, "rb")
+        self.inode = stat_result.st_ino
+        self.offset = stat_result.st_size if from_end else 0
+        self.partial_line = b""
+        logging.info("Following log file %s from offset %d", self.log_file_path, self.offset)
+
+    def _read_appended(self) -> Iterator[bytes]:
+
+        """
+        Reads complete lines appended to opened file since the last read
+        :return: generator of raw lines
+        """
+
+        self.log_file.seek(self.offset)
+        while True:
+            block = self.log_file.read(FOLLOW_READ_BLOCK_SIZE)
+            if not block:
+                return
+            self.offset += len(block)
+            lines = (self.partial_line + block).split(b"\n")
+            self.partial_line = lines.pop()
+            for line in lines:
+                yield line + b"\n"
+
+    def close(self) -> NoReturn:
+
+        """
+        Closes followed file
+        """
+
+        if self.log_file is not None:
+            self.log_file.close()
+            self.log_file = None
+
+    def poll(self) -> Iterator[bytes]:
+
+        """
+        Reads lines written to followed file since the last poll
+        :return: generator of raw lines
+        """
+
+        try:
+            stat_result = os.stat(self.log_file_path)
+        except FileNotFoundError:
+            # Rotated file is renamed before new one is created
+            return
+
+        if self.log_file is None:
+            self._open(stat_result=stat_result, from_end=self.from_end)
+        elif stat_result.st_ino != self.inode:
+            yield from self._read_appended()
+            if self.partial_line:
+                logging.warning("Rotated log file %s ends with incomplete line", self.log_file_path)
+            self.close()
+            logging.info("Log file %s was rotated", self.log_file_path)
+            self._open(stat_result=stat_result, from_end=False)
+        elif stat_result.st_size < self.offset:
+            logging.info("Log file %s was truncated", self.log_file_path)
+            self.offset = 0
+            self.partial_line = b""
+
+        if stat_result.st_size > self.offset:
+            yield from self._read_appended()
+
+
+class SlidingWindows:
+
+    """
+    Rolling aggregates of several time windows (e.g. 1, 5 and 60 minutes).
+    Time is split into buckets of bucket_seconds, every bucket keeps aggregate of its lines,
+    window aggregate is made of buckets of the last window seconds. Buckets older than
+    the longest window are dropped, so memory is bounded by number of buckets
+    """
+
+    def __init__(self, window_seconds: List[int], bucket_seconds: int, make_bucket: Callable[[], object]):
+        if any(window % bucket_seconds for window in window_seconds):
+            raise ValueError(f"Windows {window_seconds} must be multiples of bucket of {bucket_seconds} s")
+        self.window_seconds = sorted(window_seconds)
+        self.bucket_seconds = bucket_seconds
+        self.make_bucket = make_bucket
+        self.buckets: Dict[int, object] = dict()
+
+    def bucket_at(self, timestamp: float) -> object:
+
+        """
+        Gets bucket for lines of moment, creates it if there is no such bucket yet
+        :param timestamp: unix time of lines
+        :return: aggregate of bucket
+        """
+
+        bucket_index = int(timestamp // self.bucket_seconds)
+        bucket = self.buckets.get(bucket_index)
+        if bucket is None:
+            bucket = self.buckets[bucket_index] = self.make_bucket()
+
+        return bucket
+
+    def expire(self, now: float) -> int:
+
+        """
+        Drops buckets that don't belong to any window anymore
+        :param now: current unix time
+        :return: number of dropped buckets
+        """
+
+        first_bucket_index = self._first_bucket_index(window=self.window_seconds[-1], now=now)
+        expired_indexes = [bucket_index for bucket_index in self.buckets if bucket_index < first_bucket_index]
+        for bucket_index in expired_indexes:
+            del self.buckets[bucket_index]
+
+        return len(expired_indexes)
+
+    def _first_bucket_index(self, window: int, now: float) -> int:
+
+        """
+        Finds the oldest bucket of window, current (incomplete) bucket is the newest one
+        :param window: window length in seconds
+        :param now: current unix time
+        :return: index of bucket
+        """
+
+        return int(now // self.bucket_seconds) - window // self.bucket_seconds + 1
+
+    def window_buckets(self, window: int, now: float) -> List[object]:
+
+        """
+        Gets buckets of window
+        :param window: window length in seconds
+        :param now: current unix time
+        :return: buckets from the oldest to the newest one
+        """
+
+        first_bucket_index = self._first_bucket_index(window=window, now=now)
+
+        return [
+            self.buckets[bucket_index]
+            for bucket_index in sorted(self.buckets)
+            if bucket_index >= first_bucket_index
+        ]
+
+
+def format_window(window: int) -> str:
+
+    """
+    Makes short name of window for snapshot and report names
+    :param window: window length in seconds
+    :return: name like 30s, 5m or 1h
+    """
+
+    if window % 3600 == 0:
+        return f"{window // 3600}h"
+    if window % 60 == 0:
+        return f"{window // 60}m"
+
+    return f"{window}s"
@@ -1,17 +1,31 @@
 import datetime
 import gzip
+import heapq
 import json
 import logging
+import mmap
 import os
+import pickle
 import re
+import shutil
+import socket
+import sys
+import tempfile
+import time
+import zlib
 from argparse import ArgumentParser, FileType
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
 from copy import deepcopy
-from statistics import median
+from itertools import groupby
+from operator import itemgetter
 from string import Template
 from typing import (
     Callable,
     Dict,
     Iterable,
+    Iterator,
     List,
     NoReturn,
     Optional,
@@ -20,6 +34,31 @@ from typing import (
     NamedTuple
 )
 
+from external_sort import SPILL_HEADROOM, SpillingDurations, SpillingRuns, parse_size
+from gzip_index import (
+    GzipIndex,
+    load_or_build_gzip_index,
+    read_gzip_lines_pipelined,
+    read_gzip_region,
+    split_gzip_index
+)
+from heavy_hitters import HeavyHitters
+from live_tail import LogFollower, SlidingWindows, format_window
+from log_dir_index import IndexedLogFile, LogDirIndex, open_log_dir_index
+from log_format import compile_log_format, parse_lines_by_format
+from log_sampling import ABORT_CONFIDENCE_Z, MIN_BLOCKS_TO_ABORT, REPORT_CONFIDENCE_Z, LogSampleRanges
+from log_sampling import choose_sample_ranges, ratio_confidence_interval
+from metrics import RunMetrics, get_peak_rss, profiling, save_metrics
+from numpy_backend import AGGREGATION_BACKENDS, PrecomputedQuantiles, calculate_quantiles, is_numpy_available
+from numpy_backend import select_top_slots
+from parsed_log_cache import ParsedLogColumns, load_parsed_log, save_parsed_log
+from partial_aggregate import PartialAggregate, PartialAggregateError, load_partial_aggregate, merge_partial_aggregates
+from partial_aggregate import save_partial_aggregate
+from quantiles import QUANTILE_BACKENDS, ExactQuantiles, HdrHistogram, select_quantiles
+from time_buckets import TimeLocalParser, get_time_bucket_seconds, make_time_series
+from url_normalizer import UrlNormalizationRules, get_url_normalization_rules, make_url_normalizer, normalize_urls
+from warehouse import DailyTotals, open_warehouse, save_daily_stats
+
 
 class Config(NamedTuple):
 
@@ -28,6 +67,34 @@ class Config(NamedTuple):
     - report_size: size of report
     - report_dir: directory where report will be constructed
     - log_dir: directory where to take logs from
+    - workers: number of processes to parse one log file with
+    - quantile_backend: name of estimator for median and percentiles of request time
+    - report_percentiles: percentiles of request time to add to report
+    - parser: "split" to parse decoded lines by whitespace, "format" to parse raw bytes by log_format
+    - log_format: nginx log_format of analyzed logs
+    - incremental: parse only lines appended since last run, keeping checkpoint next to report
+    - backlog_concurrency: number of logs analyzed at the same time in backlog mode (number of CPUs by default)
+    - gzip_index: build seek points index of gzip logs to parse their regions with workers
+    - url_normalization: rules to collapse high-cardinality urls into templates
+    - reader: "buffered" or "mmap" reader of uncompressed logs
+    - profile: dump cProfile stats and tracemalloc snapshot of run next to report
+    - log_dir_index: keep index of log directory in report directory instead of scanning log directory every run
+    - parsed_cache_dir: directory for columnar caches of parsed logs, None to parse logs every time
+    - live_windows: lengths of sliding windows of live mode in seconds
+    - live_bucket_seconds: length of time buckets windows of live mode are made of
+    - live_snapshot_interval: seconds between snapshots of live mode
+    - live_poll_interval: seconds between polls of followed log in live mode
+    - time_bucket_seconds: length of time buckets of url time series parsed from $time_local, None to skip them
+    - report_chunk_size: number of rows in chunk files of report data loaded by report page, None to inline rows
+    - report_chunk_gzip: compress chunk files of report data with gzip
+    - aggregation_backend: "python" or "numpy" to select report urls and calculate their quantiles in bulk
+    - sample_rate: share of randomly sampled blocks of uncompressed log for approximate report, None for full pass
+    - sample_block_size: size of sampled blocks in bytes
+    - sample_seed: seed of block sampling, None for different sample every run
+    - warehouse_db: SQLite database to save daily url aggregates to for cross-day queries, None to skip it
+    - heavy_hitters_capacity: number of url counters of bounded memory mode, None for exact stats of every url
+    - memory_limit: memory budget in bytes of exact aggregation spilling sorted runs to disk, None to aggregate in RAM
+    - spill_dir: directory for temporary run files, system temporary directory if None
     """
 
     report_size: int
@@ -35,6 +102,34 @@ class Config(NamedTuple):
     log_dir: str
     log_file: str
     failures_percent_threshold: float
+    workers: int = 1
+    quantile_backend: str = "exact"
+    report_percentiles: Tuple[float, ...] = ()
+    parser: str = "split"
+    log_format: str = ""
+    incremental: bool = False
+    backlog_concurrency: Optional[int] = None
+    gzip_index: bool = False
+    url_normalization: UrlNormalizationRules = UrlNormalizationRules()
+    reader: str = "buffered"
+    profile: bool = False
+    log_dir_index: bool = False
+    parsed_cache_dir: Optional[str] = None
+    live_windows: Tuple[int, ...] = (60, 300, 3600)
+    live_bucket_seconds: int = 10
+    live_snapshot_interval: float = 10.0
+    live_poll_interval: float = 1.0
+    time_bucket_seconds: Optional[int] = None
+    report_chunk_size: Optional[int] = None
+    report_chunk_gzip: bool = False
+    aggregation_backend: str = "python"
+    sample_rate: Optional[float] = None
+    sample_block_size: int = 1024 * 1024
+    sample_seed: Optional[int] = None
+    warehouse_db: Optional[str] = None
+    heavy_hitters_capacity: Optional[int] = None
+    memory_limit: Optional[int] = None
+    spill_dir: Optional[str] = None
 
 
 class LatestLogFile(NamedTuple):
@@ -70,16 +165,103 @@ CONFIG = {
     "REPORT_DIR": "./reports",
     "LOG_DIR": "./nginx_logs",
     "LOG_FILE": "./script_logs/test.log",
-    "FAILURES_PERCENT_THRESHOLD": 50.0
+    "FAILURES_PERCENT_THRESHOLD": 50.0,
+    "WORKERS": 1,
+    "QUANTILE_BACKEND": "exact",
+    "REPORT_PERCENTILES": [],
+    "PARSER": "split",
+    "LOG_FORMAT": (
+        '$remote_addr $remote_user $http_x_real_ip [$time_local] "$request" '
+        '$status $body_bytes_sent "$http_referer" '
+        '"$http_user_agent" "$http_x_forwarded_for" "$http_X_REQUEST_ID" "$http_X_RB_USER" '
+        '$request_time'
+    ),
+    "INCREMENTAL": False,
+    "BACKLOG_CONCURRENCY": None,
+    "GZIP_INDEX": False,
+    "URL_NORMALIZATION": {},
+    "READER": "buffered",
+    "PROFILE": False,
+    "LOG_DIR_INDEX": False,
+    "PARSED_CACHE_DIR": None,
+    "LIVE_WINDOWS": [60, 300, 3600],
+    "LIVE_BUCKET_SECONDS": 10,
+    "LIVE_SNAPSHOT_INTERVAL": 10.0,
+    "LIVE_POLL_INTERVAL": 1.0,
+    "TIME_BUCKETS": None,
+    "REPORT_CHUNK_SIZE": None,
+    "REPORT_CHUNK_GZIP": False,
+    "AGGREGATION_BACKEND": "python",
+    "SAMPLE_RATE": None,
+    "SAMPLE_BLOCK_SIZE": 1024 * 1024,
+    "SAMPLE_SEED": None,
+    "WAREHOUSE_DB": None,
+    "HEAVY_HITTERS_CAPACITY": None,
+    "MEMORY_LIMIT": None,
+    "SPILL_DIR": None
 }
 
 DATE_FORMAT_IN_LOG_FILE_NAME = "%Y%m%d"
 DATE_FORMAT_FOR_REPORT = "%Y.%m.%d"
 NUM_SIGNS_FOR_STATS = 3
 
+LINE_END_SEARCH_BLOCK_SIZE = 64 * 1024
+CHECKPOINT_HEAD_SIZE = 4096
+CHECKPOINT_VERSION = 5
+
+LIVE_SNAPSHOT_NAME = "live.json"
+
 LOG_FILE_PATTERN = re.compile(r"nginx-access-ui.log-(\d{8}).(gz|log|txt)$")
 
 
+class LogCheckpoint(NamedTuple):
+
+    """
+    Class with state of incremental analysis of log file such as:
+    - version: version of checkpoint format
+    - device, inode: identity of analyzed log file
+    - offset: end of the last analyzed line
+    - head_checksum: checksum of log file beginning
+    - settings: config parameters stats were accumulated with
+    - accumulator: url stats accumulated for analyzed lines
+    """
+
+    version: int
+    device: int
+    inode: int
+    offset: int
+    head_checksum: int
+    settings: Tuple[str, str, str, "UrlNormalizationRules", Optional[int]]
+    accumulator: "UrlStatsAccumulator"
+
+
+class LogSample(NamedTuple):
+
+    """
+    Class with url stats accumulated for sampled blocks of log file such as:
+    - accumulator: stats of all sampled lines, request times are kept in flat columns
+    - ranges: sampled byte ranges of log file
+    - block_ends: number of request times in flat columns after every block
+    - block_requests: number of lines in every block
+    - block_times: total request time of every block
+    """
+
+    accumulator: "UrlStatsAccumulator"
+    ranges: "LogSampleRanges"
+    block_ends: List[int]
+    block_requests: List[int]
+    block_times: List[float]
+
+    @property
+    def scale(self) -> float:
+
+        """
+        Factor to scale counts and sums of sample up to the whole log
+        """
+
+        return self.ranges.file_size / self.ranges.sampled_size
+
+
 class FailuresPercentageError(Exception):
     pass
 
@@ -101,13 +283,47 @@ def get_config_parameters(
 
     final_config = deepcopy(default_config)
     final_config.update(config_from_file_)
+    if final_config["AGGREGATION_BACKEND"] not in AGGREGATION_BACKENDS:
+        raise ValueError(f"Unknown aggregation backend: {final_config['AGGREGATION_BACKEND']}")
+    if final_config["HEAVY_HITTERS_CAPACITY"] is not None and final_config["TIME_BUCKETS"] is not None:
+        raise ValueError("Time series aren't calculated with HEAVY_HITTERS_CAPACITY")
+    if final_config["MEMORY_LIMIT"] is not None and final_config["TIME_BUCKETS"] is not None:
+        raise ValueError("Time series aren't calculated with MEMORY_LIMIT")
 
     return Config(
         report_size=final_config["REPORT_SIZE"],
         report_dir=final_config["REPORT_DIR"],
         log_dir=final_config["LOG_DIR"],
         log_file=final_config["LOG_FILE"],
-        failures_percent_threshold=final_config["FAILURES_PERCENT_THRESHOLD"]
+        failures_percent_threshold=final_config["FAILURES_PERCENT_THRESHOLD"],
+        workers=final_config["WORKERS"],
+        quantile_backend=final_config["QUANTILE_BACKEND"],
+        report_percentiles=tuple(final_config["REPORT_PERCENTILES"]),
+        parser=final_config["PARSER"],
+        log_format=final_config["LOG_FORMAT"],
+        incremental=final_config["INCREMENTAL"],
+        backlog_concurrency=final_config["BACKLOG_CONCURRENCY"],
+        gzip_index=final_config["GZIP_INDEX"],
+        url_normalization=get_url_normalization_rules(raw_rules=final_config["URL_NORMALIZATION"]),
+        reader=final_config["READER"],
+        profile=final_config["PROFILE"],
+        log_dir_index=final_config["LOG_DIR_INDEX"],
+        parsed_cache_dir=final_config["PARSED_CACHE_DIR"],
+        live_windows=tuple(final_config["LIVE_WINDOWS"]),
+        live_bucket_seconds=final_config["LIVE_BUCKET_SECONDS"],
+        live_snapshot_interval=final_config["LIVE_SNAPSHOT_INTERVAL"],
+        live_poll_interval=final_config["LIVE_POLL_INTERVAL"],
+        time_bucket_seconds=get_time_bucket_seconds(time_buckets=final_config["TIME_BUCKETS"]),
+        report_chunk_size=final_config["REPORT_CHUNK_SIZE"],
+        report_chunk_gzip=final_config["REPORT_CHUNK_GZIP"],
+        aggregation_backend=final_config["AGGREGATION_BACKEND"],
+        sample_rate=final_config["SAMPLE_RATE"],
+        sample_block_size=final_config["SAMPLE_BLOCK_SIZE"],
+        sample_seed=final_config["SAMPLE_SEED"],
+        warehouse_db=final_config["WAREHOUSE_DB"],
+        heavy_hitters_capacity=final_config["HEAVY_HITTERS_CAPACITY"],
+        memory_limit=None if final_config["MEMORY_LIMIT"] is None else parse_size(final_config["MEMORY_LIMIT"]),
+        spill_dir=final_config["SPILL_DIR"]
     )
 
 
@@ -145,6 +361,74 @@ def find_latest_log(log_dir: str, log_file_pattern: re.Pattern) -> Optional[Late
         )
 
 
+def parse_log_lines(log_lines: Iterable[str]) -> Iterable[SingleLogParserResult]:
+
+    """
+    Parses lines of nginx log one by one
+    :param log_lines: iterable of log lines
+    :return: generator of parsing results by line
+    """
+
+    for line_ in log_lines:
+        line_parsing_is_failed = False
+        try:
+            logs_line = line_.split()
+            url, duration = logs_line[6], float(logs_line[-1])
+        except Exception:
+            logging.error("Failed parsing line: %s", line_)
+            url, duration = None, None
+            line_parsing_is_failed = True
+        yield SingleLogParserResult(
+            url=url,
+            time=duration,
+            is_failed=line_parsing_is_failed
+        )
+
+
+def parse_log_lines_with_time(
+        log_lines: Iterable[str],
+        time_parser: TimeLocalParser
+) -> Iterable[Tuple[Optional[str], Optional[float], bool, int]]:
+
+    """
+    Parses lines of nginx log one by one with time bucket of $time_local
+    :param log_lines: iterable of log lines
+    :param time_parser: parser of $time_local into time buckets
+    :return: generator of (url, request time, is failed, time bucket) tuples
+    """
+
+    time_bucket = time_parser.bucket
+
+    for line_ in log_lines:
+        try:
+            logs_line = line_.split()
+            url, duration, bucket = logs_line[6], float(logs_line[-1]), time_bucket(logs_line[3][1:])
+        except Exception:
+            logging.error("Failed parsing line: %s", line_)
+            yield None, None, True, 0
+            continue
+        yield url, duration, False, bucket
+
+
+def parse_log_lines_with_client(log_lines: Iterable[str]) -> Iterable[Tuple[Optional[str], Optional[float], bool, str]]:
+
+    """
+    Parses lines of nginx log one by one with client address ($remote_addr)
+    :param log_lines: iterable of log lines
+    :return: generator of (url, request time, is failed, client address) tuples
+    """
+
+    for line_ in log_lines:
+        try:
+            logs_line = line_.split()
+            url, duration, client = logs_line[6], float(logs_line[-1]), logs_line[0]
+        except Exception:
+            logging.error("Failed parsing line: %s", line_)
+            yield None, None, True, ""
+            continue
+        yield url, duration, False, client
+
+
 def parse_log_file(log_file: LatestLogFile,
                    log_file_opener: Callable) -> Iterable[SingleLogParserResult]:
 
@@ -156,20 +440,203 @@ def parse_log_file(log_file: LatestLogFile,
     """
 
     with log_file_opener(log_file.path, mode="rt", encoding="Utf-8") as analyzed_log:
+        yield from parse_log_lines(log_lines=analyzed_log)
+
+
+def parse_log_byte_lines(
+        log_lines: Iterable[bytes],
+        cfg: Config,
+        with_clients: bool = False
+) -> Iterable[Tuple[Optional[str], Optional[float], bool]]:
+
+    """
+    Parses raw lines of nginx log with parser from config and normalizes urls if normalization is configured
+    :param log_lines: iterable of raw log lines
+    :param cfg: application config
+    :param with_clients: parse client address for heavy hitters summary
+    :return: generator of (url, request time, is failed) results by line,
+    with time bucket of line as the fourth item if time buckets are configured
+    or client address as the fourth item with with_clients
+    """
+
+    time_parser = None if cfg.time_bucket_seconds is None else TimeLocalParser(bucket_seconds=cfg.time_bucket_seconds)
+    if cfg.parser == "format":
+        parsed_line_gen = parse_lines_by_format(
+            log_lines=log_lines,
+            spec=compile_log_format(cfg.log_format),
+            time_parser=time_parser,
+            with_clients=with_clients
+        )
+    elif with_clients:
+        parsed_line_gen = parse_log_lines_with_client(log_lines=(line_.decode("utf-8") for line_ in log_lines))
+    elif time_parser is not None:
+        parsed_line_gen = parse_log_lines_with_time(
+            log_lines=(line_.decode("utf-8") for line_ in log_lines),
+            time_parser=time_parser
+        )
+    else:
+        parsed_line_gen = parse_log_lines(log_lines=(line_.decode("utf-8") for line_ in log_lines))
+
+    url_normalizer = make_url_normalizer(rules=cfg.url_normalization)
+    if url_normalizer is not None:
+        parsed_line_gen = normalize_urls(parsed_line_gen=parsed_line_gen, normalizer=url_normalizer)
+
+    return parsed_line_gen
+
+
+def parse_log_file_by_config(
+        log_file: LatestLogFile,
+        cfg: Config,
+        with_clients: bool = False
+) -> Iterable[Tuple[Optional[str], Optional[float], bool]]:
+
+    """
+    Parses log file in binary mode with parser from config,
+    gzip logs are decompressed in separate thread
+    :param log_file: file with logs to parse
+    :param cfg: application config
+    :param with_clients: parse client address as the fourth item for heavy hitters summary
+    :return: generator of (url, request time, is failed) results by line
+    """
+
+    if log_file.extension == ".gz":
+        yield from parse_log_byte_lines(
+            log_lines=read_gzip_lines_pipelined(gzip_file_path=log_file.path),
+            cfg=cfg,
+            with_clients=with_clients
+        )
+        return
+
+    yield from parse_log_byte_lines(
+        log_lines=read_log_file_range(
+            log_file_path=log_file.path,
+            start=0,
+            end=os.path.getsize(log_file.path),
+            reader=cfg.reader
+        ),
+        cfg=cfg,
+        with_clients=with_clients
+    )
+
+
+def split_log_file(
+        log_file_path: str,
+        num_chunks: int,
+        start: int = 0,
+        end: Optional[int] = None
+) -> List[Tuple[int, int]]:
+
+    """
+    Splits uncompressed log file (or its part) into byte ranges aligned to line boundaries
+    :param log_file_path: path to log file
+    :param num_chunks: desired number of ranges
+    :param start: offset of the first line to split from
+    :param end: offset right after the last line to split, end of file by default
+    :return: list of (start, end) byte offsets, every range starts at the beginning of a line
+    """
+
+    if end is None:
+        end = os.path.getsize(log_file_path)
+    boundaries = [start]
+
+    with open(log_file_path, "rb") as analyzed_log:
+        for chunk_number in range(1, num_chunks):
+            approximate_boundary = start + (end - start) * chunk_number // num_chunks
+            if approximate_boundary <= boundaries[-1]:
+                continue
+            # Moving to the next line start unless approximate boundary already is one
+            analyzed_log.seek(approximate_boundary - 1)
+            analyzed_log.readline()
+            boundary = analyzed_log.tell()
+            if boundaries[-1] < boundary < end:
+                boundaries.append(boundary)
+
+    boundaries.append(end)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def read_log_file_range(
+        log_file_path: str,
+        start: int,
+        end: int,
+        reader: str = "buffered"
+) -> Iterable[bytes]:
+
+    """
+    Reads lines of uncompressed log file from the byte range
+    :param log_file_path: path to log file
+    :param start: offset of the first line in range
+    :param end: offset right after the last line in range
+    :param reader: "buffered" to read file with buffered IO, "mmap" to iterate over memory mapped file
+    :return: generator of raw lines
+    """
+
+    if reader == "mmap":
+        yield from read_mapped_log_file_range(log_file_path=log_file_path, start=start, end=end)
+        return
+
+    with open(log_file_path, "rb") as analyzed_log:
+        analyzed_log.seek(start)
+        position = start
         for line_ in analyzed_log:
-            line_parsing_is_failed = False
-            try:
-                logs_line = line_.split()
-                url, duration = logs_line[6], float(logs_line[-1])
-            except Exception:
-                logging.error("Failed parsing line: %s", line_)
-                url, duration = None, None
-                line_parsing_is_failed = True
-            yield SingleLogParserResult(
-                url=url,
-                time=duration,
-                is_failed=line_parsing_is_failed
-            )
+            if position >= end:
+                break
+            position += len(line_)
+            yield line_
+
+
+def read_mapped_log_file_range(log_file_path: str, start: int, end: int) -> Iterable[bytes]:
+
+    """
+    Reads lines of uncompressed log file from the byte range of memory mapped file.
+    Line boundaries are found right in mapped pages, only line slices are copied.
+    Workers map the same file, so its pages in page cache are shared without copying
+    :param log_file_path: path to log file
+    :param start: offset of the first line in range
+    :param end: offset right after the last line in range
+    :return: generator of raw lines
+    """
+
+    if start >= end:
+        return
+
+    with open(log_file_path, "rb") as analyzed_log:
+        with mmap.mmap(analyzed_log.fileno(), 0, access=mmap.ACCESS_READ) as mapped_log:
+            if hasattr(mapped_log, "madvise"):
+                mapped_log.madvise(mmap.MADV_SEQUENTIAL)
+            find_line_break = mapped_log.find
+            position = start
+            while position < end:
+                line_end = find_line_break(b"\n", position, end)
+                line_end = end if line_end == -1 else line_end + 1
+                yield mapped_log[position:line_end]
+                position = line_end
+
+
+def find_last_line_end(log_file_path: str, start: int, end: int) -> int:
+
+    """
+    Finds end of the last complete line of log file part. Line that is
+    being written right now (without line break) isn't complete
+    :param log_file_path: path to uncompressed log file
+    :param start: offset of the first line of part
+    :param end: end offset of part
+    :return: offset right after the last line break of part or start if there is no line break
+    """
+
+    with open(log_file_path, "rb") as analyzed_log:
+        block_end = end
+        while block_end > start:
+            block_start = max(start, block_end - LINE_END_SEARCH_BLOCK_SIZE)
+            analyzed_log.seek(block_start)
+            block = analyzed_log.read(block_end - block_start)
+            line_break_position = block.rfind(b"\n")
+            if line_break_position != -1:
+                return block_start + line_break_position + 1
+            block_end = block_start
+
+    return start
 
 
 def generate_report_name(cfg: Config, log_file: LatestLogFile) -> str:
@@ -181,65 +648,372 @@ def generate_report_name(cfg: Config, log_file: LatestLogFile) -> str:
     :return: name for report
     """
 
-    log_creation_date = log_file.date_of_creation.strftime(DATE_FORMAT_FOR_REPORT)
-    report_name = os.path.join(cfg.report_dir, f"report-{log_creation_date}.html")
+    report_file_name = generate_report_file_name(log_creation_date=log_file.date_of_creation)
+    report_name = os.path.join(cfg.report_dir, report_file_name)
 
     return report_name
 
 
-def prepare_stats_for_json(
-        url_stats: Dict[str, Dict[str, Union[int, float]]]
-) -> List[Dict[str, Union[int, float]]]:
+def generate_report_file_name(log_creation_date: datetime.date) -> str:
 
     """
-    Prepares url stats for rendering template
-    :param url_stats: stats by url
-    :return:
+    Generates file name of html report
+    :param log_creation_date: date of log creation
+    :return: file name of report
     """
 
-    url_stats_for_json = list()
-    for url in url_stats:
-        url_stats[url]["url"] = url
-        url_stats_for_json.append(url_stats[url])
-
-    return url_stats_for_json
+    return f"report-{log_creation_date.strftime(DATE_FORMAT_FOR_REPORT)}.html"
 
 
-def calculate_url_stats(
-        parsed_line_gen: Iterable[SingleLogParserResult],
-        cfg: Config
-) -> Tuple[Dict[str, Dict[str, Union[int, float]]], float]:
+class UrlStatsAccumulator:
 
     """
-    Calculates url stats for report
-    :param parsed_line_gen: generator of parsed lines result
-    :param cfg application config
-    :return: url stats for log file
+    Partial url stats of log file (or its part). Accumulators
+    of different parts of the same log can be merged into one.
+    Every url gets integer slot, counts, sums and maxima of request time
+    are kept in typed arrays indexed by slot. With "exact" quantile backend
+    request times are kept in flat columns (slot, time) and are grouped
+    by url only for report rows, other backends keep estimator per slot
+    (and flat columns as well if they are needed for parsed log cache).
+    Urls are kept as parser gives them: raw bytes of "format" parser are
+    decoded only once to check them and then only for report rows.
+    With time buckets time bucket of every line is kept in flat column too
     """
 
-    num_failures = 0
-    num_requests = 0
-    all_requests_time = 0
-    calculations_by_url = dict()
+    def __init__(
+            self,
+            quantile_backend: str = "exact",
+            keep_durations: bool = False,
+            time_bucket_seconds: Optional[int] = None
+    ):
+        self.num_requests = 0
+        self.num_failures = 0
+        self.all_requests_time = 0
+        self.quantile_backend = quantile_backend
+        self.time_bucket_seconds = time_bucket_seconds
+        self.keeps_durations = keep_durations or quantile_backend == "exact" or time_bucket_seconds is not None
+        self.keeps_estimators = quantile_backend != "exact"
+        self.slot_by_url = dict()
+        self.urls = list()
+        self.counts = array("q")
+        self.time_sums = array("d")
+        self.time_maxes = array("d")
+        self.duration_slots = array("i")
+        self.durations = array("d")
+        self.duration_buckets = array("i")
+        self.time_estimators = list()
+
+    def _add_slot(self, url: Union[str, bytes], time_max: float) -> int:
+
+        """
+        Assigns slot to new url
+        :param url: url that isn't accumulated yet, raw bytes must be valid utf-8
+        :param time_max: initial maximum of request time
+        :return: slot of url
+        """
+
+        if isinstance(url, bytes):
+            url.decode("utf-8")
+
+        slot = len(self.urls)
+        self.slot_by_url[url] = slot
+        self.urls.append(url)
+        self.counts.append(0)
+        self.time_sums.append(0.0)
+        self.time_maxes.append(time_max)
+        if self.keeps_estimators:
+            self.time_estimators.append(QUANTILE_BACKENDS[self.quantile_backend]())
+
+        return slot
+
+    def consume(self, parsed_line_gen: Iterable[Tuple[Optional[str], Optional[float], bool]]) -> NoReturn:
+
+        """
+        Adds parsed lines to accumulated stats
+        :param parsed_line_gen: generator of parsed lines result (SingleLogParserResult or plain tuples),
+        with time bucket as the fourth item of tuple if accumulator keeps time buckets
+        """
+
+        if self.time_bucket_seconds is not None:
+            self._consume_timed(parsed_line_gen=parsed_line_gen)
+            return
 
-    for single_line_result in parsed_line_gen:
+        slot_by_url = self.slot_by_url
+        counts = self.counts
+        time_sums = self.time_sums
+        time_maxes = self.time_maxes
+        duration_slots = self.duration_slots
+        durations = self.durations
+        time_estimators = self.time_estimators
+        keeps_durations = self.keeps_durations
+        keeps_estimators = self.keeps_estimators
+
+        num_requests = 0
+        num_failures = 0
+        all_requests_time = self.all_requests_time
+
+        for curr_url, curr_time, is_failed in parsed_line_gen:
+
+            num_requests += 1
+
+            if is_failed:
+                num_failures += 1
+                continue
+
+            slot = slot_by_url.get(curr_url)
+            if slot is None:
+                try:
+                    slot = self._add_slot(url=curr_url, time_max=curr_time)
+                except UnicodeDecodeError:
+                    logging.error("Failed decoding url: %r", curr_url)
+                    num_failures += 1
+                    continue
+
+            counts[slot] += 1
+            time_sums[slot] += curr_time
+            if curr_time > time_maxes[slot]:
+                time_maxes[slot] = curr_time
+            if keeps_durations:
+                duration_slots.append(slot)
+                durations.append(curr_time)
+            if keeps_estimators:
+                time_estimators[slot].add(curr_time)
+            all_requests_time += curr_time
+
+        self.num_requests += num_requests
+        self.num_failures += num_failures
+        self.all_requests_time = all_requests_time
+
+    def _consume_timed(self, parsed_line_gen: Iterable[Tuple[Optional[str], Optional[float], bool, int]]) -> NoReturn:
+
+        """
+        Adds parsed lines with time buckets to accumulated stats, the same as consume does otherwise
+        :param parsed_line_gen: generator of (url, request time, is failed, time bucket) tuples
+        """
+
+        slot_by_url = self.slot_by_url
+        counts = self.counts
+        time_sums = self.time_sums
+        time_maxes = self.time_maxes
+        duration_slots = self.duration_slots
+        durations = self.durations
+        duration_buckets = self.duration_buckets
+        time_estimators = self.time_estimators
+        keeps_estimators = self.keeps_estimators
+
+        num_requests = 0
+        num_failures = 0
+        all_requests_time = self.all_requests_time
+
+        for curr_url, curr_time, is_failed, curr_bucket in parsed_line_gen:
+
+            num_requests += 1
+
+            if is_failed:
+                num_failures += 1
+                continue
+
+            slot = slot_by_url.get(curr_url)
+            if slot is None:
+                try:
+                    slot = self._add_slot(url=curr_url, time_max=curr_time)
+                except UnicodeDecodeError:
+                    logging.error("Failed decoding url: %r", curr_url)
+                    num_failures += 1
+                    continue
+
+            counts[slot] += 1
+            time_sums[slot] += curr_time
+            if curr_time > time_maxes[slot]:
+                time_maxes[slot] = curr_time
+            duration_slots.append(slot)
+            durations.append(curr_time)
+            duration_buckets.append(curr_bucket)
+            if keeps_estimators:
+                time_estimators[slot].add(curr_time)
+            all_requests_time += curr_time
+
+        self.num_requests += num_requests
+        self.num_failures += num_failures
+        self.all_requests_time = all_requests_time
+
+    def merge(self, other: "UrlStatsAccumulator") -> NoReturn:
+
+        """
+        Merges stats accumulated for another part of log into current one
+        :param other: accumulator of another part of log with the same quantile backend
+        """
+
+        self.num_requests += other.num_requests
+        self.num_failures += other.num_failures
+        self.all_requests_time += other.all_requests_time
+
+        slot_mapping = array("i")
+        for other_slot, url in enumerate(other.urls):
+            slot = self.slot_by_url.get(url)
+            if slot is None:
+                slot = self._add_slot(url=url, time_max=other.time_maxes[other_slot])
+            slot_mapping.append(slot)
+            self.counts[slot] += other.counts[other_slot]
+            self.time_sums[slot] += other.time_sums[other_slot]
+            if other.time_maxes[other_slot] > self.time_maxes[slot]:
+                self.time_maxes[slot] = other.time_maxes[other_slot]
+            if self.keeps_estimators:
+                self.time_estimators[slot].merge(other.time_estimators[other_slot])
+
+        if self.keeps_durations:
+            self.duration_slots.extend(slot_mapping[other_slot] for other_slot in other.duration_slots)
+            self.durations.extend(other.durations)
+            self.duration_buckets.extend(other.duration_buckets)
+
+    def add_url_totals(self, url: Union[str, bytes], count: int, time_sum: float, time_max: float) -> int:
+
+        """
+        Registers url with totals calculated outside of accumulator (e.g. merged from runs spilled to disk)
+        :param url: url that isn't accumulated yet, raw bytes must be valid utf-8
+        :param count: number of url requests
+        :param time_sum: total request time of url
+        :param time_max: maximum request time of url
+        :return: slot of url
+        """
+
+        if url in self.slot_by_url:
+            raise ValueError(f"Url {url!r} is already accumulated")
+
+        slot = self._add_slot(url=url, time_max=time_max)
+        self.counts[slot] = count
+        self.time_sums[slot] = time_sum
+
+        return slot
+
+    def consume_columns(self, columns: ParsedLogColumns) -> NoReturn:
+
+        """
+        Loads parsed log columns into empty accumulator. Url totals are taken as they are,
+        lines are iterated only to fill estimators of quantile backend other than "exact"
+        :param columns: parsed log columns
+        """
+
+        if self.urls or self.num_requests:
+            raise ValueError("Parsed log columns can be loaded only into empty accumulator")
+
+        self.urls = list(columns.urls)
+        self.slot_by_url = {url: slot for slot, url in enumerate(self.urls)}
+        self.counts.frombytes(columns.url_counts)
+        self.time_sums.frombytes(columns.url_time_sums)
+        self.time_maxes.frombytes(columns.url_time_maxes)
+        if self.keeps_durations:
+            self.duration_slots.frombytes(columns.url_slots)
+            self.durations.frombytes(columns.request_times)
+            self.duration_buckets.frombytes(columns.request_buckets)
+        if self.keeps_estimators:
+            self.time_estimators = [QUANTILE_BACKENDS[self.quantile_backend]() for _ in self.urls]
+            time_estimators = self.time_estimators
+            for slot, duration in zip(columns.url_slots.cast("i"), columns.request_times.cast("d")):
+                time_estimators[slot].add(duration)
+
+        self.num_requests = columns.num_lines
+        self.num_failures = columns.num_failures
+        self.all_requests_time = columns.all_requests_time
+
+    def url(self, slot: int) -> str:
+
+        """
+        Gets url of slot as string
+        :param slot: slot of url
+        :return: decoded url
+        """
+
+        url = self.urls[slot]
+
+        return url.decode("utf-8") if isinstance(url, bytes) else url
+
+    def top_slots(self, size: int) -> List[int]:
+
+        """
+        Finds slots of urls with the biggest total request time
+        :param size: number of slots to find
+        :return: slots in descending order of total request time
+        """
+
+        time_sums = self.time_sums
+
+        # nlargest keeps order of urls with equal time like stable sort does
+        return heapq.nlargest(
+            size,
+            range(len(self.urls)),
+            key=lambda slot: round(time_sums[slot], NUM_SIGNS_FOR_STATS)
+        )
 
-        num_requests += 1
+    def time_estimators_for(self, slots: Iterable[int]) -> Dict[int, ExactQuantiles]:
 
-        if single_line_result.is_failed:
-            num_failures += 1
-            continue
+        """
+        Gets request time estimators for selected slots. With flat columns
+        request times of selected slots are grouped in one pass
+        :param slots: slots to get estimators for
+        :return: estimators by slot
+        """
 
-        curr_url = single_line_result.url
+        if self.keeps_estimators:
+            return {slot: self.time_estimators[slot] for slot in slots}
 
-        if curr_url not in calculations_by_url:
-            calculations_by_url[curr_url] = {"num_times": 1, "time": [single_line_result.time]}
-        else:
-            calculations_by_url[curr_url]["num_times"] += 1
-            calculations_by_url[curr_url]["time"].append(single_line_result.time)
-        all_requests_time += single_line_result.time
+        estimators = {slot: ExactQuantiles() for slot in slots}
+        for slot, duration in zip(self.duration_slots, self.durations):
+            estimator = estimators.get(slot)
+            if estimator is not None:
+                estimator.values.append(duration)
+
+        return estimators
+
+    def time_series_for(self, slots: Iterable[int]) -> Dict[int, Dict[int, List]]:
+
+        """
+        Gets stats of time buckets for selected slots, request times of selected slots are grouped in one pass
+        :param slots: slots to get time series for
+        :return: [count, time sum, median estimator] by time bucket by slot
+        """
+
+        estimator_class = QUANTILE_BACKENDS[self.quantile_backend]
+        time_series = {slot: dict() for slot in slots}
+        for slot, duration, bucket in zip(self.duration_slots, self.durations, self.duration_buckets):
+            bucket_stats = time_series.get(slot)
+            if bucket_stats is None:
+                continue
+            stats = bucket_stats.get(bucket)
+            if stats is None:
+                stats = bucket_stats[bucket] = [0, 0.0, estimator_class()]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2].add(duration)
+
+        return time_series
+
+
+def create_url_stats_accumulator(cfg: Config) -> UrlStatsAccumulator:
+
+    """
+    Creates accumulator of url stats, request times are kept in flat columns
+    if they are needed for parsed log cache
+    :param cfg: application config
+    :return: empty accumulator
+    """
+
+    return UrlStatsAccumulator(
+        quantile_backend=cfg.quantile_backend,
+        keep_durations=cfg.parsed_cache_dir is not None,
+        time_bucket_seconds=cfg.time_bucket_seconds
+    )
+
+
+def check_failures_percentage(accumulator: UrlStatsAccumulator, cfg: Config) -> NoReturn:
+
+    """
+    Checks that percentage of failed lines over the whole log doesn't exceed threshold
+    :param accumulator: stats accumulated for the whole log
+    :param cfg: application config
+    """
 
-    failures_percentage = round(100 * num_failures / num_requests)
+    failures_percentage = round(100 * accumulator.num_failures / accumulator.num_requests)
     if failures_percentage > cfg.failures_percent_threshold:
         logging.error(
             "Failures percentage limit exceeded: threshold is %f, errors percentage is %f",
@@ -249,123 +1023,2061 @@ def calculate_url_stats(
         raise FailuresPercentageError
 
     logging.info("Errors percentage for line parsing is %f", failures_percentage)
-    result_by_url = dict()
-    for url in calculations_by_url:
-        num_times = calculations_by_url[url]["num_times"]
-        time_durations = calculations_by_url[url]["time"]
-        result_by_url[url] = {
-            "count": num_times,
-            "count_perc": round(100 * num_times / num_requests, NUM_SIGNS_FOR_STATS),
-            "time_sum": round(sum(time_durations), NUM_SIGNS_FOR_STATS),
-            "time_perc": round(100 * sum(time_durations) / all_requests_time, NUM_SIGNS_FOR_STATS),
-            "time_avg": round(sum(time_durations) / len(time_durations), NUM_SIGNS_FOR_STATS),
-            "time_max": round(max(time_durations), NUM_SIGNS_FOR_STATS),
-            "time_med": round(median(time_durations), NUM_SIGNS_FOR_STATS)
-        }
-
-    url_stats = dict(
-        sorted(
-            result_by_url.items(),
-            key=lambda url_stats_: url_stats_[1]["time_sum"],
-            reverse=True
-        )[:cfg.report_size]
-    )
-
-    url_stats_for_json = prepare_stats_for_json(url_stats=url_stats)
-
-    return url_stats_for_json
-
-
-def render_report(url_stats_for_json: Dict[str, Dict[str, Union[int, float]]],
-                  cfg: Config,
-                  report_name: str) -> NoReturn:
+
+
+def build_url_stat(
+        accumulator: UrlStatsAccumulator,
+        slot: int,
+        time_estimator: ExactQuantiles,
+        cfg: Config,
+        time_series: Optional[Dict[int, List]] = None
+) -> Dict[str, Union[int, float, str, dict]]:
+
     """
-    Takes report template and renders report for current log file
-    :param url_stats_for_json: url stats for log file
-    :param report_name: name of report that will be generated
+    Calculates stats of one url for report
+    :param accumulator: stats accumulated for the whole log
+    :param slot: slot of url
+    :param time_estimator: estimator of url request time quantiles
     :param cfg: application config
-    :return:
+    :param time_series: stats of url time buckets, None if time buckets are disabled
+    :return: url stats row
     """
 
-    report_template = os.path.join(cfg.report_dir, "report.html")
-    with open(report_template, "rt", encoding="utf-8") as report_template:
-        template_html = report_template.read()
+    num_times = accumulator.counts[slot]
+    time_sum = accumulator.time_sums[slot]
+    url_stat = {
+        "count": num_times,
+        "count_perc": round(100 * num_times / accumulator.num_requests, NUM_SIGNS_FOR_STATS),
+        "time_sum": round(time_sum, NUM_SIGNS_FOR_STATS),
+        "time_perc": round(100 * time_sum / accumulator.all_requests_time, NUM_SIGNS_FOR_STATS),
+        "time_avg": round(time_sum / num_times, NUM_SIGNS_FOR_STATS),
+        "time_max": round(accumulator.time_maxes[slot], NUM_SIGNS_FOR_STATS),
+        "time_med": round(time_estimator.quantile(0.5), NUM_SIGNS_FOR_STATS)
+    }
+    for percentile in cfg.report_percentiles:
+        url_stat[f"time_p{percentile:g}"] = round(
+            time_estimator.quantile(percentile / 100),
+            NUM_SIGNS_FOR_STATS
+        )
+    if time_series is not None:
+        url_stat["time_series"] = make_time_series(
+            bucket_stats=time_series,
+            bucket_seconds=cfg.time_bucket_seconds,
+            num_signs=NUM_SIGNS_FOR_STATS
+        )
+    url_stat["url"] = accumulator.url(slot=slot)
 
-    prepared_url_stats = json.dumps(url_stats_for_json)
-    fulfilled_template = Template(template_html).safe_substitute(table_json=prepared_url_stats)
+    return url_stat
 
-    with open(report_name, "w", encoding="utf-8") as prepared_report:
-        prepared_report.write(fulfilled_template)
 
+def iter_url_stats(
+        accumulator: UrlStatsAccumulator,
+        cfg: Config
+) -> Iterator[Dict[str, Union[int, float, str]]]:
 
-def generate_report(config: Config, log_file_pattern: re.Pattern) -> NoReturn:
+    """
+    Selects top urls by total request time and lazily calculates their stats for report.
+    Failures percentage is checked before any row is made
+    :param accumulator: stats accumulated for the whole log
+    :param cfg: application config
+    :return: generator of url stats rows in descending order of total request time
+    """
+
+    check_failures_percentage(accumulator=accumulator, cfg=cfg)
+
+    top_slots = select_top_url_slots(accumulator=accumulator, cfg=cfg)
+
+    return iter_top_url_stats(accumulator=accumulator, top_slots=top_slots, cfg=cfg)
+
+
+def uses_numpy(cfg: Config) -> bool:
 
     """
-    Generates report for the latest nginx log file
-    :param config: default application config
-    :param log_file_pattern: pattern for file name regular expression
-    :return:
+    Checks if url stats are calculated with NumPy, "numpy" aggregation backend falls back
+    to pure Python one if NumPy isn't installed
+    :param cfg: application config
+    :return: if NumPy backend is used
     """
 
-    try:
-        logging.info("Trying to find latest log file from directory %s", config.log_dir)
-        latest_log_file = find_latest_log(log_dir=config.log_dir, log_file_pattern=log_file_pattern)
+    if cfg.aggregation_backend != "numpy":
+        return False
+    if not is_numpy_available():
+        logging.warning("NumPy isn't installed, url stats are calculated with python aggregation backend")
+        return False
 
-        if latest_log_file is None:
-            logging.info("No log file to generate report for")
-            return
+    return True
 
-        logging.info("Latest log file is %s", latest_log_file.path)
 
-        logging.info("Generating report name for log file: %s", latest_log_file.path)
-        report_name = generate_report_name(cfg=config, log_file=latest_log_file)
-        logging.info("Report name is %s", report_name)
+def select_top_url_slots(accumulator: UrlStatsAccumulator, cfg: Config) -> List[int]:
 
-        if os.path.exists(report_name):
-            logging.info("Report for this log is already done")
-            return
-        log_file_opener = gzip.open if latest_log_file.extension == ".gz" else open
+    """
+    Selects slots of urls for report with aggregation backend from config
+    :param accumulator: stats accumulated for the whole log
+    :param cfg: application config
+    :return: slots in descending order of total request time
+    """
 
-        logging.info("Started to parse log file: %s", latest_log_file.path)
-        parsed_line_gen = parse_log_file(
-            log_file=latest_log_file,
-            log_file_opener=log_file_opener
-        )
-        logging.info("Started to calculate stats for url from file: %s", latest_log_file.path)
-        url_stats_for_report = calculate_url_stats(parsed_line_gen=parsed_line_gen, cfg=config)
-        logging.info("Successfully calculated stats by url from file: %s", latest_log_file.path)
+    if uses_numpy(cfg=cfg):
+        return select_top_slots(time_sums=accumulator.time_sums, size=cfg.report_size, num_signs=NUM_SIGNS_FOR_STATS)
 
-        logging.info("Rendering template for report %s", report_name)
-        render_report(url_stats_for_json=url_stats_for_report,
-                      cfg=config,
-                      report_name=report_name)
-        logging.info("Successfully generated report %s", report_name)
+    return accumulator.top_slots(size=cfg.report_size)
 
-    except Exception:
-        logging.exception("Something went wrong during generating report")
 
+def get_time_estimators(
+        accumulator: UrlStatsAccumulator,
+        slots: List[int],
+        cfg: Config
+) -> Dict[int, ExactQuantiles]:
 
-if __name__ == "__main__":
+    """
+    Gets request time estimators of report urls. With "numpy" aggregation backend quantiles
+    of request times kept in flat columns are calculated for all report urls at once
+    :param accumulator: stats accumulated for the whole log
+    :param slots: slots of report urls
+    :param cfg: application config
+    :return: estimators by slot
+    """
 
-    parser = ArgumentParser()
-    parser.add_argument(
-        "--config",
-        type=FileType("rt"),
-        default="./config.json",
-        help="Path to config file"
+    if accumulator.keeps_estimators or not uses_numpy(cfg=cfg):
+        return accumulator.time_estimators_for(slots=slots)
+
+    return calculate_quantiles(
+        duration_slots=accumulator.duration_slots,
+        durations=accumulator.durations,
+        slots=slots,
+        levels=[0.5] + [percentile / 100 for percentile in cfg.report_percentiles]
     )
-    args = parser.parse_args()
-    config_from_file = json.load(args.config)
 
-    conf = get_config_parameters(
-        default_config=CONFIG,
-        config_from_file_=config_from_file
+
+def iter_top_url_stats(
+        accumulator: UrlStatsAccumulator,
+        top_slots: List[int],
+        cfg: Config
+) -> Iterator[Dict[str, Union[int, float, str, dict]]]:
+
+    """
+    Lazily calculates stats of selected urls for report, with time series of urls if time buckets are enabled
+    :param accumulator: stats accumulated for the whole log
+    :param top_slots: slots of urls for report
+    :param cfg: application config
+    :return: generator of url stats rows in order of slots
+    """
+
+    time_estimators = get_time_estimators(accumulator=accumulator, slots=top_slots, cfg=cfg)
+    if cfg.time_bucket_seconds is None:
+        return (
+            build_url_stat(accumulator=accumulator, slot=slot, time_estimator=time_estimators.pop(slot), cfg=cfg)
+            for slot in top_slots
+        )
+
+    time_series = accumulator.time_series_for(slots=top_slots)
+
+    return (
+        build_url_stat(
+            accumulator=accumulator,
+            slot=slot,
+            time_estimator=time_estimators.pop(slot),
+            cfg=cfg,
+            time_series=time_series.pop(slot)
+        )
+        for slot in top_slots
     )
 
-    logging.basicConfig(
-        filename=conf.log_file,
-        format="[%(asctime)s] %(levelname).1s %(message)s",
-        datefmt="%Y.%m.%d %H:%M:%S",
-        level=logging.INFO
+
+def build_url_stats(
+        accumulator: UrlStatsAccumulator,
+        cfg: Config
+) -> List[Dict[str, Union[int, float, str]]]:
+
+    """
+    Calculates url stats for report from accumulated stats
+    :param accumulator: stats accumulated for the whole log
+    :param cfg: application config
+    :return: url stats for log file
+    """
+
+    return list(iter_url_stats(accumulator=accumulator, cfg=cfg))
+
+
+def calculate_url_stats(
+        parsed_line_gen: Iterable[Tuple[Optional[str], Optional[float], bool]],
+        cfg: Config
+) -> List[Dict[str, Union[int, float]]]:
+
+    """
+    Calculates url stats for report
+    :param parsed_line_gen: generator of parsed lines result
+    :param cfg application config
+    :return: url stats for log file
+    """
+
+    accumulator = create_url_stats_accumulator(cfg=cfg)
+    accumulator.consume(parsed_line_gen=parsed_line_gen)
+
+    return build_url_stats(accumulator=accumulator, cfg=cfg)
+
+
+def calculate_partial_url_stats(
+        log_file_path: str,
+        start: int,
+        end: int,
+        cfg: Config
+) -> UrlStatsAccumulator:
+
+    """
+    Parses byte range of log file and accumulates url stats for it.
+    Runs in worker process
+    :param log_file_path: path to uncompressed log file
+    :param start: offset of the first line in range
+    :param end: offset right after the last line in range
+    :param cfg: application config
+    :return: partial url stats for the range
+    """
+
+    accumulator = create_url_stats_accumulator(cfg=cfg)
+    accumulator.consume(
+        parsed_line_gen=parse_log_byte_lines(
+            log_lines=read_log_file_range(log_file_path=log_file_path, start=start, end=end, reader=cfg.reader),
+            cfg=cfg
+        )
+    )
+
+    return accumulator
+
+
+def calculate_partial_gzip_url_stats(
+        gzip_file_path: str,
+        gzip_index: GzipIndex,
+        first_member: int,
+        end_member: Optional[int],
+        cfg: Config
+) -> UrlStatsAccumulator:
+
+    """
+    Decompresses region of gzip members and accumulates url stats for it.
+    Runs in worker process
+    :param gzip_file_path: path to gzip log file
+    :param gzip_index: seek points of gzip file
+    :param first_member: first member of region
+    :param end_member: first member of next region or None for the last region
+    :param cfg: application config
+    :return: partial url stats for the region
+    """
+
+    accumulator = create_url_stats_accumulator(cfg=cfg)
+    accumulator.consume(
+        parsed_line_gen=parse_log_byte_lines(
+            log_lines=read_gzip_region(
+                gzip_file_path=gzip_file_path,
+                gzip_index=gzip_index,
+                first_member=first_member,
+                end_member=end_member
+            ),
+            cfg=cfg
+        )
     )
-    generate_report(config=conf, log_file_pattern=LOG_FILE_PATTERN)
\ No newline at end of file
+
+    return accumulator
+
+
+def accumulate_gzip_log_in_parallel(log_file: LatestLogFile, cfg: Config) -> Optional[UrlStatsAccumulator]:
+
+    """
+    Accumulates url stats decompressing and parsing regions of gzip log in process pool
+    :param log_file: gzip file with logs
+    :param cfg: application config
+    :return: url stats accumulated for log file or None if gzip file has only one seek point
+    """
+
+    gzip_index = load_or_build_gzip_index(gzip_file_path=log_file.path)
+    gzip_regions = split_gzip_index(gzip_index=gzip_index, num_regions=cfg.workers)
+    if len(gzip_regions) < 2:
+        logging.info("Gzip log file %s can't be split, it has %d members", log_file.path, len(gzip_index.members))
+        return None
+    logging.info("Gzip log file %s is split into %d regions", log_file.path, len(gzip_regions))
+
+    accumulator = create_url_stats_accumulator(cfg=cfg)
+    with ProcessPoolExecutor(max_workers=cfg.workers) as executor:
+        partial_stats = executor.map(
+            calculate_partial_gzip_url_stats,
+            [log_file.path] * len(gzip_regions),
+            [gzip_index] * len(gzip_regions),
+            [first_member for first_member, _ in gzip_regions],
+            [end_member for _, end_member in gzip_regions],
+            [cfg] * len(gzip_regions)
+        )
+        for partial_accumulator in partial_stats:
+            accumulator.merge(other=partial_accumulator)
+
+    return accumulator
+
+
+def accumulate_log_range_in_parallel(
+        log_file_path: str,
+        start: int,
+        end: int,
+        cfg: Config
+) -> UrlStatsAccumulator:
+
+    """
+    Accumulates url stats parsing byte ranges of uncompressed log part in process pool
+    :param log_file_path: path to uncompressed log file
+    :param start: offset of the first line of part
+    :param end: offset right after the last line of part
+    :param cfg: application config
+    :return: url stats accumulated for the part
+    """
+
+    log_ranges = split_log_file(log_file_path=log_file_path, num_chunks=cfg.workers, start=start, end=end)
+    logging.info("Log file %s is split into %d ranges", log_file_path, len(log_ranges))
+
+    accumulator = create_url_stats_accumulator(cfg=cfg)
+    with ProcessPoolExecutor(max_workers=cfg.workers) as executor:
+        partial_stats = executor.map(
+            calculate_partial_url_stats,
+            [log_file_path] * len(log_ranges),
+            [start for start, _ in log_ranges],
+            [end for _, end in log_ranges],
+            [cfg] * len(log_ranges)
+        )
+        for partial_accumulator in partial_stats:
+            accumulator.merge(other=partial_accumulator)
+
+    return accumulator
+
+
+def calculate_url_stats_in_parallel(
+        log_file: LatestLogFile,
+        cfg: Config
+) -> List[Dict[str, Union[int, float]]]:
+
+    """
+    Calculates url stats for report parsing byte ranges of uncompressed log in process pool
+    :param log_file: uncompressed file with logs to parse
+    :param cfg: application config
+    :return: url stats for log file
+    """
+
+    accumulator = accumulate_log_range_in_parallel(
+        log_file_path=log_file.path,
+        start=0,
+        end=os.path.getsize(log_file.path),
+        cfg=cfg
+    )
+
+    return build_url_stats(accumulator=accumulator, cfg=cfg)
+
+
+def generate_checkpoint_name(report_name: str) -> str:
+
+    """
+    Generates name for checkpoint of incremental analysis next to report
+    :param report_name: name of report
+    :return: name for checkpoint
+    """
+
+    report_name_without_extension, _ = os.path.splitext(report_name)
+
+    return f"{report_name_without_extension}.checkpoint"
+
+
+def generate_metrics_name(report_name: str) -> str:
+
+    """
+    Generates name for metrics of run next to report
+    :param report_name: name of report
+    :return: name for metrics file
+    """
+
+    report_name_without_extension, _ = os.path.splitext(report_name)
+
+    return f"{report_name_without_extension}.metrics.json"
+
+
+def read_log_file_head_checksum(log_file_path: str, size: int) -> int:
+
+    """
+    Calculates checksum of log file beginning to recognize rewritten file with the same inode
+    :param log_file_path: path to uncompressed log file
+    :param size: number of bytes from the beginning of file
+    :return: crc32 of file beginning
+    """
+
+    with open(log_file_path, "rb") as analyzed_log:
+        return zlib.crc32(analyzed_log.read(size))
+
+
+def load_checkpoint(checkpoint_name: str, log_file: LatestLogFile, cfg: Config) -> Optional[LogCheckpoint]:
+
+    """
+    Loads checkpoint of incremental analysis if it is still valid for log file:
+    the same file (device, inode and beginning) that isn't truncated, analyzed with the same settings
+    :param checkpoint_name: path to checkpoint
+    :param log_file: uncompressed file with logs
+    :param cfg: application config
+    :return: checkpoint or None if there is no valid checkpoint
+    """
+
+    if not os.path.exists(checkpoint_name):
+        return None
+
+    try:
+        with open(checkpoint_name, "rb") as checkpoint_file:
+            checkpoint = pickle.load(checkpoint_file)
+    except Exception:
+        logging.exception("Failed to load checkpoint %s, log will be analyzed from the beginning", checkpoint_name)
+        return None
+
+    log_file_stat = os.stat(log_file.path)
+    if (
+        not isinstance(checkpoint, LogCheckpoint)
+        or checkpoint.version != CHECKPOINT_VERSION
+        or checkpoint.settings != checkpoint_settings(cfg=cfg)
+        or (checkpoint.device, checkpoint.inode) != (log_file_stat.st_dev, log_file_stat.st_ino)
+        or checkpoint.offset > log_file_stat.st_size
+        or checkpoint.head_checksum != read_log_file_head_checksum(
+            log_file_path=log_file.path,
+            size=min(CHECKPOINT_HEAD_SIZE, checkpoint.offset)
+        )
+    ):
+        logging.info("Checkpoint %s doesn't match log file %s anymore", checkpoint_name, log_file.path)
+        return None
+
+    return checkpoint
+
+
+def save_checkpoint(checkpoint_name: str, checkpoint: LogCheckpoint) -> NoReturn:
+
+    """
+    Atomically saves checkpoint of incremental analysis
+    :param checkpoint_name: path to checkpoint
+    :param checkpoint: checkpoint to save
+    """
+
+    temporary_checkpoint_name = f"{checkpoint_name}.tmp"
+    with open(temporary_checkpoint_name, "wb") as checkpoint_file:
+        pickle.dump(checkpoint, checkpoint_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_checkpoint_name, checkpoint_name)
+
+
+def checkpoint_settings(cfg: Config) -> Tuple[str, str, str, UrlNormalizationRules, Optional[int]]:
+
+    """
+    Gets config parameters that change accumulated stats, checkpoint made with other ones can't be resumed
+    :param cfg: application config
+    :return: parser, log format, quantile backend, url normalization rules and length of time buckets
+    """
+
+    return cfg.parser, cfg.log_format, cfg.quantile_backend, cfg.url_normalization, cfg.time_bucket_seconds
+
+
+def accumulate_url_stats_incrementally(
+        log_file: LatestLogFile,
+        cfg: Config,
+        checkpoint_name: str,
+        metrics: Optional[RunMetrics] = None
+) -> Optional[UrlStatsAccumulator]:
+
+    """
+    Accumulates url stats parsing only lines appended to log since last checkpoint
+    and saves new checkpoint with merged stats
+    :param log_file: uncompressed file with logs, maybe still being written
+    :param cfg: application config
+    :param checkpoint_name: path to checkpoint
+    :param metrics: metrics of run to count lines and bytes read since last checkpoint
+    :return: url stats accumulated for log file or None if no lines were appended since last checkpoint
+    """
+
+    checkpoint = load_checkpoint(checkpoint_name=checkpoint_name, log_file=log_file, cfg=cfg)
+    if checkpoint is None:
+        start = 0
+        accumulator = create_url_stats_accumulator(cfg=cfg)
+    else:
+        start = checkpoint.offset
+        accumulator = checkpoint.accumulator
+
+    log_file_stat = os.stat(log_file.path)
+    end = find_last_line_end(log_file_path=log_file.path, start=start, end=log_file_stat.st_size)
+    if checkpoint is not None and end == start:
+        return None
+
+    logging.info("Parsing bytes from %d to %d of log file %s", start, end, log_file.path)
+    num_accumulated_lines = accumulator.num_requests
+    if cfg.workers > 1:
+        accumulator.merge(
+            other=accumulate_log_range_in_parallel(log_file_path=log_file.path, start=start, end=end, cfg=cfg)
+        )
+    else:
+        accumulator.consume(
+            parsed_line_gen=parse_log_byte_lines(
+                log_lines=read_log_file_range(
+                    log_file_path=log_file.path,
+                    start=start,
+                    end=end,
+                    reader=cfg.reader
+                ),
+                cfg=cfg
+            )
+        )
+
+    save_checkpoint(
+        checkpoint_name=checkpoint_name,
+        checkpoint=LogCheckpoint(
+            version=CHECKPOINT_VERSION,
+            device=log_file_stat.st_dev,
+            inode=log_file_stat.st_ino,
+            offset=end,
+            head_checksum=read_log_file_head_checksum(
+                log_file_path=log_file.path,
+                size=min(CHECKPOINT_HEAD_SIZE, end)
+            ),
+            settings=checkpoint_settings(cfg=cfg),
+            accumulator=accumulator
+        )
+    )
+    logging.info("Saved checkpoint %s at offset %d", checkpoint_name, end)
+
+    if metrics is not None:
+        metrics.count(name="lines_read", value=accumulator.num_requests - num_accumulated_lines)
+        metrics.count(name="bytes_read", value=end - start)
+
+    return accumulator
+
+
+def calculate_url_stats_incrementally(
+        log_file: LatestLogFile,
+        cfg: Config,
+        checkpoint_name: str
+) -> Optional[List[Dict[str, Union[int, float]]]]:
+
+    """
+    Calculates url stats for report parsing only lines appended to log since last checkpoint
+    :param log_file: uncompressed file with logs, maybe still being written
+    :param cfg: application config
+    :param checkpoint_name: path to checkpoint
+    :return: url stats for log file or None if no lines were appended since last checkpoint
+    """
+
+    accumulator = accumulate_url_stats_incrementally(log_file=log_file, cfg=cfg, checkpoint_name=checkpoint_name)
+    if accumulator is None:
+        return None
+
+    return build_url_stats(accumulator=accumulator, cfg=cfg)
+
+
+def generate_parsed_cache_name(cfg: Config, log_file: LatestLogFile) -> str:
+
+    """
+    Generates name for columnar cache of parsed log
+    :param cfg: application config
+    :param log_file: file with logs
+    :return: path to cache directory
+    """
+
+    return os.path.join(cfg.parsed_cache_dir, f"{os.path.basename(log_file.path)}.parsed")
+
+
+def parsed_cache_fingerprint(log_file: LatestLogFile) -> Dict[str, int]:
+
+    """
+    Gets fingerprint of log file that changes if log file is rewritten or appended
+    :param log_file: file with logs
+    :return: size and mtime of log file
+    """
+
+    log_file_stat = os.stat(log_file.path)
+
+    return {"size": log_file_stat.st_size, "mtime_ns": log_file_stat.st_mtime_ns}
+
+
+def parsed_cache_settings(cfg: Config) -> Dict[str, object]:
+
+    """
+    Gets config parameters that change parsed lines, cache made with other ones can't be used
+    :param cfg: application config
+    :return: parser, log format, url normalization rules and length of time buckets
+    """
+
+    return {
+        "parser": cfg.parser,
+        "log_format": cfg.log_format,
+        "url_normalization": cfg.url_normalization._asdict(),
+        "time_bucket_seconds": cfg.time_bucket_seconds
+    }
+
+
+def accumulate_log_file(log_file: LatestLogFile, cfg: Config) -> UrlStatsAccumulator:
+
+    """
+    Accumulates url stats for the whole log file. With PARSED_CACHE_DIR lines are loaded
+    from columnar cache of parsed log if it is valid, otherwise log is parsed and cache is saved
+    :param log_file: file with logs to parse
+    :param cfg: application config
+    :return: url stats accumulated for log file
+    """
+
+    if cfg.parsed_cache_dir is None:
+        return parse_log_file_into_accumulator(log_file=log_file, cfg=cfg)
+
+    cache_name = generate_parsed_cache_name(cfg=cfg, log_file=log_file)
+    fingerprint = parsed_cache_fingerprint(log_file=log_file)
+    settings = parsed_cache_settings(cfg=cfg)
+
+    columns = load_parsed_log(cache_name=cache_name, fingerprint=fingerprint, settings=settings)
+    if columns is not None:
+        logging.info("Loading parsed log file %s from cache %s", log_file.path, cache_name)
+        accumulator = create_url_stats_accumulator(cfg=cfg)
+        accumulator.consume_columns(columns=columns)
+        return accumulator
+
+    accumulator = parse_log_file_into_accumulator(log_file=log_file, cfg=cfg)
+    try:
+        os.makedirs(cfg.parsed_cache_dir, exist_ok=True)
+        save_parsed_log(
+            cache_name=cache_name,
+            columns=ParsedLogColumns(
+                urls=accumulator.urls,
+                url_slots=accumulator.duration_slots,
+                request_times=accumulator.durations,
+                request_buckets=accumulator.duration_buckets,
+                url_counts=accumulator.counts,
+                url_time_sums=accumulator.time_sums,
+                url_time_maxes=accumulator.time_maxes,
+                num_failures=accumulator.num_failures,
+                all_requests_time=accumulator.all_requests_time
+            ),
+            fingerprint=fingerprint,
+            settings=settings
+        )
+        logging.info("Saved parsed log file %s to cache %s", log_file.path, cache_name)
+    except OSError:
+        logging.exception("Failed to save parsed log cache %s", cache_name)
+
+    return accumulator
+
+
+def parse_log_file_into_accumulator(log_file: LatestLogFile, cfg: Config) -> UrlStatsAccumulator:
+
+    """
+    Accumulates url stats parsing the whole log file, uncompressed logs are parsed with workers from config
+    :param log_file: file with logs to parse
+    :param cfg: application config
+    :return: url stats accumulated for log file
+    """
+
+    if cfg.workers > 1 and log_file.extension != ".gz":
+        logging.info("Started to calculate stats for url from file %s with %d workers", log_file.path, cfg.workers)
+        return accumulate_log_range_in_parallel(
+            log_file_path=log_file.path,
+            start=0,
+            end=os.path.getsize(log_file.path),
+            cfg=cfg
+        )
+
+    if cfg.workers > 1 and cfg.gzip_index and log_file.extension == ".gz":
+        logging.info("Started to calculate stats for url from gzip file %s with %d workers", log_file.path, cfg.workers)
+        accumulator = accumulate_gzip_log_in_parallel(log_file=log_file, cfg=cfg)
+        if accumulator is not None:
+            return accumulator
+
+    logging.info("Started to parse log file: %s", log_file.path)
+    accumulator = create_url_stats_accumulator(cfg=cfg)
+    accumulator.consume(parsed_line_gen=parse_log_file_by_config(log_file=log_file, cfg=cfg))
+
+    return accumulator
+
+
+def generate_sample_report_name(report_name: str) -> str:
+
+    """
+    Generates name of approximate report made from sample, so that it doesn't hide that full report is not done
+    :param report_name: name of full report
+    :return: path to report, e.g. report-2017.06.30.sample.html
+    """
+
+    report_name_prefix, report_name_extension = os.path.splitext(report_name)
+
+    return f"{report_name_prefix}.sample{report_name_extension}"
+
+
+def accumulate_log_sample(log_file: LatestLogFile, cfg: Config) -> LogSample:
+
+    """
+    Accumulates url stats for randomly sampled blocks of uncompressed log file one block after another.
+    Analysis stops as soon as failures percentage exceeds threshold with high confidence
+    :param log_file: file with logs to sample
+    :param cfg: application config
+    :return: stats of sampled blocks
+    """
+
+    ranges = choose_sample_ranges(
+        log_file_path=log_file.path,
+        rate=cfg.sample_rate,
+        block_size=cfg.sample_block_size,
+        seed=cfg.sample_seed
+    )
+    logging.info(
+        "Sampling %d of %d blocks (%d of %d bytes) of log file %s",
+        len(ranges.ranges),
+        ranges.num_blocks,
+        ranges.sampled_size,
+        ranges.file_size,
+        log_file.path
+    )
+
+    accumulator = UrlStatsAccumulator(
+        quantile_backend=cfg.quantile_backend,
+        keep_durations=True,
+        time_bucket_seconds=cfg.time_bucket_seconds
+    )
+    sample = LogSample(
+        accumulator=accumulator,
+        ranges=ranges,
+        block_ends=list(),
+        block_requests=list(),
+        block_times=list()
+    )
+    block_failures = list()
+
+    for start, end in ranges.ranges:
+        num_requests, num_failures, all_requests_time = (
+            accumulator.num_requests, accumulator.num_failures, accumulator.all_requests_time
+        )
+        accumulator.consume(
+            parsed_line_gen=parse_log_byte_lines(
+                log_lines=read_log_file_range(log_file_path=log_file.path, start=start, end=end, reader=cfg.reader),
+                cfg=cfg
+            )
+        )
+        sample.block_ends.append(len(accumulator.durations))
+        sample.block_requests.append(accumulator.num_requests - num_requests)
+        sample.block_times.append(accumulator.all_requests_time - all_requests_time)
+        block_failures.append(accumulator.num_failures - num_failures)
+        check_sampled_failures_percentage(block_failures=block_failures, sample=sample, cfg=cfg)
+
+    return sample
+
+
+def check_sampled_failures_percentage(block_failures: List[int], sample: LogSample, cfg: Config) -> NoReturn:
+
+    """
+    Stops analysis of sample if failures percentage of the whole log exceeds threshold with high confidence
+    :param block_failures: number of failed lines in every sampled block
+    :param sample: stats of blocks sampled so far
+    :param cfg: application config
+    """
+
+    if len(block_failures) < MIN_BLOCKS_TO_ABORT:
+        return
+
+    failures_ratio, failures_ratio_low, _ = ratio_confidence_interval(
+        numerators=block_failures,
+        denominators=sample.block_requests,
+        num_blocks=sample.ranges.num_blocks,
+        z=ABORT_CONFIDENCE_Z
+    )
+    if 100 * failures_ratio_low > cfg.failures_percent_threshold:
+        logging.error(
+            "Failures percentage limit exceeded after %d sampled blocks: threshold is %f, "
+            "errors percentage is %f (at least %f)",
+            len(block_failures),
+            cfg.failures_percent_threshold,
+            100 * failures_ratio,
+            100 * failures_ratio_low
+        )
+        raise FailuresPercentageError
+
+
+def iter_sampled_url_stats(sample: LogSample, cfg: Config) -> Iterator[Dict[str, Union[int, float, str, list]]]:
+
+    """
+    Calculates url stats for report from sample: counts and sums are scaled up to the whole log,
+    count_perc and time_perc get 95% confidence intervals estimated from variation between blocks
+    :param sample: stats of sampled blocks
+    :param cfg: application config
+    :return: generator of url stats rows in descending order of total request time
+    """
+
+    accumulator = sample.accumulator
+    check_failures_percentage(accumulator=accumulator, cfg=cfg)
+
+    top_slots = select_top_url_slots(accumulator=accumulator, cfg=cfg)
+    block_counts = {slot: [0] * len(sample.block_ends) for slot in top_slots}
+    block_time_sums = {slot: [0.0] * len(sample.block_ends) for slot in top_slots}
+    block = 0
+    for position, (slot, duration) in enumerate(zip(accumulator.duration_slots, accumulator.durations)):
+        while position >= sample.block_ends[block]:
+            block += 1
+        counts = block_counts.get(slot)
+        if counts is not None:
+            counts[block] += 1
+            block_time_sums[slot][block] += duration
+
+    return (
+        scale_sampled_url_stat(
+            url_stat=url_stat,
+            sample=sample,
+            slot=slot,
+            block_counts=block_counts.pop(slot),
+            block_time_sums=block_time_sums.pop(slot)
+        )
+        for slot, url_stat in zip(top_slots, iter_top_url_stats(accumulator=accumulator, top_slots=top_slots, cfg=cfg))
+    )
+
+
+def scale_sampled_url_stat(
+        url_stat: Dict[str, Union[int, float, str, list]],
+        sample: LogSample,
+        slot: int,
+        block_counts: List[int],
+        block_time_sums: List[float]
+) -> Dict[str, Union[int, float, str, list]]:
+
+    """
+    Scales count and time sum of url up to the whole log and adds confidence intervals of its percentages
+    :param url_stat: url stats row calculated for sample
+    :param sample: stats of sampled blocks
+    :param slot: slot of url
+    :param block_counts: number of url requests in every sampled block
+    :param block_time_sums: total request time of url in every sampled block
+    :return: url stats row for the whole log
+    """
+
+    url_stat["count"] = round(url_stat["count"] * sample.scale)
+    url_stat["time_sum"] = round(sample.accumulator.time_sums[slot] * sample.scale, NUM_SIGNS_FOR_STATS)
+    for column, numerators, denominators in (
+            ("count_perc", block_counts, sample.block_requests),
+            ("time_perc", block_time_sums, sample.block_times)
+    ):
+        _, ratio_low, ratio_high = ratio_confidence_interval(
+            numerators=numerators,
+            denominators=denominators,
+            num_blocks=sample.ranges.num_blocks,
+            z=REPORT_CONFIDENCE_Z
+        )
+        url_stat[f"{column}_ci"] = [
+            round(100 * ratio_low, NUM_SIGNS_FOR_STATS),
+            round(100 * ratio_high, NUM_SIGNS_FOR_STATS)
+        ]
+
+    return url_stat
+
+
+def accumulate_heavy_hitters(log_file: LatestLogFile, cfg: Config) -> HeavyHitters:
+
+    """
+    Accumulates stats of urls with the biggest total request time in HEAVY_HITTERS_CAPACITY counters,
+    so that memory doesn't grow with number of distinct urls of log
+    :param log_file: file with logs to parse
+    :param cfg: application config
+    :return: heavy hitters summary of log
+    """
+
+    heavy_hitters = HeavyHitters(capacity=cfg.heavy_hitters_capacity)
+    add = heavy_hitters.add
+    for url, duration, is_failed, client in parse_log_file_by_config(log_file=log_file, cfg=cfg, with_clients=True):
+        if is_failed:
+            heavy_hitters.num_failures += 1
+            heavy_hitters.num_requests += 1
+            continue
+        add(url, duration, client)
+
+    logging.info(
+        "Tracked %d of about %d distinct urls, total request time of url is overestimated by %f s at most",
+        len(heavy_hitters.urls),
+        heavy_hitters.distinct_urls.estimate(),
+        heavy_hitters.max_time_error()
+    )
+
+    return heavy_hitters
+
+
+def iter_heavy_hitter_url_stats(
+        heavy_hitters: HeavyHitters,
+        cfg: Config
+) -> Iterator[Dict[str, Union[int, float, str]]]:
+
+    """
+    Calculates url stats for report from heavy hitters summary. Count and time sum of url are upper bounds,
+    count_error and time_sum_error columns show how much they can exceed true values,
+    clients column is estimated number of distinct client addresses of url
+    :param heavy_hitters: heavy hitters summary of log
+    :param cfg: application config
+    :return: generator of url stats rows in descending order of total request time
+    """
+
+    check_failures_percentage(accumulator=heavy_hitters, cfg=cfg)
+
+    return (
+        dict(
+            build_url_stat(
+                accumulator=heavy_hitters,
+                slot=slot,
+                time_estimator=heavy_hitters.time_estimators[slot],
+                cfg=cfg
+            ),
+            count_error=heavy_hitters.count_errors[slot],
+            time_sum_error=round(heavy_hitters.time_errors[slot], NUM_SIGNS_FOR_STATS),
+            clients=heavy_hitters.clients[slot].estimate()
+        )
+        for slot in heavy_hitters.top_slots(size=cfg.report_size)
+    )
+
+
+class SpilledUrlStats(NamedTuple):
+
+    """
+    Class with exact url stats calculated with disk spilling such as:
+    - accumulator: totals of log and stats of report urls only, slots are in order of the first line of url
+    - time_estimators: precomputed quantiles of request time of report urls by slot
+    - num_urls: number of distinct urls of log
+    """
+
+    accumulator: UrlStatsAccumulator
+    time_estimators: Dict[int, PrecomputedQuantiles]
+    num_urls: int
+
+
+def accumulate_with_spilling(log_file: LatestLogFile, cfg: Config) -> SpilledUrlStats:
+
+    """
+    Calculates exact url stats of log in MEMORY_LIMIT: (url, line position, request time) records are buffered
+    while they fit into half of memory left after analyzer itself and SPILL_HEADROOM (the other half is
+    for sorting them), then sorted runs are spilled to SPILL_DIR and merged with k-way merge. Merged records
+    of every url go in line order, so that sums are added in the same order as in memory and report is the same.
+    Request times of the current url are sorted in the other half of memory and spilled as sorted runs too
+    when url has more of them. Quantiles are calculated only for urls that can get into report,
+    values at their ranks are picked from merged request times of url
+    :param log_file: file with logs to parse
+    :param cfg: application config
+    :return: stats of report urls
+    """
+
+    memory_budget = (cfg.memory_limit - (get_peak_rss() or 0) - SPILL_HEADROOM) // 2
+    if memory_budget <= 0:
+        raise ValueError(f"Memory limit {cfg.memory_limit} is below memory of analyzer itself")
+
+    accumulator = UrlStatsAccumulator()
+    num_requests = 0
+    num_failures = 0
+    all_requests_time = 0
+    with tempfile.TemporaryDirectory(prefix="log_analyzer-", dir=cfg.spill_dir) as spill_dir:
+        runs = SpillingRuns(memory_budget=memory_budget, spill_dir=spill_dir)
+        add = runs.add
+        for curr_url, curr_time, is_failed in parse_log_file_by_config(log_file=log_file, cfg=cfg):
+            position = num_requests
+            num_requests += 1
+            if is_failed:
+                num_failures += 1
+                continue
+            if isinstance(curr_url, bytes):
+                try:
+                    curr_url.decode("utf-8")
+                except UnicodeDecodeError:
+                    logging.error("Failed decoding url: %r", curr_url)
+                    num_failures += 1
+                    continue
+            else:
+                curr_url = curr_url.encode("utf-8")
+            add(curr_url, position, curr_time)
+            all_requests_time += curr_time
+        logging.info("Spilled %d sorted runs of log file %s to %s", len(runs.run_names), log_file.path, spill_dir)
+
+        levels = [0.5] + [percentile / 100 for percentile in cfg.report_percentiles]
+        durations = SpillingDurations(memory_budget=memory_budget, spill_dir=spill_dir)
+        add_duration = durations.add
+        # Min-heap of report candidates by the same key as UrlStatsAccumulator.top_slots uses,
+        # url with earlier first line wins among urls with equal rounded time like it does there
+        top_urls = list()
+        num_urls = 0
+        for url, records in groupby(runs.merged(), key=itemgetter(0)):
+            num_urls += 1
+            _, first_position, time_max = next(records)
+            time_sum = 0.0 + time_max
+            count = 1
+            add_duration(time_max)
+            for _, _, duration in records:
+                time_sum += duration
+                count += 1
+                if duration > time_max:
+                    time_max = duration
+                add_duration(duration)
+
+            key = (round(time_sum, NUM_SIGNS_FOR_STATS), -first_position)
+            if cfg.report_size <= 0 or (len(top_urls) == cfg.report_size and key < top_urls[0][0]):
+                durations.clear()
+                continue
+            candidate = (
+                key,
+                url,
+                count,
+                time_sum,
+                time_max,
+                PrecomputedQuantiles(select_quantiles(sorted_values=durations.merged(), count=count, levels=levels))
+            )
+            durations.clear()
+            if len(top_urls) < cfg.report_size:
+                heapq.heappush(top_urls, candidate)
+            else:
+                heapq.heapreplace(top_urls, candidate)
+
+    time_estimators = dict()
+    for _, url, count, time_sum, time_max, quantiles in sorted(
+            top_urls,
+            key=lambda candidate: -candidate[0][1]
+    ):
+        slot = accumulator.add_url_totals(url=url, count=count, time_sum=time_sum, time_max=time_max)
+        time_estimators[slot] = quantiles
+    accumulator.num_requests = num_requests
+    accumulator.num_failures = num_failures
+    accumulator.all_requests_time = all_requests_time
+
+    return SpilledUrlStats(accumulator=accumulator, time_estimators=time_estimators, num_urls=num_urls)
+
+
+def iter_spilled_url_stats(
+        spilled_url_stats: SpilledUrlStats,
+        cfg: Config
+) -> Iterator[Dict[str, Union[int, float, str]]]:
+
+    """
+    Calculates url stats rows for report from stats calculated with disk spilling
+    :param spilled_url_stats: stats of report urls
+    :param cfg: application config
+    :return: generator of url stats rows in descending order of total request time
+    """
+
+    accumulator = spilled_url_stats.accumulator
+    check_failures_percentage(accumulator=accumulator, cfg=cfg)
+    time_estimators = dict(spilled_url_stats.time_estimators)
+
+    return (
+        build_url_stat(accumulator=accumulator, slot=slot, time_estimator=time_estimators.pop(slot), cfg=cfg)
+        for slot in accumulator.top_slots(size=cfg.report_size)
+    )
+
+
+def render_report(url_stats_for_json: Iterable[Dict[str, Union[int, float, str]]],
+                  cfg: Config,
+                  report_name: str) -> NoReturn:
+    """
+    Takes report template and renders report for current log file.
+    Template parts around $table_json and url stats rows are streamed right to report file,
+    report appears under its name only when it is completely written.
+    With REPORT_CHUNK_SIZE rows are streamed into chunk files next to report instead,
+    and $table_json is substituted with description of chunks the report page loads on scroll
+    :param url_stats_for_json: url stats for log file, may be generator
+    :param report_name: name of report that will be generated
+    :param cfg: application config
+    :return:
+    """
+
+    report_template = os.path.join(cfg.report_dir, "report.html")
+    with open(report_template, "rt", encoding="utf-8") as report_template:
+        template_html = report_template.read()
+
+    template_prefix, template_suffix = split_report_template(template_html=template_html)
+
+    report_chunks = None
+    if cfg.report_chunk_size and template_suffix is not None:
+        report_chunks = write_report_chunks(
+            url_stats_for_json=url_stats_for_json,
+            chunks_name=generate_report_chunks_name(report_name=report_name),
+            chunk_size=cfg.report_chunk_size,
+            compress=cfg.report_chunk_gzip
+        )
+
+    temporary_report_name = f"{report_name}.tmp"
+    with open(temporary_report_name, "w", encoding="utf-8") as prepared_report:
+        prepared_report.write(template_prefix)
+        if report_chunks is not None:
+            prepared_report.write(json.dumps(report_chunks))
+            prepared_report.write(template_suffix)
+        elif template_suffix is not None:
+            prepared_report.write("[")
+            for row_number, url_stat in enumerate(url_stats_for_json):
+                if row_number:
+                    prepared_report.write(", ")
+                prepared_report.write(json.dumps(url_stat))
+            prepared_report.write("]")
+            prepared_report.write(template_suffix)
+    os.replace(temporary_report_name, report_name)
+
+
+def generate_report_chunks_name(report_name: str) -> str:
+
+    """
+    Generates name of directory with chunk files of report data
+    :param report_name: name of report
+    :return: path to directory next to report, e.g. report-2017.06.30.chunks
+    """
+
+    report_name_prefix, _ = os.path.splitext(report_name)
+
+    return f"{report_name_prefix}.chunks"
+
+
+def write_report_chunks(
+        url_stats_for_json: Iterable[Dict[str, Union[int, float, str]]],
+        chunks_name: str,
+        chunk_size: int,
+        compress: bool
+) -> Dict[str, Union[str, int, bool]]:
+
+    """
+    Streams url stats rows into JSON chunk files of chunk_size rows, only one chunk is kept in memory.
+    Directory with chunks appears under its name only when all chunks are written
+    :param url_stats_for_json: url stats for log file, may be generator
+    :param chunks_name: path to directory with chunks
+    :param chunk_size: number of rows in chunk
+    :param compress: compress chunks with gzip
+    :return: description of chunks for report page: directory relative to report, number of rows and chunks
+    """
+
+    temporary_chunks_name = f"{chunks_name}.tmp"
+    shutil.rmtree(temporary_chunks_name, ignore_errors=True)
+    os.makedirs(temporary_chunks_name)
+    chunk_extension = ".json.gz" if compress else ".json"
+
+    num_rows = num_chunks = 0
+    chunk = list()
+    for url_stat in url_stats_for_json:
+        chunk.append(url_stat)
+        num_rows += 1
+        if len(chunk) == chunk_size:
+            write_report_chunk(
+                chunk_name=os.path.join(temporary_chunks_name, f"{num_chunks:05d}{chunk_extension}"),
+                chunk=chunk
+            )
+            num_chunks += 1
+            chunk = list()
+    if chunk:
+        write_report_chunk(
+            chunk_name=os.path.join(temporary_chunks_name, f"{num_chunks:05d}{chunk_extension}"),
+            chunk=chunk
+        )
+        num_chunks += 1
+
+    shutil.rmtree(chunks_name, ignore_errors=True)
+    os.replace(temporary_chunks_name, chunks_name)
+
+    return {
+        "chunks": os.path.basename(chunks_name),
+        "extension": chunk_extension,
+        "rows": num_rows,
+        "num_chunks": num_chunks
+    }
+
+
+def write_report_chunk(chunk_name: str, chunk: List[Dict[str, Union[int, float, str]]]) -> NoReturn:
+
+    """
+    Writes rows of report data into chunk file, file with .gz extension is compressed
+    :param chunk_name: path to chunk file
+    :param chunk: url stats rows
+    """
+
+    chunk_json = json.dumps(chunk).encode("utf-8")
+    if chunk_name.endswith(".gz"):
+        chunk_json = gzip.compress(chunk_json)
+    with open(chunk_name, "wb") as chunk_file:
+        chunk_file.write(chunk_json)
+
+
+def split_report_template(template_html: str) -> Tuple[str, Optional[str]]:
+
+    """
+    Splits report template by $table_json placeholder, other placeholders
+    are substituted the same way as Template.safe_substitute does
+    :param template_html: report template
+    :return: template parts before and after placeholder, None instead of suffix if there is no placeholder
+    """
+
+    for placeholder in Template.pattern.finditer(template_html):
+        if "table_json" in (placeholder.group("named"), placeholder.group("braced")):
+            return (
+                Template(template_html[:placeholder.start()]).safe_substitute(),
+                Template(template_html[placeholder.end():]).safe_substitute()
+            )
+
+    return Template(template_html).safe_substitute(), None
+
+
+def find_log_files(log_dir: str, log_file_pattern: re.Pattern) -> List[LatestLogFile]:
+
+    """
+    Finds all log files in directory
+    :param log_dir: directory with log files
+    :param log_file_pattern: pattern for file name regular expression
+    :return: log files sorted by creation date
+    """
+
+    log_files = list()
+
+    for file in os.scandir(log_dir):
+        log_pattern_matches = re.search(log_file_pattern, file.name)
+        if log_pattern_matches:
+            try:
+                creation_date = datetime.datetime.strptime(log_pattern_matches.group(1), DATE_FORMAT_IN_LOG_FILE_NAME)
+            except (ValueError, TypeError):
+                logging.error("Wrong date in log file name: %s", file.name)
+                continue
+            log_file_path = os.path.join(log_dir, file.name)
+            _, file_extension = os.path.splitext(log_file_path)
+            log_files.append(
+                LatestLogFile(
+                    path=log_file_path,
+                    date_of_creation=creation_date,
+                    extension=file_extension
+                )
+            )
+
+    return sorted(log_files, key=lambda log_file: log_file.date_of_creation)
+
+
+def open_indexed_log_dir(cfg: Config, log_file_pattern: re.Pattern) -> LogDirIndex:
+
+    """
+    Opens index of log directory kept in report directory, refreshing it if directories changed
+    :param cfg: application config
+    :param log_file_pattern: pattern for file name regular expression
+    :return: up to date index of log directory
+    """
+
+    return open_log_dir_index(
+        log_dir=cfg.log_dir,
+        log_file_pattern=log_file_pattern,
+        date_format=DATE_FORMAT_IN_LOG_FILE_NAME,
+        report_dir=cfg.report_dir,
+        report_file_name=generate_report_file_name
+    )
+
+
+def make_log_file(log_dir: str, indexed_log_file: IndexedLogFile) -> LatestLogFile:
+
+    """
+    Makes log file from log of log directory index
+    :param log_dir: directory with log files
+    :param indexed_log_file: log from index
+    :return: LatestLogFile object with information about path, creation date, file extension
+    """
+
+    log_file_path = os.path.join(log_dir, indexed_log_file.name)
+    _, file_extension = os.path.splitext(log_file_path)
+
+    return LatestLogFile(
+        path=log_file_path,
+        date_of_creation=indexed_log_file.date_of_creation,
+        extension=file_extension
+    )
+
+
+def find_latest_log_by_config(cfg: Config, log_file_pattern: re.Pattern) -> Optional[LatestLogFile]:
+
+    """
+    Finds log with latest creation date with index of log directory if it is enabled
+    :param cfg: application config
+    :param log_file_pattern: pattern for file name regular expression
+    :return: LatestLogFile object or None if there are no logs
+    """
+
+    if not cfg.log_dir_index:
+        return find_latest_log(log_dir=cfg.log_dir, log_file_pattern=log_file_pattern)
+
+    latest_log = open_indexed_log_dir(cfg=cfg, log_file_pattern=log_file_pattern).latest_log()
+    if latest_log is None:
+        return None
+
+    return make_log_file(log_dir=cfg.log_dir, indexed_log_file=latest_log)
+
+
+def find_unreported_logs(cfg: Config, log_file_pattern: re.Pattern) -> List[LatestLogFile]:
+
+    """
+    Finds log files without report
+    :param cfg: application config
+    :param log_file_pattern: pattern for file name regular expression
+    :return: log files without report sorted by creation date
+    """
+
+    if cfg.log_dir_index:
+        return [
+            make_log_file(log_dir=cfg.log_dir, indexed_log_file=indexed_log_file)
+            for indexed_log_file in open_indexed_log_dir(cfg=cfg, log_file_pattern=log_file_pattern).unreported_logs()
+        ]
+
+    return [
+        log_file
+        for log_file in find_log_files(log_dir=cfg.log_dir, log_file_pattern=log_file_pattern)
+        if not os.path.exists(generate_report_name(cfg=cfg, log_file=log_file))
+    ]
+
+
+def generate_report_for_log(
+        config: Config,
+        log_file: LatestLogFile,
+        metrics: Optional[RunMetrics] = None
+) -> Optional[int]:
+
+    """
+    Generates report for nginx log file and saves metrics of run next to it,
+    metrics are saved for failed run as well
+    :param config: application config
+    :param log_file: file with logs to generate report for
+    :param metrics: metrics of run with stages measured before log file was chosen
+    :return: number of analyzed lines or None if report is already up to date
+    """
+
+    metrics = RunMetrics() if metrics is None else metrics
+
+    logging.info("Generating report name for log file: %s", log_file.path)
+    report_name = generate_report_name(cfg=config, log_file=log_file)
+    is_sampled = config.sample_rate is not None
+    if is_sampled and log_file.extension == ".gz":
+        logging.warning("Only uncompressed logs can be sampled, log file %s is analyzed with full pass", log_file.path)
+        is_sampled = False
+    if is_sampled:
+        report_name = generate_sample_report_name(report_name=report_name)
+    logging.info("Report name is %s", report_name)
+
+    is_incremental = (
+        config.incremental
+        and log_file.extension != ".gz"
+        and not is_sampled
+        and config.heavy_hitters_capacity is None
+        and config.memory_limit is None
+    )
+    if os.path.exists(report_name) and not is_incremental and not is_sampled:
+        logging.info("Report for this log is already done")
+        return None
+
+    metrics_name = generate_metrics_name(report_name=report_name)
+    if config.profile:
+        profile_name_prefix, _ = os.path.splitext(report_name)
+        logging.info("Profiling run into %s.prof and %s.tracemalloc", profile_name_prefix, profile_name_prefix)
+        profiling_context = profiling(profile_name_prefix=profile_name_prefix)
+    else:
+        profiling_context = nullcontext()
+
+    try:
+        with profiling_context:
+            num_lines = render_log_report(
+                config=config,
+                log_file=log_file,
+                report_name=report_name,
+                is_incremental=is_incremental,
+                is_sampled=is_sampled,
+                metrics=metrics
+            )
+    except Exception as error:
+        metrics.fail(error=error)
+        save_metrics(metrics_name=metrics_name, metrics=metrics)
+        raise
+
+    if num_lines is not None:
+        save_metrics(metrics_name=metrics_name, metrics=metrics)
+        logging.info("Saved metrics of run %s", metrics_name)
+
+    return num_lines
+
+
+def render_log_report(
+        config: Config,
+        log_file: LatestLogFile,
+        report_name: str,
+        is_incremental: bool,
+        metrics: RunMetrics,
+        is_sampled: bool = False
+) -> Optional[int]:
+
+    """
+    Calculates url stats for nginx log file and renders report measuring stages of pipeline.
+    Lines are parsed and aggregated in one pass, so parsing is measured as part of calculate_url_stats
+    :param config: application config
+    :param log_file: file with logs to generate report for
+    :param report_name: name of report
+    :param is_incremental: parse only lines appended since last checkpoint
+    :param metrics: metrics of run
+    :param is_sampled: make approximate report of randomly sampled blocks of log
+    :return: number of analyzed lines or None if report is already up to date
+    """
+
+    with metrics.stage(name="calculate_url_stats"):
+        if is_incremental:
+            checkpoint_name = generate_checkpoint_name(report_name=report_name)
+            logging.info(
+                "Started to calculate stats for url from file %s incrementally with checkpoint %s",
+                log_file.path,
+                checkpoint_name
+            )
+            accumulator = accumulate_url_stats_incrementally(
+                log_file=log_file,
+                cfg=config,
+                checkpoint_name=checkpoint_name,
+                metrics=metrics
+            )
+            if accumulator is None:
+                logging.info("No new lines in log file since last checkpoint, report is up to date")
+                return None
+        elif is_sampled:
+            sample = accumulate_log_sample(log_file=log_file, cfg=config)
+            accumulator = sample.accumulator
+            metrics.count(name="lines_read", value=accumulator.num_requests)
+            metrics.count(name="bytes_read", value=sample.ranges.sampled_size)
+        elif config.heavy_hitters_capacity is not None:
+            accumulator = accumulate_heavy_hitters(log_file=log_file, cfg=config)
+            metrics.count(name="lines_read", value=accumulator.num_requests)
+            metrics.count(name="bytes_read", value=os.path.getsize(log_file.path))
+        elif config.memory_limit is not None:
+            spilled_url_stats = accumulate_with_spilling(log_file=log_file, cfg=config)
+            accumulator = spilled_url_stats.accumulator
+            metrics.count(name="lines_read", value=accumulator.num_requests)
+            metrics.count(name="bytes_read", value=os.path.getsize(log_file.path))
+        else:
+            accumulator = accumulate_log_file(log_file=log_file, cfg=config)
+            metrics.count(name="lines_read", value=accumulator.num_requests)
+            metrics.count(name="bytes_read", value=os.path.getsize(log_file.path))
+        metrics.count(name="failed_lines", value=accumulator.num_failures)
+        report_medians = dict()
+        if is_sampled:
+            metrics.count(name="unique_urls", value=len(accumulator.urls))
+            url_stats_for_report = iter_sampled_url_stats(sample=sample, cfg=config)
+        elif config.heavy_hitters_capacity is not None:
+            metrics.count(name="unique_urls", value=accumulator.distinct_urls.estimate())
+            url_stats_for_report = iter_heavy_hitter_url_stats(heavy_hitters=accumulator, cfg=config)
+        elif config.memory_limit is not None:
+            metrics.count(name="unique_urls", value=spilled_url_stats.num_urls)
+            url_stats_for_report = iter_spilled_url_stats(spilled_url_stats=spilled_url_stats, cfg=config)
+        else:
+            metrics.count(name="unique_urls", value=len(accumulator.urls))
+            url_stats_for_report = iter_url_stats(accumulator=accumulator, cfg=config)
+            if config.warehouse_db is not None:
+                url_stats_for_report = iter_remembering_medians(
+                    url_stats=url_stats_for_report,
+                    report_medians=report_medians
+                )
+    logging.info("Successfully calculated stats by url from file: %s", log_file.path)
+
+    logging.info("Rendering template for report %s", report_name)
+    with metrics.stage(name="render_report"):
+        render_report(url_stats_for_json=url_stats_for_report,
+                      cfg=config,
+                      report_name=report_name)
+    logging.info("Successfully generated report %s", report_name)
+
+    # Bounded memory modes keep stats of report urls only, so days aren't saved to warehouse
+    is_complete = not is_sampled and config.heavy_hitters_capacity is None and config.memory_limit is None
+    if config.warehouse_db is not None and is_complete:
+        with metrics.stage(name="save_to_warehouse"):
+            save_to_warehouse(
+                accumulator=accumulator,
+                log_date=log_file.date_of_creation,
+                source=log_file.path,
+                report_medians=report_medians,
+                cfg=config
+            )
+
+    return accumulator.num_requests
+
+
+def iter_remembering_medians(
+        url_stats: Iterable[Dict[str, Union[int, float, str]]],
+        report_medians: Dict[str, float]
+) -> Iterator[Dict[str, Union[int, float, str]]]:
+
+    """
+    Passes url stats rows through and remembers request time medians of their urls,
+    so that medians of report urls are saved to warehouse without calculating them again
+    :param url_stats: url stats rows of report
+    :param report_medians: dict to put medians by url into
+    :return: generator of the same rows
+    """
+
+    for url_stat in url_stats:
+        report_medians[url_stat["url"]] = url_stat["time_med"]
+        yield url_stat
+
+
+def save_to_warehouse(
+        accumulator: UrlStatsAccumulator,
+        log_date: datetime.date,
+        source: str,
+        report_medians: Dict[str, float],
+        cfg: Config
+) -> NoReturn:
+
+    """
+    Saves count, total and maximum request time of every url of log to WAREHOUSE_DB in single transaction,
+    medians are saved for report urls only. Aggregates saved for the same date before are replaced
+    :param accumulator: stats accumulated for the whole log
+    :param log_date: date of log
+    :param source: log file or hosts the stats are accumulated from
+    :param report_medians: request time medians of report urls
+    :param cfg: application config
+    """
+
+    urls = [accumulator.url(slot=slot) for slot in range(len(accumulator.urls))]
+    connection = open_warehouse(warehouse_name=cfg.warehouse_db)
+    try:
+        num_urls = save_daily_stats(
+            connection=connection,
+            totals=DailyTotals(
+                log_date=log_date.strftime("%Y-%m-%d"),
+                source=source,
+                num_requests=accumulator.num_requests,
+                num_failures=accumulator.num_failures,
+                all_requests_time=accumulator.all_requests_time
+            ),
+            url_rows=zip(
+                urls,
+                accumulator.counts,
+                accumulator.time_sums,
+                accumulator.time_maxes,
+                (report_medians.get(url) for url in urls)
+            )
+        )
+    finally:
+        connection.close()
+    logging.info("Saved daily stats of %d urls to warehouse %s", num_urls, cfg.warehouse_db)
+
+
+def generate_live_report_name(cfg: Config, window: int) -> str:
+
+    """
+    Generates name of live mode report of sliding window
+    :param cfg: application config
+    :param window: window length in seconds
+    :return: path to report
+    """
+
+    return os.path.join(cfg.report_dir, f"report-live-{format_window(window)}.html")
+
+
+def build_live_window_stats(
+        buckets: Iterable[UrlStatsAccumulator],
+        cfg: Config
+) -> Tuple[UrlStatsAccumulator, List[Dict[str, Union[int, float, str]]]]:
+
+    """
+    Merges buckets of sliding window and calculates url stats for it. Unlike daily report
+    failures percentage doesn't stop live mode, it is shown in snapshot instead
+    :param buckets: accumulators of window buckets
+    :param cfg: application config
+    :return: accumulator of the whole window and its url stats rows
+    """
+
+    accumulator = UrlStatsAccumulator(
+        quantile_backend=cfg.quantile_backend,
+        time_bucket_seconds=cfg.time_bucket_seconds
+    )
+    for bucket in buckets:
+        accumulator.merge(other=bucket)
+
+    if not accumulator.all_requests_time:
+        return accumulator, list()
+
+    return accumulator, list(
+        iter_top_url_stats(
+            accumulator=accumulator,
+            top_slots=select_top_url_slots(accumulator=accumulator, cfg=cfg),
+            cfg=cfg
+        )
+    )
+
+
+def render_live_snapshot(windows: SlidingWindows, cfg: Config, now: float) -> NoReturn:
+
+    """
+    Renders report of every sliding window and JSON snapshot with url stats of all windows
+    :param windows: sliding windows with accumulators of buckets
+    :param cfg: application config
+    :param now: current unix time
+    """
+
+    snapshot = {
+        "generated_at": datetime.datetime.fromtimestamp(now).isoformat(timespec="seconds"),
+        "windows": list()
+    }
+    for window in windows.window_seconds:
+        accumulator, url_stats = build_live_window_stats(
+            buckets=windows.window_buckets(window=window, now=now),
+            cfg=cfg
+        )
+        render_report(
+            url_stats_for_json=url_stats,
+            cfg=cfg,
+            report_name=generate_live_report_name(cfg=cfg, window=window)
+        )
+        snapshot["windows"].append({
+            "window": format_window(window),
+            "seconds": window,
+            "requests": accumulator.num_requests,
+            "failures": accumulator.num_failures,
+            "failures_perc": round(
+                100 * accumulator.num_failures / accumulator.num_requests if accumulator.num_requests else 0,
+                NUM_SIGNS_FOR_STATS
+            ),
+            "unique_urls": len(accumulator.urls),
+            "url_stats": url_stats
+        })
+
+    snapshot_name = os.path.join(cfg.report_dir, LIVE_SNAPSHOT_NAME)
+    temporary_snapshot_name = f"{snapshot_name}.tmp"
+    with open(temporary_snapshot_name, "wt", encoding="utf-8") as snapshot_file:
+        json.dump(snapshot, snapshot_file)
+    os.replace(temporary_snapshot_name, snapshot_name)
+
+
+def follow_log(
+        config: Config,
+        log_file_path: str,
+        from_end: bool = True,
+        max_snapshots: Optional[int] = None,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], NoReturn] = time.sleep
+) -> NoReturn:
+
+    """
+    Follows active nginx log and keeps url stats of sliding windows (live mode).
+    Lines read by every poll are accumulated into time bucket of the moment they are read,
+    buckets older than the longest window are dropped. Reports of windows and JSON snapshot
+    are rendered every LIVE_SNAPSHOT_INTERVAL seconds
+    :param config: application config
+    :param log_file_path: path to log file nginx writes to
+    :param from_end: skip lines written before live mode started
+    :param max_snapshots: stop after number of snapshots, None to follow log until interrupted
+    :param clock: function returning current unix time
+    :param sleep: function to wait between polls with
+    """
+
+    windows = SlidingWindows(
+        window_seconds=list(config.live_windows),
+        bucket_seconds=config.live_bucket_seconds,
+        make_bucket=lambda: UrlStatsAccumulator(
+            quantile_backend=config.quantile_backend,
+            time_bucket_seconds=config.time_bucket_seconds
+        )
+    )
+    follower = LogFollower(log_file_path=log_file_path, from_end=from_end)
+    logging.info(
+        "Following log file %s with windows %s",
+        log_file_path,
+        ", ".join(format_window(window) for window in windows.window_seconds)
+    )
+
+    num_snapshots = 0
+    next_snapshot_at = clock() + config.live_snapshot_interval
+    try:
+        while max_snapshots is None or num_snapshots < max_snapshots:
+            now = clock()
+            windows.bucket_at(timestamp=now).consume(
+                parsed_line_gen=parse_log_byte_lines(log_lines=follower.poll(), cfg=config)
+            )
+            if now >= next_snapshot_at:
+                windows.expire(now=now)
+                render_live_snapshot(windows=windows, cfg=config, now=now)
+                num_snapshots += 1
+                next_snapshot_at = now + config.live_snapshot_interval
+            sleep(config.live_poll_interval)
+    finally:
+        follower.close()
+
+
+def generate_partial_aggregate_name(cfg: Config, log_file: LatestLogFile, source: str) -> str:
+
+    """
+    Generates name of partial aggregate file of log
+    :param cfg: application config
+    :param log_file: analyzed log file
+    :param source: name of host the log is written on
+    :return: path to file in report directory, e.g. partial-2017.06.30-front1.json.gz
+    """
+
+    log_date = log_file.date_of_creation.strftime(DATE_FORMAT_FOR_REPORT)
+
+    return os.path.join(cfg.report_dir, f"partial-{log_date}-{source}.json.gz")
+
+
+def partial_aggregate_settings(cfg: Config) -> Dict[str, object]:
+
+    """
+    Gets settings partial aggregates must share to be merged
+    :param cfg: application config
+    :return: url normalization rules and parameters of latency sketch
+    """
+
+    return {
+        "url_normalization": cfg.url_normalization._asdict(),
+        "sketch": "hdr",
+        "significant_bits": HdrHistogram.SIGNIFICANT_BITS
+    }
+
+
+def make_partial_aggregate(
+        accumulator: UrlStatsAccumulator,
+        log_file: LatestLogFile,
+        source: str,
+        cfg: Config
+) -> PartialAggregate:
+
+    """
+    Makes partial aggregate of log file from url stats accumulated with "hdr" quantile backend
+    :param accumulator: stats accumulated for the whole log
+    :param log_file: analyzed log file
+    :param source: name of host the log is written on
+    :param cfg: application config
+    :return: partial aggregate
+    """
+
+    return PartialAggregate(
+        log_dates=[log_file.date_of_creation.strftime("%Y-%m-%d")],
+        sources=[f"{source}:{log_file.path}"],
+        settings=partial_aggregate_settings(cfg=cfg),
+        num_requests=accumulator.num_requests,
+        num_failures=accumulator.num_failures,
+        all_requests_time=accumulator.all_requests_time,
+        urls=[accumulator.url(slot=slot) for slot in range(len(accumulator.urls))],
+        counts=accumulator.counts.tolist(),
+        time_sums=accumulator.time_sums.tolist(),
+        time_maxes=accumulator.time_maxes.tolist(),
+        histograms=accumulator.time_estimators
+    )
+
+
+def accumulate_partial_aggregate(partial_aggregate: PartialAggregate) -> UrlStatsAccumulator:
+
+    """
+    Makes accumulator with "hdr" quantile backend from partial aggregate to calculate url stats for report
+    :param partial_aggregate: merged partial aggregate
+    :return: url stats accumulator
+    """
+
+    accumulator = UrlStatsAccumulator(quantile_backend="hdr")
+    accumulator.urls = list(partial_aggregate.urls)
+    accumulator.slot_by_url = {url: slot for slot, url in enumerate(accumulator.urls)}
+    accumulator.counts = array("q", partial_aggregate.counts)
+    accumulator.time_sums = array("d", partial_aggregate.time_sums)
+    accumulator.time_maxes = array("d", partial_aggregate.time_maxes)
+    accumulator.time_estimators = list(partial_aggregate.histograms)
+    accumulator.num_requests = partial_aggregate.num_requests
+    accumulator.num_failures = partial_aggregate.num_failures
+    accumulator.all_requests_time = partial_aggregate.all_requests_time
+
+    return accumulator
+
+
+def generate_partial_aggregate(
+        config: Config,
+        log_file_pattern: re.Pattern,
+        partial_aggregate_name: Optional[str] = None
+) -> Optional[str]:
+
+    """
+    Map step of multi-host reporting: accumulates url stats of the latest log with "hdr" quantile backend
+    (histograms are mergeable sketches) and saves them as partial aggregate
+    :param config: application config
+    :param log_file_pattern: pattern for file name regular expression
+    :param partial_aggregate_name: path to partial aggregate file, partial-YYYY.MM.DD-<host>.json.gz
+    in report directory by default
+    :return: path to saved partial aggregate or None if there is no log
+    """
+
+    latest_log_file = find_latest_log_by_config(cfg=config, log_file_pattern=log_file_pattern)
+    if latest_log_file is None:
+        logging.info("No log file to make partial aggregate for")
+        return None
+
+    source = socket.gethostname()
+    if partial_aggregate_name is None:
+        partial_aggregate_name = generate_partial_aggregate_name(cfg=config, log_file=latest_log_file, source=source)
+
+    logging.info("Making partial aggregate %s of log file %s", partial_aggregate_name, latest_log_file.path)
+    map_config = config._replace(quantile_backend="hdr")
+    accumulator = accumulate_log_file(log_file=latest_log_file, cfg=map_config)
+    save_partial_aggregate(
+        partial_aggregate_name=partial_aggregate_name,
+        partial_aggregate=make_partial_aggregate(
+            accumulator=accumulator,
+            log_file=latest_log_file,
+            source=source,
+            cfg=map_config
+        )
+    )
+    logging.info("Saved partial aggregate %s of %d lines", partial_aggregate_name, accumulator.num_requests)
+
+    return partial_aggregate_name
+
+
+def reduce_partial_aggregates(
+        config: Config,
+        partial_aggregate_names: List[str],
+        merged_partial_aggregate_name: Optional[str] = None
+) -> NoReturn:
+
+    """
+    Reduce step of multi-host reporting: merges partial aggregates and renders report of the same log date
+    into report directory, or saves merged partial aggregate to be merged further
+    :param config: application config
+    :param partial_aggregate_names: paths to partial aggregate files
+    :param merged_partial_aggregate_name: path to save merged partial aggregate to instead of rendering report
+    """
+
+    partial_aggregate = merge_partial_aggregates(
+        load_partial_aggregate(partial_aggregate_name=partial_aggregate_name)
+        for partial_aggregate_name in partial_aggregate_names
+    )
+    logging.info(
+        "Merged %d partial aggregates of %s: %d lines, %d urls",
+        len(partial_aggregate_names),
+        ", ".join(partial_aggregate.sources),
+        partial_aggregate.num_requests,
+        len(partial_aggregate.urls)
+    )
+
+    if merged_partial_aggregate_name is not None:
+        save_partial_aggregate(
+            partial_aggregate_name=merged_partial_aggregate_name,
+            partial_aggregate=partial_aggregate
+        )
+        logging.info("Saved merged partial aggregate %s", merged_partial_aggregate_name)
+        return
+
+    if len(partial_aggregate.log_dates) != 1:
+        raise PartialAggregateError(f"Report can't be made of logs of different dates: {partial_aggregate.log_dates}")
+    log_date = datetime.date.fromisoformat(partial_aggregate.log_dates[0])
+    report_name = os.path.join(config.report_dir, generate_report_file_name(log_creation_date=log_date))
+
+    report_config = config._replace(quantile_backend="hdr")
+    accumulator = accumulate_partial_aggregate(partial_aggregate=partial_aggregate)
+    report_medians = dict()
+    url_stats_for_report = iter_url_stats(accumulator=accumulator, cfg=report_config)
+    if config.warehouse_db is not None:
+        url_stats_for_report = iter_remembering_medians(url_stats=url_stats_for_report, report_medians=report_medians)
+    render_report(url_stats_for_json=url_stats_for_report, cfg=report_config, report_name=report_name)
+    logging.info("Generated report %s of merged partial aggregates", report_name)
+
+    if config.warehouse_db is not None:
+        save_to_warehouse(
+            accumulator=accumulator,
+            log_date=log_date,
+            source=", ".join(partial_aggregate.sources),
+            report_medians=report_medians,
+            cfg=report_config
+        )
+
+
+def generate_report(config: Config, log_file_pattern: re.Pattern) -> NoReturn:
+
+    """
+    Generates report for the latest nginx log file
+    :param config: default application config
+    :param log_file_pattern: pattern for file name regular expression
+    :return:
+    """
+
+    try:
+        metrics = RunMetrics()
+        logging.info("Trying to find latest log file from directory %s", config.log_dir)
+        with metrics.stage(name="find_latest_log"):
+            latest_log_file = find_latest_log_by_config(cfg=config, log_file_pattern=log_file_pattern)
+
+        if latest_log_file is None:
+            logging.info("No log file to generate report for")
+            return
+
+        logging.info("Latest log file is %s", latest_log_file.path)
+        generate_report_for_log(config=config, log_file=latest_log_file, metrics=metrics)
+
+    except Exception:
+        logging.exception("Something went wrong during generating report")
+
+
+def generate_backlog_report(config: Config, log_file: LatestLogFile) -> Optional[int]:
+
+    """
+    Generates report for one log of backlog. Runs in worker process,
+    errors are logged so that one broken log doesn't stop the others
+    :param config: application config
+    :param log_file: file with logs to generate report for
+    :return: number of analyzed lines or None if report wasn't generated
+    """
+
+    try:
+        return generate_report_for_log(config=config, log_file=log_file)
+    except Exception:
+        logging.exception("Something went wrong during generating report for %s", log_file.path)
+        return None
+
+
+def generate_backlog_reports(config: Config, log_file_pattern: re.Pattern) -> NoReturn:
+
+    """
+    Generates reports for every log file without report, logs are analyzed concurrently in process pool
+    :param config: application config
+    :param log_file_pattern: pattern for file name regular expression
+    :return:
+    """
+
+    try:
+        logging.info("Trying to find log files without report in directory %s", config.log_dir)
+        unreported_logs = find_unreported_logs(cfg=config, log_file_pattern=log_file_pattern)
+        if not unreported_logs:
+            logging.info("No log files to generate reports for")
+            return
+
+        concurrency = config.backlog_concurrency or os.cpu_count()
+        logging.info("Generating reports for %d log files with %d processes", len(unreported_logs), concurrency)
+
+        # ru_maxrss never decreases, so every log gets fresh worker process to keep peak_rss of its metrics
+        # (and spilling budget of MEMORY_LIMIT) its own, workers can't be replaced before Python 3.11
+        pool_options = {"max_tasks_per_child": 1} if sys.version_info >= (3, 11) else dict()
+        started_at = time.perf_counter()
+        num_reports = num_lines = num_bytes = 0
+        with ProcessPoolExecutor(max_workers=concurrency, **pool_options) as executor:
+            results = executor.map(
+                generate_backlog_report,
+                [config] * len(unreported_logs),
+                unreported_logs
+            )
+            for log_file, num_log_lines in zip(unreported_logs, results):
+                if num_log_lines is None:
+                    continue
+                num_reports += 1
+                num_lines += num_log_lines
+                num_bytes += os.path.getsize(log_file.path)
+        elapsed_time = time.perf_counter() - started_at
+
+        logging.info(
+            "Generated %d of %d reports in %.3f s: %d lines (%.0f lines/s), %d bytes (%.3f MB/s)",
+            num_reports,
+            len(unreported_logs),
+            elapsed_time,
+            num_lines,
+            num_lines / elapsed_time,
+            num_bytes,
+            num_bytes / elapsed_time / 1024 / 1024
+        )
+
+    except Exception:
+        logging.exception("Something went wrong during generating backlog reports")
+
+
+if __name__ == "__main__":
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--config",
+        type=FileType("rt"),
+        default="./config.json",
+        help="Path to config file"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of processes to parse uncompressed log file with"
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Parse only lines appended to log since last run"
+    )
+    parser.add_argument(
+        "--backlog",
+        action="store_true",
+        help="Generate reports for every log without report"
+    )
+    parser.add_argument(
+        "--follow",
+        default=None,
+        metavar="LOG_FILE_PATH",
+        help="Follow active log and render reports of sliding windows until interrupted"
+    )
+    parser.add_argument(
+        "--sample",
+        type=float,
+        default=None,
+        metavar="RATE",
+        help="Make approximate report of RATE share of randomly sampled blocks of log, e.g. 0.01"
+    )
+    parser.add_argument(
+        "--map",
+        action="store_true",
+        help="Save url stats of the latest log as partial aggregate to merge with ones of other hosts"
+    )
+    parser.add_argument(
+        "--reduce",
+        nargs="+",
+        default=None,
+        metavar="PARTIAL_AGGREGATE",
+        help="Merge partial aggregates and render report of them"
+    )
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="Path to partial aggregate made by --map or to merged one saved by --reduce instead of report"
+    )
+    parser.add_argument(
+        "--memory-limit",
+        default=None,
+        metavar="SIZE",
+        help="Calculate exact url stats in memory budget (e.g. 512MB) spilling sorted runs to disk"
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Dump cProfile stats and tracemalloc snapshot of run next to report"
+    )
+    args = parser.parse_args()
+    config_from_file = json.load(args.config)
+    if args.workers is not None:
+        config_from_file["WORKERS"] = args.workers
+    if args.incremental:
+        config_from_file["INCREMENTAL"] = True
+    if args.profile:
+        config_from_file["PROFILE"] = True
+    if args.sample is not None:
+        config_from_file["SAMPLE_RATE"] = args.sample
+    if args.memory_limit is not None:
+        config_from_file["MEMORY_LIMIT"] = args.memory_limit
+
+    conf = get_config_parameters(
+        default_config=CONFIG,
+        config_from_file_=config_from_file
+    )
+
+    logging.basicConfig(
+        filename=conf.log_file,
+        format="[%(asctime)s] %(levelname).1s %(message)s",
+        datefmt="%Y.%m.%d %H:%M:%S",
+        level=logging.INFO
+    )
+    if args.map:
+        try:
+            generate_partial_aggregate(
+                config=conf,
+                log_file_pattern=LOG_FILE_PATTERN,
+                partial_aggregate_name=args.output
+            )
+        except Exception:
+            logging.exception("Something went wrong during making partial aggregate")
+    elif args.reduce is not None:
+        try:
+            reduce_partial_aggregates(
+                config=conf,
+                partial_aggregate_names=args.reduce,
+                merged_partial_aggregate_name=args.output
+            )
+        except Exception:
+            logging.exception("Something went wrong during merging partial aggregates")
+    elif args.follow is not None:
+        try:
+            follow_log(config=conf, log_file_path=args.follow)
+        except KeyboardInterrupt:
+            logging.info("Stopped following log file %s", args.follow)
+        except Exception:
+            logging.exception("Something went wrong during following log file %s", args.follow)
+    elif args.backlog:
+        generate_backlog_reports(config=conf, log_file_pattern=LOG_FILE_PATTERN)
+    else:
+        generate_report(config=conf, log_file_pattern=LOG_FILE_PATTERN)
\ No newline at end of file
@@ -0,0 +1,315 @@
+import bisect
+import datetime
+import json
+import logging
+import os
+import re
+import time
+from typing import Callable, Dict, List, NamedTuple, NoReturn, Optional, Set
+
+LOG_DIR_INDEX_VERSION = 2
+LOG_DIR_INDEX_NAME = ".log_dir_index.json"
+# Directory changed within this time before scan may get the same mtime once more (coarse mtime of
+# network file systems), such directory is rescanned next time
+RACY_MTIME_NS = 2 * 1_000_000_000
+
+
+class IndexedLogFile(NamedTuple):
+
+    """
+    Class with log file from index such as:
+    - name: name of file in log directory
+    - date_of_creation: date from file name
+    """
+
+    name: str
+    date_of_creation: datetime.datetime
+
+
+class LogDirIndex:
+
+    """
+    Persistent index of log files in log directory and reports made for them.
+    Log directory is rescanned only when its mtime changes and only new file names
+    are matched with pattern, report directory is rescanned when its own mtime changes.
+    Logs are kept sorted by date, dates without report are kept in separate sorted list,
+    so that latest (unreported) log and logs of date range are found with binary search.
+    Sorted lists are saved with index and are sorted again only when directories change
+    """
+
+    def __init__(
+            self,
+            log_dir: str,
+            log_file_pattern: re.Pattern,
+            date_format: str,
+            report_dir: str,
+            report_file_name: Callable[[datetime.datetime], str]
+    ):
+        self.log_dir = log_dir
+        self.log_file_pattern = log_file_pattern
+        self.date_format = date_format
+        self.report_dir = report_dir
+        self.report_file_name = report_file_name
+        self.log_dir_mtime_ns: Optional[int] = None
+        self.report_dir_mtime_ns: Optional[int] = None
+        self.date_by_name: Dict[str, int] = dict()
+        self.reported_dates: Set[int] = set()
+        self.logs: List[IndexedLogFile] = list()
+        self.log_dates: List[int] = list()
+        self.unreported_dates: List[int] = list()
+
+    @property
+    def index_name(self) -> str:
+
+        """
+        Path to index file, index is kept in report directory because log directory may be read-only
+        """
+
+        return os.path.join(self.report_dir, LOG_DIR_INDEX_NAME)
+
+    def _parse_date(self, file_name: str) -> Optional[int]:
+
+        """
+        Parses date of log file from its name
+        :param file_name: name of file in log directory
+        :return: ordinal of date or None if file isn't log file
+        """
+
+        log_pattern_matches = self.log_file_pattern.search(file_name)
+        if not log_pattern_matches:
+            return None
+        try:
+            return datetime.datetime.strptime(log_pattern_matches.group(1), self.date_format).toordinal()
+        except (ValueError, TypeError):
+            logging.error("Wrong date in log file name: %s", file_name)
+            return None
+
+    def load(self) -> NoReturn:
+
+        """
+        Loads index from file if it is made for the same directories
+        """
+
+        try:
+            with open(self.index_name, "rt", encoding="utf-8") as index_file:
+                raw_index = json.load(index_file)
+            if (
+                raw_index["version"] != LOG_DIR_INDEX_VERSION
+                or raw_index["log_dir"] != os.path.abspath(self.log_dir)
+                or raw_index["log_file_pattern"] != self.log_file_pattern.pattern
+            ):
+                logging.info("Log directory index %s is made for other logs", self.index_name)
+                return
+            # Fields are set only when the whole index is read, broken index leaves it empty to be rebuilt
+            log_dir_mtime_ns = raw_index["log_dir_mtime_ns"]
+            report_dir_mtime_ns = raw_index["report_dir_mtime_ns"]
+            logs = raw_index["logs"]
+            reported_dates = set(raw_index["reported_dates"])
+            unreported_dates = list(raw_index["unreported_dates"])
+            date_by_name = {name: date_ordinal for name, date_ordinal in logs}
+            indexed_logs = [IndexedLogFile(name, self._date_of_creation(date_ordinal)) for name, date_ordinal in logs]
+        except FileNotFoundError:
+            return
+        except (ValueError, KeyError, TypeError):
+            logging.exception("Failed to load log directory index %s", self.index_name)
+            return
+
+        self.log_dir_mtime_ns = log_dir_mtime_ns
+        self.report_dir_mtime_ns = report_dir_mtime_ns
+        self.date_by_name = date_by_name
+        self.reported_dates = reported_dates
+        self.logs = indexed_logs
+        self.log_dates = [date_ordinal for _, date_ordinal in logs]
+        self.unreported_dates = unreported_dates
+
+    def save(self) -> NoReturn:
+
+        """
+        Saves index to file. File is rewritten in place: replacing it would change mtime of report
+        directory and make the next run rescan it. Broken index is just rebuilt
+        """
+
+        try:
+            with open(self.index_name, "wt", encoding="utf-8") as index_file:
+                json.dump(
+                    {
+                        "version": LOG_DIR_INDEX_VERSION,
+                        "log_dir": os.path.abspath(self.log_dir),
+                        "log_file_pattern": self.log_file_pattern.pattern,
+                        "log_dir_mtime_ns": self.log_dir_mtime_ns,
+                        "report_dir_mtime_ns": self.report_dir_mtime_ns,
+                        "logs": [
+                            [log_file.name, date_ordinal] for log_file, date_ordinal in zip(self.logs, self.log_dates)
+                        ],
+                        "reported_dates": sorted(self.reported_dates),
+                        "unreported_dates": self.unreported_dates
+                    },
+                    index_file
+                )
+        except OSError:
+            logging.warning("Can't save log directory index %s, directories will be rescanned", self.index_name)
+
+    @staticmethod
+    def _stable_mtime_ns(directory: str, scanned_at_ns: int) -> Optional[int]:
+
+        """
+        Gets mtime of directory that can be trusted next time
+        :param directory: path to directory
+        :param scanned_at_ns: time of scan
+        :return: mtime or None if directory may change without changing its mtime
+        """
+
+        mtime_ns = os.stat(directory).st_mtime_ns
+
+        return mtime_ns if mtime_ns < scanned_at_ns - RACY_MTIME_NS else None
+
+    def refresh(self) -> bool:
+
+        """
+        Rescans directories whose mtime changed since index was made
+        :return: if index changed
+        """
+
+        is_changed = False
+
+        if os.stat(self.log_dir).st_mtime_ns != self.log_dir_mtime_ns:
+            scanned_at_ns = time.time_ns()
+            date_by_name = dict()
+            for file in os.scandir(self.log_dir):
+                if file.name in self.date_by_name:
+                    date_by_name[file.name] = self.date_by_name[file.name]
+                    continue
+                date_ordinal = self._parse_date(file_name=file.name)
+                if date_ordinal is not None:
+                    date_by_name[file.name] = date_ordinal
+            logging.info(
+                "Rescanned log directory %s: %d new, %d removed logs",
+                self.log_dir,
+                len(date_by_name.keys() - self.date_by_name.keys()),
+                len(self.date_by_name.keys() - date_by_name.keys())
+            )
+            self.date_by_name = date_by_name
+            self.log_dir_mtime_ns = self._stable_mtime_ns(directory=self.log_dir, scanned_at_ns=scanned_at_ns)
+            is_changed = True
+
+        if not os.path.isdir(self.report_dir):
+            is_changed = is_changed or bool(self.reported_dates)
+            self.reported_dates = set()
+            self.report_dir_mtime_ns = None
+        elif is_changed or os.stat(self.report_dir).st_mtime_ns != self.report_dir_mtime_ns:
+            scanned_at_ns = time.time_ns()
+            report_names = {file.name for file in os.scandir(self.report_dir)}
+            self.reported_dates = {
+                date_ordinal
+                for date_ordinal in set(self.date_by_name.values())
+                if self.report_file_name(self._date_of_creation(date_ordinal)) in report_names
+            }
+            self.report_dir_mtime_ns = self._stable_mtime_ns(directory=self.report_dir, scanned_at_ns=scanned_at_ns)
+            is_changed = True
+
+        if is_changed:
+            self._build_lookup()
+
+        return is_changed
+
+    @staticmethod
+    def _date_of_creation(date_ordinal: int) -> datetime.datetime:
+
+        """
+        Makes date of log creation the same way as it is parsed from file name
+        :param date_ordinal: ordinal of date
+        :return: date of log creation
+        """
+
+        return datetime.datetime.fromordinal(date_ordinal)
+
+    def _build_lookup(self) -> NoReturn:
+
+        """
+        Sorts logs by date for binary search
+        """
+
+        logs = sorted((date_ordinal, name) for name, date_ordinal in self.date_by_name.items())
+        self.logs = [IndexedLogFile(name, self._date_of_creation(date_ordinal)) for date_ordinal, name in logs]
+        self.log_dates = [date_ordinal for date_ordinal, _ in logs]
+        self.unreported_dates = sorted(set(self.log_dates) - self.reported_dates)
+
+    def latest_log(self) -> Optional[IndexedLogFile]:
+
+        """
+        Finds log with latest date
+        :return: latest log or None if there are no logs
+        """
+
+        return self.logs[-1] if self.logs else None
+
+    def latest_unreported_log(self) -> Optional[IndexedLogFile]:
+
+        """
+        Finds log with latest date among logs without report
+        :return: latest unreported log or None if every log has report
+        """
+
+        if not self.unreported_dates:
+            return None
+
+        return self.logs[bisect.bisect_right(self.log_dates, self.unreported_dates[-1]) - 1]
+
+    def logs_between(self, first_date: datetime.date, last_date: datetime.date) -> List[IndexedLogFile]:
+
+        """
+        Finds logs of date range
+        :param first_date: first date of range
+        :param last_date: last date of range (inclusive)
+        :return: logs sorted by date
+        """
+
+        return self.logs[
+            bisect.bisect_left(self.log_dates, first_date.toordinal()):
+            bisect.bisect_right(self.log_dates, last_date.toordinal())
+        ]
+
+    def unreported_logs(self) -> List[IndexedLogFile]:
+
+        """
+        Finds logs without report
+        :return: logs sorted by date
+        """
+
+        return [
+            log_file
+            for log_file, date_ordinal in zip(self.logs, self.log_dates)
+            if date_ordinal not in self.reported_dates
+        ]
+
+
+def open_log_dir_index(
+        log_dir: str,
+        log_file_pattern: re.Pattern,
+        date_format: str,
+        report_dir: str,
+        report_file_name: Callable[[datetime.datetime], str]
+) -> LogDirIndex:
+
+    """
+    Loads index of log directory, refreshes it and saves if it changed
+    :param log_dir: directory with log files
+    :param log_file_pattern: pattern for file name regular expression
+    :param date_format: format of date in log file name
+    :param report_dir: directory with reports where index is kept
+    :param report_file_name: function making name of report file for date of log
+    :return: up to date index
+    """
+
+    log_dir_index = LogDirIndex(
+        log_dir=log_dir,
+        log_file_pattern=log_file_pattern,
+        date_format=date_format,
+        report_dir=report_dir,
+        report_file_name=report_file_name
+    )
+    log_dir_index.load()
+    if log_dir_index.refresh() and os.path.isdir(report_dir):
+        log_dir_index.save()
+
+    return log_dir_index
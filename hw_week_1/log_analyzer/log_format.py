@@ -0,0 +1,315 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+from time_buckets import TimeLocalParser
+
+# Number of whitespace separated words in value of nginx variable,
+# None is for values with arbitrary number of words. Unknown variables
+# are single words unless they are quoted in log_format
+VARIABLE_WIDTHS = {
+    "remote_addr": 1,
+    "remote_user": 1,
+    "request_uri": 1,
+    "uri": 1,
+    "request_method": 1,
+    "server_protocol": 1,
+    "status": 1,
+    "body_bytes_sent": 1,
+    "bytes_sent": 1,
+    "request_time": 1,
+    "msec": 1,
+    "time_local": 2,
+    "request": 3,
+    "http_user_agent": None,
+    "http_referer": None,
+    "http_x_forwarded_for": None,
+    "http_cookie": None,
+    "upstream_addr": None,
+    "upstream_status": None,
+    "upstream_response_time": None,
+}
+
+# Fields that can be extracted from line: field name -> (nginx variable, word of variable value)
+EXTRACTABLE_FIELDS = {
+    "url": (("request", 1), ("request_uri", 0), ("uri", 0)),
+    "request_time": (("request_time", 0),),
+    "time_local": (("time_local", 0),),
+    "client": (("remote_addr", 0),),
+}
+# Fields that are extracted only if they are needed and log_format has them
+OPTIONAL_FIELDS = {"time_local", "client"}
+
+VARIABLE_PATTERN = re.compile(r"\$([A-Za-z0-9_]+)")
+
+
+class LogFormatError(Exception):
+    pass
+
+
+class FieldPosition(NamedTuple):
+
+    """
+    Class with position of field in whitespace separated words of log line such as:
+    - from_left: if index is counted from the beginning of line
+    - index: index of word in list of words made by bytes.split or bytes.rsplit
+    - value_slice: slice of word without literal characters around value (quotes, brackets)
+    """
+
+    from_left: bool
+    index: int
+    value_slice: slice
+
+
+class LogFormatSpec(NamedTuple):
+
+    """
+    Class with compiled nginx log_format such as:
+    - left_splits: number of splits from the beginning of line to reach fields from left
+    - right_splits: number of splits from the end of line to reach fields from right
+    - fields: positions of extractable fields by field name
+    """
+
+    left_splits: int
+    right_splits: int
+    fields: Dict[str, FieldPosition]
+
+
+def _format_word_width(format_word: str) -> Tuple[Optional[int], List[str]]:
+
+    """
+    Calculates number of line words produced by one word of log_format
+    :param format_word: whitespace separated word of log_format
+    :return: number of line words (None if arbitrary) and variables of format word
+    """
+
+    variables = VARIABLE_PATTERN.findall(format_word)
+    is_quoted = format_word.startswith('"')
+    width = 1
+    for variable in variables:
+        default_width = None if is_quoted else 1
+        variable_width = VARIABLE_WIDTHS.get(variable.lower(), default_width)
+        if variable_width is None:
+            return None, variables
+        width += variable_width - 1
+
+    return width, variables
+
+
+@lru_cache(maxsize=None)
+def compile_log_format(log_format: str) -> LogFormatSpec:
+
+    """
+    Compiles nginx log_format into positions of url, request time and (if it is logged) time_local in line words.
+    Field is counted from the beginning of line if all words before it have fixed width,
+    otherwise from the end of line if all words after it have fixed width
+    :param log_format: nginx log_format string, e.g. '$remote_addr ... "$request" ... $request_time'
+    :return: compiled log format
+    """
+
+    format_words = log_format.split()
+    widths_and_variables = [_format_word_width(format_word) for format_word in format_words]
+
+    word_offsets_from_left = list()
+    offset = 0
+    for width, _ in widths_and_variables:
+        word_offsets_from_left.append(offset)
+        offset = None if offset is None or width is None else offset + width
+
+    word_offsets_from_right = list()
+    offset = 0
+    for width, _ in reversed(widths_and_variables):
+        offset = None if offset is None or width is None else offset + width
+        word_offsets_from_right.append(offset)
+    word_offsets_from_right.reverse()
+
+    fields = dict()
+    for field_name, variants in EXTRACTABLE_FIELDS.items():
+        for variable_name, value_word in variants:
+            position = _find_field_position(
+                format_words=format_words,
+                widths_and_variables=widths_and_variables,
+                word_offsets_from_left=word_offsets_from_left,
+                word_offsets_from_right=word_offsets_from_right,
+                variable_name=variable_name,
+                value_word=value_word
+            )
+            if position is not None:
+                fields[field_name] = position
+                break
+        else:
+            if field_name not in OPTIONAL_FIELDS:
+                raise LogFormatError(f"Can't find position of {field_name} in log format: {log_format}")
+
+    left_indices = [position.index for position in fields.values() if position.from_left]
+    right_indices = [-position.index - 1 for position in fields.values() if not position.from_left]
+
+    return LogFormatSpec(
+        left_splits=max(left_indices) + 1 if left_indices else 0,
+        right_splits=max(right_indices) + 1 if right_indices else 0,
+        fields=fields
+    )
+
+
+def _find_field_position(
+        format_words: List[str],
+        widths_and_variables: List[Tuple[Optional[int], List[str]]],
+        word_offsets_from_left: List[Optional[int]],
+        word_offsets_from_right: List[Optional[int]],
+        variable_name: str,
+        value_word: int
+) -> Optional[FieldPosition]:
+
+    """
+    Finds position of word of variable value in line words
+    :param format_words: whitespace separated words of log_format
+    :param widths_and_variables: numbers of line words and variables of every format word
+    :param word_offsets_from_left: index of first line word of every format word counted from left
+    :param word_offsets_from_right: number of line words from the first word of every format word to the end
+    :param variable_name: nginx variable to find
+    :param value_word: index of word in variable value
+    :return: position of field or None if variable isn't in log_format
+    """
+
+    for format_word, (width, variables), left_offset, right_offset in zip(
+            format_words, widths_and_variables, word_offsets_from_left, word_offsets_from_right
+    ):
+        if variables != [variable_name]:
+            continue
+        if width is None:
+            raise LogFormatError(f"Variable ${variable_name} has no fixed number of words")
+
+        # Literal characters around variable, e.g. quotes of "$request" or brackets of [$time_local]
+        prefix, suffix = format_word.split(f"${variable_name}", 1)
+        value_start = len(prefix) if value_word == 0 else 0
+        value_end = -len(suffix) if value_word == width - 1 and suffix else None
+        value_slice = slice(value_start, value_end)
+
+        if left_offset is not None:
+            return FieldPosition(from_left=True, index=left_offset + value_word, value_slice=value_slice)
+        if right_offset is not None:
+            return FieldPosition(from_left=False, index=value_word - right_offset, value_slice=value_slice)
+        raise LogFormatError(f"Variable ${variable_name} is surrounded by words with arbitrary width")
+
+    return None
+
+
+def parse_lines_by_format(
+        log_lines: Iterable[bytes],
+        spec: LogFormatSpec,
+        time_parser: Optional[TimeLocalParser] = None,
+        with_clients: bool = False
+) -> Iterable[Union[Tuple[Optional[bytes], Optional[float], bool], Tuple[Optional[bytes], Optional[float], bool, int]]]:
+
+    """
+    Parses raw lines of nginx log extracting only url and request time by their positions.
+    Url is left as raw bytes, so that it is decoded once per distinct url rather than
+    once per line, request time is converted to float right from bytes
+    :param log_lines: iterable of raw log lines
+    :param spec: compiled log format
+    :param time_parser: parser of $time_local into time buckets, None to skip time of lines
+    :param with_clients: extract $remote_addr of lines
+    :return: generator of (raw url, request time, is failed) tuples,
+    with time bucket of line (or raw client address) as the fourth item if time parser is given (or with_clients)
+    """
+
+    if time_parser is not None:
+        yield from _parse_timed_lines_by_format(log_lines=log_lines, spec=spec, time_parser=time_parser)
+        return
+    if with_clients:
+        yield from _parse_client_lines_by_format(log_lines=log_lines, spec=spec)
+        return
+
+    left_splits = spec.left_splits
+    right_splits = spec.right_splits
+    url_position = spec.fields["url"]
+    time_position = spec.fields["request_time"]
+    url_from_left, url_index, url_slice = url_position
+    time_from_left, time_index, time_slice = time_position
+
+    for line_ in log_lines:
+        try:
+            left_words = line_.split(None, left_splits) if left_splits else None
+            right_words = line_.rsplit(None, right_splits) if right_splits else None
+            url = (left_words if url_from_left else right_words)[url_index][url_slice]
+            duration = float((left_words if time_from_left else right_words)[time_index][time_slice])
+        except (IndexError, ValueError):
+            logging.error("Failed parsing line: %s", line_)
+            yield None, None, True
+            continue
+        yield url, duration, False
+
+
+def _parse_timed_lines_by_format(
+        log_lines: Iterable[bytes],
+        spec: LogFormatSpec,
+        time_parser: TimeLocalParser
+) -> Iterable[Tuple[Optional[bytes], Optional[float], bool, int]]:
+
+    """
+    Parses raw lines of nginx log extracting url, request time and time bucket of $time_local
+    :param log_lines: iterable of raw log lines
+    :param spec: compiled log format
+    :param time_parser: parser of $time_local into time buckets
+    :return: generator of (raw url, request time, is failed, time bucket) tuples
+    """
+
+    if "time_local" not in spec.fields:
+        raise LogFormatError("Can't find position of time_local in log format")
+
+    left_splits = spec.left_splits
+    right_splits = spec.right_splits
+    url_from_left, url_index, url_slice = spec.fields["url"]
+    time_from_left, time_index, time_slice = spec.fields["request_time"]
+    time_local_from_left, time_local_index, time_local_slice = spec.fields["time_local"]
+    time_bucket = time_parser.bucket
+
+    for line_ in log_lines:
+        try:
+            left_words = line_.split(None, left_splits) if left_splits else None
+            right_words = line_.rsplit(None, right_splits) if right_splits else None
+            url = (left_words if url_from_left else right_words)[url_index][url_slice]
+            duration = float((left_words if time_from_left else right_words)[time_index][time_slice])
+            time_local = (left_words if time_local_from_left else right_words)[time_local_index]
+            bucket = time_bucket(time_local[time_local_slice])
+        except (IndexError, ValueError):
+            logging.error("Failed parsing line: %s", line_)
+            yield None, None, True, 0
+            continue
+        yield url, duration, False, bucket
+
+
+def _parse_client_lines_by_format(
+        log_lines: Iterable[bytes],
+        spec: LogFormatSpec
+) -> Iterable[Tuple[Optional[bytes], Optional[float], bool, bytes]]:
+
+    """
+    Parses raw lines of nginx log extracting url, request time and $remote_addr
+    :param log_lines: iterable of raw log lines
+    :param spec: compiled log format
+    :return: generator of (raw url, request time, is failed, raw client address) tuples
+    """
+
+    if "client" not in spec.fields:
+        raise LogFormatError("Can't find position of remote_addr in log format")
+
+    left_splits = spec.left_splits
+    right_splits = spec.right_splits
+    url_from_left, url_index, url_slice = spec.fields["url"]
+    time_from_left, time_index, time_slice = spec.fields["request_time"]
+    client_from_left, client_index, client_slice = spec.fields["client"]
+
+    for line_ in log_lines:
+        try:
+            left_words = line_.split(None, left_splits) if left_splits else None
+            right_words = line_.rsplit(None, right_splits) if right_splits else None
+            url = (left_words if url_from_left else right_words)[url_index][url_slice]
+            duration = float((left_words if time_from_left else right_words)[time_index][time_slice])
+            client = (left_words if client_from_left else right_words)[client_index][client_slice]
+        except (IndexError, ValueError):
+            logging.error("Failed parsing line: %s", line_)
+            yield None, None, True, b""
+            continue
+        yield url, duration, False, client
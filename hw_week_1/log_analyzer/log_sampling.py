@@ -0,0 +1,126 @@
+import math
+import os
+import random
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+# Normal quantiles of two-sided confidence intervals: 95% ones are shown in report,
+# failures percentage must exceed threshold with 99.9% confidence to stop analysis early
+REPORT_CONFIDENCE_Z = 1.96
+ABORT_CONFIDENCE_Z = 3.29
+# Variance of failures percentage estimated with fewer blocks is too rough to stop analysis
+MIN_BLOCKS_TO_ABORT = 5
+
+
+class LogSampleRanges(NamedTuple):
+
+    """
+    Class with randomly sampled blocks of log file such as:
+    - ranges: (start, end) byte ranges of sampled blocks aligned to line boundaries, in file order
+    - num_blocks: number of blocks the whole file is split into
+    - file_size: size of log file
+    """
+
+    ranges: List[Tuple[int, int]]
+    num_blocks: int
+    file_size: int
+
+    @property
+    def sampled_size(self) -> int:
+
+        """
+        Number of bytes in sampled blocks
+        """
+
+        return sum(end - start for start, end in self.ranges)
+
+
+def align_to_line_start(log_file, offset: int) -> int:
+
+    """
+    Finds the beginning of the first line that starts at offset or after it
+    :param log_file: log file opened in binary mode
+    :param offset: byte offset
+    :return: byte offset of line start
+    """
+
+    if offset == 0:
+        return 0
+    log_file.seek(offset - 1)
+    log_file.readline()
+
+    return log_file.tell()
+
+
+def choose_sample_ranges(
+        log_file_path: str,
+        rate: float,
+        block_size: int,
+        seed: Optional[int] = None
+) -> LogSampleRanges:
+
+    """
+    Splits uncompressed log file into blocks of block_size bytes and randomly chooses rate of them.
+    Every line belongs to the block its first byte is in, so that sampled blocks are aligned
+    to line boundaries and every line can be sampled once at most
+    :param log_file_path: path to log file
+    :param rate: share of blocks to sample, from 0 to 1
+    :param block_size: size of block in bytes
+    :param seed: seed of random generator, None for different sample every run
+    :return: sampled byte ranges
+    """
+
+    if not 0 < rate <= 1:
+        raise ValueError(f"Sample rate must be in (0, 1]: {rate}")
+
+    file_size = os.path.getsize(log_file_path)
+    num_blocks = max(1, math.ceil(file_size / block_size))
+    num_sampled_blocks = max(1, round(num_blocks * rate))
+    sampled_blocks = sorted(random.Random(seed).sample(range(num_blocks), num_sampled_blocks))
+
+    ranges = list()
+    with open(log_file_path, "rb") as log_file:
+        for block in sampled_blocks:
+            start = align_to_line_start(log_file=log_file, offset=block * block_size)
+            end = align_to_line_start(log_file=log_file, offset=min(file_size, (block + 1) * block_size))
+            if start < end:
+                ranges.append((start, end))
+
+    return LogSampleRanges(ranges=ranges, num_blocks=num_blocks, file_size=file_size)
+
+
+def ratio_confidence_interval(
+        numerators: Sequence[float],
+        denominators: Sequence[float],
+        num_blocks: int,
+        z: float
+) -> Tuple[float, float, float]:
+
+    """
+    Estimates ratio of totals over the whole file (e.g. share of url requests in all requests) from
+    totals of sampled blocks and its confidence interval. Blocks are clusters of lines, so variance
+    of ratio estimator is calculated from residuals of blocks, with finite population correction
+    :param numerators: numerator totals of sampled blocks, e.g. number of url requests
+    :param denominators: denominator totals of sampled blocks, e.g. number of all requests
+    :param num_blocks: number of blocks in the whole file
+    :param z: normal quantile of confidence level
+    :return: ratio estimate, lower and upper bounds of interval clipped to [0, 1]
+    """
+
+    num_sampled_blocks = len(denominators)
+    denominator_sum = sum(denominators)
+    if not denominator_sum:
+        return 0.0, 0.0, 1.0
+    ratio = sum(numerators) / denominator_sum
+    if num_sampled_blocks < 2:
+        return ratio, 0.0, 1.0
+
+    mean_denominator = denominator_sum / num_sampled_blocks
+    residual_variance = sum(
+        (numerator - ratio * denominator) ** 2 for numerator, denominator in zip(numerators, denominators)
+    ) / (num_sampled_blocks - 1)
+    finite_population_correction = max(0.0, 1 - num_sampled_blocks / num_blocks)
+    standard_error = math.sqrt(
+        finite_population_correction * residual_variance / num_sampled_blocks
+    ) / mean_denominator
+
+    return ratio, max(0.0, ratio - z * standard_error), min(1.0, ratio + z * standard_error)
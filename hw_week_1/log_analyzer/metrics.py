@@ -0,0 +1,143 @@
+import cProfile
+import datetime
+import json
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, NoReturn, Optional, Union
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+METRICS_VERSION = 1
+
+
+def get_peak_rss() -> Optional[int]:
+
+    """
+    Gets peak resident set size of current process and of the largest of its finished worker processes.
+    Peak is high-water mark of the whole process lifetime, not of the current run only
+    :return: peak RSS in bytes or None if platform has no resource module
+    """
+
+    if resource is None:
+        return None
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss_unit = 1 if sys.platform == "darwin" else 1024
+
+    return max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    ) * rss_unit
+
+
+class RunMetrics:
+
+    """
+    Durations of pipeline stages and counters of one analyzer run.
+    Status is "ok" unless run failed, failed run keeps its error message
+    """
+
+    def __init__(self):
+        self.started_at = datetime.datetime.now()
+        self.stage_times: Dict[str, float] = dict()
+        self.counters: Dict[str, Union[int, float, None]] = dict()
+        self.status = "ok"
+        self.error: Optional[str] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[NoReturn]:
+
+        """
+        Measures wall time of pipeline stage, time of stage entered several times is summed up
+        :param name: name of stage
+        """
+
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_times[name] = self.stage_times.get(name, 0.0) + time.perf_counter() - started_at
+
+    def count(self, name: str, value: Union[int, float]) -> NoReturn:
+
+        """
+        Adds value to counter
+        :param name: name of counter
+        :param value: value to add
+        """
+
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def fail(self, error: BaseException) -> NoReturn:
+
+        """
+        Marks run as failed
+        :param error: error that stopped run
+        """
+
+        self.status = "failed"
+        self.error = f"{type(error).__name__}: {error}"
+
+    def as_dict(self) -> Dict[str, Union[int, float, str, dict, None]]:
+
+        """
+        Makes machine-readable metrics, lines/s are calculated for calculate_url_stats stage
+        :return: metrics ready for json
+        """
+
+        counters = dict(self.counters, peak_rss=get_peak_rss())
+        analysis_time = self.stage_times.get("calculate_url_stats")
+        if analysis_time and "lines_read" in counters:
+            counters["lines_per_second"] = counters["lines_read"] / analysis_time
+
+        return {
+            "version": METRICS_VERSION,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "status": self.status,
+            "error": self.error,
+            "stage_times": self.stage_times,
+            "counters": counters
+        }
+
+
+def save_metrics(metrics_name: str, metrics: RunMetrics) -> NoReturn:
+
+    """
+    Atomically saves metrics of run as json
+    :param metrics_name: path to metrics file
+    :param metrics: metrics of run
+    """
+
+    temporary_metrics_name = f"{metrics_name}.tmp"
+    with open(temporary_metrics_name, "wt", encoding="utf-8") as metrics_file:
+        json.dump(metrics.as_dict(), metrics_file, indent=2)
+    os.replace(temporary_metrics_name, metrics_name)
+
+
+@contextmanager
+def profiling(profile_name_prefix: str) -> Iterator[NoReturn]:
+
+    """
+    Profiles code with cProfile and tracemalloc, dumps cProfile stats to <prefix>.prof
+    (open with pstats or snakeviz) and tracemalloc snapshot to <prefix>.tracemalloc
+    (load with tracemalloc.Snapshot.load). Worker processes aren't profiled
+    :param profile_name_prefix: path prefix of profile files
+    """
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+        profiler.dump_stats(f"{profile_name_prefix}.prof")
+        snapshot.dump(f"{profile_name_prefix}.tracemalloc")
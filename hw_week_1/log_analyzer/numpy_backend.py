@@ -0,0 +1,128 @@
+import heapq
+from array import array
+from typing import Dict, Iterable, List, Sequence
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+AGGREGATION_BACKENDS = ("python", "numpy")
+
+
+class PrecomputedQuantiles:
+
+    """
+    Quantiles of url request time calculated in bulk for all report urls,
+    quacks like quantile estimator of quantiles module for precomputed levels
+    """
+
+    __slots__ = ("values_by_level",)
+
+    def __init__(self, values_by_level: Dict[float, float]):
+        self.values_by_level = values_by_level
+
+    def quantile(self, q: float) -> float:
+
+        """
+        Gets precomputed quantile
+        :param q: quantile level from 0 to 1
+        :return: quantile value
+        """
+
+        return self.values_by_level[q]
+
+
+def is_numpy_available() -> bool:
+
+    """
+    Checks if NumPy can be imported
+    """
+
+    return numpy is not None
+
+
+def select_top_slots(time_sums: array, size: int, num_signs: int) -> List[int]:
+
+    """
+    Finds slots with the biggest rounded total request time, the same ones and in the same order
+    as heapq.nlargest over all slots does. Rounding changes sum by half of last sign at most,
+    so only slots whose sum is close to size-th biggest sum are compared
+    with exactly rounded keys, the rest are dropped with vectorized comparison
+    :param time_sums: typed array of total request time by slot
+    :param size: number of slots to find
+    :param num_signs: number of decimal signs sums are rounded to
+    :return: slots in descending order of rounded total request time
+    """
+
+    sums = numpy.frombuffer(time_sums, dtype=numpy.float64)
+    if size <= 0 or not len(sums):
+        return list()
+    if size < len(sums):
+        size_th_sum = numpy.partition(sums, len(sums) - size)[len(sums) - size]
+        # Two last signs leave room for error of float arithmetic
+        candidate_slots = numpy.flatnonzero(sums >= size_th_sum - 2 * 10 ** -num_signs).tolist()
+    else:
+        candidate_slots = range(len(sums))
+
+    return heapq.nlargest(size, candidate_slots, key=lambda slot: round(time_sums[slot], num_signs))
+
+
+def calculate_quantiles(
+        duration_slots: array,
+        durations: array,
+        slots: Iterable[int],
+        levels: Sequence[float]
+) -> Dict[int, PrecomputedQuantiles]:
+
+    """
+    Calculates quantiles of request time of selected slots in bulk: request times of selected slots are
+    sorted by slot and value at once and quantiles of every slot are taken from its segment by index.
+    Results are the same as ExactQuantiles ones: median is mean of two middle values (the only one
+    for odd count), other quantiles are linearly interpolated between closest ranks
+    :param duration_slots: typed array of slot of every request
+    :param durations: typed array of request time of every request
+    :param slots: slots to calculate quantiles for
+    :param levels: quantile levels from 0 to 1
+    :return: precomputed quantiles by slot
+    """
+
+    slots = list(slots)
+    if not slots:
+        return dict()
+
+    all_slots = numpy.frombuffer(duration_slots, dtype=numpy.int32)
+    all_durations = numpy.frombuffer(durations, dtype=numpy.float64)
+    # Every selected slot has requests, so every slot of selected ones is below the biggest slot of requests
+    is_selected = numpy.zeros(int(all_slots.max()) + 1, dtype=bool)
+    is_selected[slots] = True
+    selected = is_selected[all_slots]
+    selected_slots = all_slots[selected]
+    selected_durations = all_durations[selected]
+
+    order = numpy.lexsort((selected_durations, selected_slots))
+    sorted_slots = selected_slots[order]
+    sorted_durations = selected_durations[order]
+    segment_slots, segment_starts, segment_counts = numpy.unique(sorted_slots, return_index=True, return_counts=True)
+
+    values_by_level = dict()
+    for level in levels:
+        if level == 0.5:
+            lower = sorted_durations[segment_starts + (segment_counts - 1) // 2]
+            upper = sorted_durations[segment_starts + segment_counts // 2]
+            values_by_level[level] = (lower + upper) / 2
+            continue
+        positions = level * (segment_counts - 1).astype(numpy.float64)
+        lower_indexes = numpy.floor(positions).astype(numpy.int64)
+        upper_indexes = numpy.minimum(lower_indexes + 1, segment_counts - 1)
+        fractions = positions - lower_indexes
+        lower = sorted_durations[segment_starts + lower_indexes]
+        upper = sorted_durations[segment_starts + upper_indexes]
+        values_by_level[level] = lower + fractions * (upper - lower)
+
+    level_values = {level: values.tolist() for level, values in values_by_level.items()}
+
+    return {
+        slot: PrecomputedQuantiles({level: values[segment] for level, values in level_values.items()})
+        for segment, slot in enumerate(segment_slots.tolist())
+    }
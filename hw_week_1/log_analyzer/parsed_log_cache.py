@@ -0,0 +1,225 @@
+import ast
+import json
+import logging
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from typing import Dict, List, NamedTuple, NoReturn, Optional, Union
+
+PARSED_LOG_CACHE_VERSION = 2
+NPY_MAGIC = b"\x93NUMPY"
+NPY_HEADER_ALIGNMENT = 64
+# Type codes of array module and descriptions of little-endian NumPy dtypes
+NPY_DESCRS = {
+    "i": "<i4",
+    "q": "<i8",
+    "d": "<f8",
+}
+
+URLS_NAME = "urls.txt"
+META_NAME = "meta.json"
+# Column name -> type code
+COLUMN_TYPECODES = {
+    "url_slots": "i",
+    "request_times": "d",
+    "request_buckets": "i",
+    "url_counts": "q",
+    "url_time_sums": "d",
+    "url_time_maxes": "d",
+}
+
+
+class ParsedLogColumns(NamedTuple):
+
+    """
+    Class with parsed log in columns such as:
+    - urls: url dictionary, url id is index of url in list
+    - url_slots: url id of every parsed line (int32)
+    - request_times: request time of every parsed line (float64)
+    - request_buckets: time bucket of every parsed line (int32), empty if time buckets are disabled
+    - url_counts, url_time_sums, url_time_maxes: totals of every url of dictionary (int64, float64, float64),
+      so that they aren't recalculated from lines
+    - num_failures: number of lines that failed parsing (their positions don't change stats)
+    - all_requests_time: total request time of parsed lines
+    Columns are bytes of arrays, loaded columns are memory mapped
+    """
+
+    urls: List[Union[str, bytes]]
+    url_slots: Union[memoryview, array]
+    request_times: Union[memoryview, array]
+    request_buckets: Union[memoryview, array]
+    url_counts: Union[memoryview, array]
+    url_time_sums: Union[memoryview, array]
+    url_time_maxes: Union[memoryview, array]
+    num_failures: int
+    all_requests_time: float
+
+    @property
+    def num_lines(self) -> int:
+
+        """
+        Number of parsed lines including failed ones
+        """
+
+        return len(memoryview(self.request_times).cast("B")) // array("d").itemsize + self.num_failures
+
+
+def write_npy(npy_name: str, column: array) -> NoReturn:
+
+    """
+    Writes typed array as one-dimensional .npy file (format version 1.0),
+    so that it can be loaded with numpy.load(npy_name, mmap_mode="r")
+    :param npy_name: path to .npy file
+    :param column: typed array with type code from NPY_DESCRS
+    """
+
+    header = f"{{'descr': '{NPY_DESCRS[column.typecode]}', 'fortran_order': False, 'shape': ({len(column)},), }}"
+    header_size = len(NPY_MAGIC) + 2 + 2 + len(header) + 1
+    header += " " * (-header_size % NPY_HEADER_ALIGNMENT) + "\n"
+
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+
+    with open(npy_name, "wb") as npy_file:
+        npy_file.write(NPY_MAGIC + bytes((1, 0)) + len(header).to_bytes(2, "little") + header.encode("latin1"))
+        column.tofile(npy_file)
+
+
+def map_npy(npy_name: str, typecode: str) -> memoryview:
+
+    """
+    Maps data of one-dimensional .npy file into memory
+    :param npy_name: path to .npy file
+    :param typecode: expected type code of array module
+    :return: read-only bytes of column data
+    """
+
+    with open(npy_name, "rb") as npy_file:
+        prefix = npy_file.read(len(NPY_MAGIC) + 4)
+        if prefix[:len(NPY_MAGIC)] != NPY_MAGIC or prefix[len(NPY_MAGIC)] != 1:
+            raise ValueError(f"Unsupported .npy file {npy_name}")
+        header_size = int.from_bytes(prefix[-2:], "little")
+        header = ast.literal_eval(npy_file.read(header_size).decode("latin1"))
+        if header["descr"] != NPY_DESCRS[typecode] or header["fortran_order"] or len(header["shape"]) != 1:
+            raise ValueError(f"Unexpected column in .npy file {npy_name}: {header}")
+        data_offset = len(prefix) + header_size
+        data_size = header["shape"][0] * array(typecode).itemsize
+        if not data_size:
+            return memoryview(b"")
+        mapped_column = mmap.mmap(npy_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    if len(mapped_column) != data_offset + data_size:
+        raise ValueError(f"Truncated .npy file {npy_name}")
+    column = memoryview(mapped_column)[data_offset:]
+    if sys.byteorder != "little":
+        swapped_column = array(typecode, column.tobytes())
+        swapped_column.byteswap()
+        return memoryview(swapped_column.tobytes())
+
+    return column
+
+
+def save_parsed_log(
+        cache_name: str,
+        columns: ParsedLogColumns,
+        fingerprint: Dict[str, int],
+        settings: Dict[str, object]
+) -> NoReturn:
+
+    """
+    Saves parsed log as directory with .npy columns, url dictionary and meta,
+    directory appears under its name only when it is completely written
+    :param cache_name: path to cache directory
+    :param columns: parsed log columns with typed arrays
+    :param fingerprint: size and mtime of parsed log file
+    :param settings: parser settings the log was parsed with
+    """
+
+    temporary_cache_name = f"{cache_name}.tmp"
+    shutil.rmtree(temporary_cache_name, ignore_errors=True)
+    os.makedirs(temporary_cache_name)
+
+    for column_name in COLUMN_TYPECODES:
+        write_npy(
+            npy_name=os.path.join(temporary_cache_name, f"{column_name}.npy"),
+            column=getattr(columns, column_name)
+        )
+    with open(os.path.join(temporary_cache_name, URLS_NAME), "wb") as urls_file:
+        for url in columns.urls:
+            urls_file.write(url if isinstance(url, bytes) else url.encode("utf-8"))
+            urls_file.write(b"\n")
+    with open(os.path.join(temporary_cache_name, META_NAME), "wt", encoding="utf-8") as meta_file:
+        json.dump(
+            {
+                "version": PARSED_LOG_CACHE_VERSION,
+                "fingerprint": fingerprint,
+                "settings": settings,
+                "num_urls": len(columns.urls),
+                "num_failures": columns.num_failures,
+                "all_requests_time": columns.all_requests_time
+            },
+            meta_file
+        )
+
+    shutil.rmtree(cache_name, ignore_errors=True)
+    os.replace(temporary_cache_name, cache_name)
+
+
+def load_parsed_log(
+        cache_name: str,
+        fingerprint: Dict[str, int],
+        settings: Dict[str, object]
+) -> Optional[ParsedLogColumns]:
+
+    """
+    Loads parsed log if it was saved for the same log file with the same parser settings.
+    Columns are memory mapped, not read
+    :param cache_name: path to cache directory
+    :param fingerprint: size and mtime of log file
+    :param settings: parser settings
+    :return: parsed log columns or None if there is no valid cache
+    """
+
+    meta_name = os.path.join(cache_name, META_NAME)
+    if not os.path.exists(meta_name):
+        return None
+
+    try:
+        with open(meta_name, "rt", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        if (
+            meta["version"] != PARSED_LOG_CACHE_VERSION
+            or meta["fingerprint"] != fingerprint
+            or meta["settings"] != json.loads(json.dumps(settings))
+        ):
+            logging.info("Parsed log cache %s doesn't match log file anymore", cache_name)
+            return None
+
+        with open(os.path.join(cache_name, URLS_NAME), "rb") as urls_file:
+            urls = urls_file.read().split(b"\n")[:-1]
+        mapped_columns = {
+            column_name: map_npy(npy_name=os.path.join(cache_name, f"{column_name}.npy"), typecode=typecode)
+            for column_name, typecode in COLUMN_TYPECODES.items()
+        }
+        num_lines = len(mapped_columns["url_slots"]) // array("i").itemsize
+        num_urls = len(mapped_columns["url_counts"]) // array("q").itemsize
+        if (
+            len(urls) != meta["num_urls"]
+            or num_urls != len(urls)
+            or len(mapped_columns["request_times"]) // array("d").itemsize != num_lines
+            or len(mapped_columns["request_buckets"]) // array("i").itemsize not in (0, num_lines)
+        ):
+            raise ValueError("Columns of parsed log have different length")
+    except (OSError, ValueError, KeyError, TypeError, SyntaxError):
+        logging.exception("Failed to load parsed log cache %s, log will be parsed", cache_name)
+        return None
+
+    return ParsedLogColumns(
+        urls=urls,
+        num_failures=meta["num_failures"],
+        all_requests_time=meta["all_requests_time"],
+        **mapped_columns
+    )
@@ -0,0 +1,167 @@
+import gzip
+import json
+import os
+from typing import Dict, Iterable, List, NamedTuple, NoReturn
+
+from quantiles import HdrHistogram
+
+PARTIAL_AGGREGATE_FORMAT = "log_analyzer.partial_aggregate"
+PARTIAL_AGGREGATE_VERSION = 1
+
+
+class PartialAggregateError(Exception):
+    pass
+
+
+class PartialAggregate(NamedTuple):
+
+    """
+    Class with url stats of one or several logs (e.g. of different frontend nodes) that can be merged
+    with other partial aggregates in any order, such as:
+    - log_dates: dates of aggregated logs
+    - sources: names of hosts and logs aggregated
+    - settings: config parameters that change urls and sketches, only aggregates with equal settings are merged
+    - num_requests, num_failures, all_requests_time: totals of all lines
+    - urls, counts, time_sums, time_maxes: url totals, items of lists with the same index belong to the same url
+    - histograms: HDR histograms of url request time
+    """
+
+    log_dates: List[str]
+    sources: List[str]
+    settings: Dict[str, object]
+    num_requests: int
+    num_failures: int
+    all_requests_time: float
+    urls: List[str]
+    counts: List[int]
+    time_sums: List[float]
+    time_maxes: List[float]
+    histograms: List[HdrHistogram]
+
+
+def merge_partial_aggregates(partial_aggregates: Iterable[PartialAggregate]) -> PartialAggregate:
+
+    """
+    Merges partial aggregates into one: totals are added, maxima and histograms are merged.
+    Merge is associative and commutative (up to float rounding of sums),
+    so aggregates can be merged in a tree, e.g. by datacenter first and then together
+    :param partial_aggregates: aggregates with equal settings
+    :return: merged aggregate
+    """
+
+    partial_aggregates = list(partial_aggregates)
+    if not partial_aggregates:
+        raise PartialAggregateError("Nothing to merge")
+    settings = partial_aggregates[0].settings
+    for partial_aggregate in partial_aggregates[1:]:
+        if partial_aggregate.settings != settings:
+            raise PartialAggregateError(
+                f"Partial aggregates are made with different settings: {settings} and {partial_aggregate.settings}"
+            )
+
+    index_by_url = dict()
+    urls = list()
+    counts = list()
+    time_sums = list()
+    time_maxes = list()
+    histograms = list()
+    for partial_aggregate in partial_aggregates:
+        for url, count, time_sum, time_max, histogram in zip(
+                partial_aggregate.urls,
+                partial_aggregate.counts,
+                partial_aggregate.time_sums,
+                partial_aggregate.time_maxes,
+                partial_aggregate.histograms
+        ):
+            index = index_by_url.get(url)
+            if index is None:
+                index_by_url[url] = len(urls)
+                urls.append(url)
+                counts.append(count)
+                time_sums.append(time_sum)
+                time_maxes.append(time_max)
+                merged_histogram = HdrHistogram()
+                merged_histogram.merge(histogram)
+                histograms.append(merged_histogram)
+                continue
+            counts[index] += count
+            time_sums[index] += time_sum
+            time_maxes[index] = max(time_maxes[index], time_max)
+            histograms[index].merge(histogram)
+
+    log_dates = {log_date for partial_aggregate in partial_aggregates for log_date in partial_aggregate.log_dates}
+
+    return PartialAggregate(
+        log_dates=sorted(log_dates),
+        sources=[source for partial_aggregate in partial_aggregates for source in partial_aggregate.sources],
+        settings=settings,
+        num_requests=sum(partial_aggregate.num_requests for partial_aggregate in partial_aggregates),
+        num_failures=sum(partial_aggregate.num_failures for partial_aggregate in partial_aggregates),
+        all_requests_time=sum(partial_aggregate.all_requests_time for partial_aggregate in partial_aggregates),
+        urls=urls,
+        counts=counts,
+        time_sums=time_sums,
+        time_maxes=time_maxes,
+        histograms=histograms
+    )
+
+
+def save_partial_aggregate(partial_aggregate_name: str, partial_aggregate: PartialAggregate) -> NoReturn:
+
+    """
+    Atomically saves partial aggregate as gzipped JSON with format name and version
+    :param partial_aggregate_name: path to file, e.g. partial-2017.06.30-front1.json.gz
+    :param partial_aggregate: aggregate to save
+    """
+
+    raw_partial_aggregate = dict(
+        partial_aggregate._asdict(),
+        format=PARTIAL_AGGREGATE_FORMAT,
+        version=PARTIAL_AGGREGATE_VERSION,
+        histograms=[histogram.as_dict() for histogram in partial_aggregate.histograms]
+    )
+
+    temporary_partial_aggregate_name = f"{partial_aggregate_name}.tmp"
+    with gzip.open(temporary_partial_aggregate_name, "wt", encoding="utf-8") as partial_aggregate_file:
+        json.dump(raw_partial_aggregate, partial_aggregate_file, separators=(",", ":"))
+    os.replace(temporary_partial_aggregate_name, partial_aggregate_name)
+
+
+def load_partial_aggregate(partial_aggregate_name: str) -> PartialAggregate:
+
+    """
+    Loads partial aggregate saved by save_partial_aggregate
+    :param partial_aggregate_name: path to file
+    :return: partial aggregate
+    :raise PartialAggregateError: if file isn't partial aggregate of supported version
+    """
+
+    with gzip.open(partial_aggregate_name, "rt", encoding="utf-8") as partial_aggregate_file:
+        raw_partial_aggregate = json.load(partial_aggregate_file)
+
+    if raw_partial_aggregate.get("format") != PARTIAL_AGGREGATE_FORMAT:
+        raise PartialAggregateError(f"{partial_aggregate_name} isn't partial aggregate")
+    if raw_partial_aggregate.get("version") != PARTIAL_AGGREGATE_VERSION:
+        raise PartialAggregateError(
+            f"Unsupported version {raw_partial_aggregate.get('version')} of partial aggregate {partial_aggregate_name}"
+        )
+
+    partial_aggregate = PartialAggregate(
+        **dict(
+            {field: raw_partial_aggregate[field] for field in PartialAggregate._fields},
+            histograms=[HdrHistogram.from_dict(raw_histogram) for raw_histogram in raw_partial_aggregate["histograms"]]
+        )
+    )
+    num_urls = len(partial_aggregate.urls)
+    if any(
+            len(column) != num_urls
+            for column in (
+                partial_aggregate.counts,
+                partial_aggregate.time_sums,
+                partial_aggregate.time_maxes,
+                partial_aggregate.histograms
+            )
+    ):
+        raise PartialAggregateError(f"Url columns of partial aggregate {partial_aggregate_name} have different length")
+
+    return partial_aggregate
@@ -0,0 +1,240 @@
+import math
+from itertools import islice
+from statistics import median
+from typing import Dict, Iterable, List, NoReturn, Sequence, Union
+
+
+class ExactQuantiles:
+
+    """
+    Keeps every value to calculate exact quantiles.
+    Memory grows with number of added values
+    """
+
+    __slots__ = ("values",)
+
+    def __init__(self):
+        self.values: List[float] = list()
+
+    def add(self, value: float) -> NoReturn:
+
+        """
+        Adds value to estimator
+        :param value: request time
+        """
+
+        self.values.append(value)
+
+    def merge(self, other: "ExactQuantiles") -> NoReturn:
+
+        """
+        Merges values of another estimator into current one
+        :param other: estimator with values of the same url
+        """
+
+        self.values.extend(other.values)
+
+    def quantile(self, q: float) -> float:
+
+        """
+        Calculates quantile with linear interpolation between closest ranks,
+        median is calculated exactly the same way as statistics.median does
+        :param q: quantile level from 0 to 1
+        :return: quantile value
+        """
+
+        if q == 0.5:
+            return median(self.values)
+
+        sorted_values = sorted(self.values)
+        position = q * (len(sorted_values) - 1)
+        lower_index = math.floor(position)
+        upper_index = min(lower_index + 1, len(sorted_values) - 1)
+        fraction = position - lower_index
+
+        return sorted_values[lower_index] + fraction * (sorted_values[upper_index] - sorted_values[lower_index])
+
+
+class HdrHistogram:
+
+    """
+    HDR-style log-linear histogram of request times.
+    Values are counted in microseconds, every power of two is split into
+    2 ** (SIGNIFICANT_BITS - 1) buckets, so relative error of quantile is below 1%
+    and number of buckets is bounded (about 1800 for requests up to an hour)
+    whatever number of values is added
+    """
+
+    SIGNIFICANT_BITS = 7
+    UNITS_PER_SECOND = 1_000_000
+
+    __slots__ = ("counts", "total", "min_value", "max_value")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = dict()
+        self.total = 0
+        self.min_value = math.inf
+        self.max_value = -math.inf
+
+    @classmethod
+    def bucket_index(cls, value: float) -> int:
+
+        """
+        Finds bucket for value
+        :param value: request time in seconds
+        :return: index of bucket
+        """
+
+        units = int(value * cls.UNITS_PER_SECOND)
+        if units < (1 << cls.SIGNIFICANT_BITS):
+            return max(units, 0)
+
+        exponent = units.bit_length() - cls.SIGNIFICANT_BITS
+        mantissa = units >> exponent
+        half_bucket_count = 1 << (cls.SIGNIFICANT_BITS - 1)
+
+        return (1 << cls.SIGNIFICANT_BITS) + (exponent - 1) * half_bucket_count + mantissa - half_bucket_count
+
+    @classmethod
+    def bucket_value(cls, index: int) -> float:
+
+        """
+        Finds value representing bucket (middle of bucket range)
+        :param index: index of bucket
+        :return: request time in seconds
+        """
+
+        bucket_count = 1 << cls.SIGNIFICANT_BITS
+        if index < bucket_count:
+            return index / cls.UNITS_PER_SECOND
+
+        half_bucket_count = bucket_count >> 1
+        exponent = (index - bucket_count) // half_bucket_count + 1
+        mantissa = (index - bucket_count) % half_bucket_count + half_bucket_count
+        lower_bound = mantissa << exponent
+
+        return (lower_bound + ((1 << exponent) - 1) / 2) / cls.UNITS_PER_SECOND
+
+    def add(self, value: float) -> NoReturn:
+
+        """
+        Adds value to histogram
+        :param value: request time in seconds
+        """
+
+        index = self.bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.total += 1
+        if value < self.min_value:
+            self.min_value = value
+        if value > self.max_value:
+            self.max_value = value
+
+    def merge(self, other: "HdrHistogram") -> NoReturn:
+
+        """
+        Merges another histogram into current one
+        :param other: histogram of the same url
+        """
+
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += other.total
+        self.min_value = min(self.min_value, other.min_value)
+        self.max_value = max(self.max_value, other.max_value)
+
+    def as_dict(self) -> Dict[str, Union[int, float, List[int]]]:
+
+        """
+        Makes compact representation of histogram for serialization
+        :return: bucket indexes and counts as flat [index, count, index, count, ...] list, total, min and max
+        """
+
+        return {
+            "counts": [item for index in sorted(self.counts) for item in (index, self.counts[index])],
+            "total": self.total,
+            "min": self.min_value,
+            "max": self.max_value
+        }
+
+    @classmethod
+    def from_dict(cls, raw_histogram: Dict[str, Union[int, float, List[int]]]) -> "HdrHistogram":
+
+        """
+        Restores histogram made by as_dict
+        :param raw_histogram: compact representation of histogram
+        :return: histogram
+        """
+
+        histogram = cls()
+        flat_counts = raw_histogram["counts"]
+        histogram.counts = dict(zip(flat_counts[::2], flat_counts[1::2]))
+        histogram.total = raw_histogram["total"]
+        histogram.min_value = raw_histogram["min"]
+        histogram.max_value = raw_histogram["max"]
+
+        return histogram
+
+    def quantile(self, q: float) -> float:
+
+        """
+        Estimates quantile
+        :param q: quantile level from 0 to 1
+        :return: quantile value clipped to range of added values
+        """
+
+        rank = max(1, math.ceil(q * self.total))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(max(self.bucket_value(index), self.min_value), self.max_value)
+
+        return self.max_value
+
+
+def select_quantiles(sorted_values: Iterable[float], count: int, levels: Sequence[float]) -> Dict[float, float]:
+
+    """
+    Calculates exact quantiles from sorted stream of values without keeping it: only values at ranks
+    that quantiles are taken from are picked. Results are the same as ExactQuantiles ones
+    :param sorted_values: values in ascending order
+    :param count: number of values
+    :param levels: quantile levels from 0 to 1
+    :return: quantile values by level
+    """
+
+    ranks_by_level = dict()
+    for level in levels:
+        if level == 0.5:
+            # Median is mean of two middle values (the only one for odd count) as statistics.median does
+            middle = count // 2
+            ranks_by_level[level] = (middle, middle, None) if count % 2 else (middle - 1, middle, None)
+        else:
+            position = level * (count - 1)
+            lower_rank = math.floor(position)
+            ranks_by_level[level] = (lower_rank, min(lower_rank + 1, count - 1), position - lower_rank)
+
+    ranks = sorted({rank for lower_rank, upper_rank, _ in ranks_by_level.values() for rank in (lower_rank, upper_rank)})
+    values_by_rank = dict()
+    values = iter(sorted_values)
+    previous_rank = -1
+    for rank in ranks:
+        values_by_rank[rank] = next(islice(values, rank - previous_rank - 1, None))
+        previous_rank = rank
+
+    quantiles = dict()
+    for level, (lower_rank, upper_rank, fraction) in ranks_by_level.items():
+        lower_value, upper_value = values_by_rank[lower_rank], values_by_rank[upper_rank]
+        if fraction is None:
+            quantiles[level] = lower_value if lower_rank == upper_rank else (lower_value + upper_value) / 2
+        else:
+            quantiles[level] = lower_value + fraction * (upper_value - lower_value)
+
+    return quantiles
+
+
+QUANTILE_BACKENDS = {
+    "exact": ExactQuantiles,
+    "hdr": HdrHistogram
+}
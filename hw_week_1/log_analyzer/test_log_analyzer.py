@@ -1,40 +1,47 @@
 import datetime
+import glob
+import gzip
+import json
 import os
+import shutil
+import statistics
+import tempfile
 import unittest
-from typing import NoReturn, Tuple, NamedTuple
+import unittest.mock
+from string import Template
+from typing import NoReturn, Tuple
 
-from log_analyzer import LOG_FILE_PATTERN
+from log_analyzer import LOG_FILE_PATTERN, Config, LatestLogFile
 from log_analyzer import find_latest_log, parse_log_file, calculate_url_stats
-
-
-class Config(NamedTuple):
-
-    """
-    Class with final config parameters such as:
-    - report_size: size of report
-    - report_dir: directory where report will be constructed
-    - log_dir: directory where to take logs from
-    """
-
-    report_size: int
-    report_dir: str
-    log_dir: str
-    log_file: str
-    failures_percent_threshold: float
-
-
-class LatestLogFile(NamedTuple):
-
-    """
-    Class with latest log file parameters such as:
-    - path path to latest log file
-    - create_date creation date
-    - extension file extension
-    """
-
-    path: str
-    date_of_creation: datetime.date
-    extension: str
+from log_analyzer import split_log_file, read_log_file_range, calculate_url_stats_in_parallel
+from log_analyzer import CONFIG, get_config_parameters, parse_log_file_by_config
+from log_analyzer import calculate_url_stats_incrementally
+from log_analyzer import find_unreported_logs, generate_backlog_reports
+from log_analyzer import find_latest_log_by_config, open_indexed_log_dir
+from log_analyzer import accumulate_log_file, generate_parsed_cache_name
+from log_analyzer import render_report, build_url_stats, UrlStatsAccumulator
+from log_analyzer import FailuresPercentageError, generate_metrics_name, generate_report_for_log, generate_report_name
+from log_analyzer import follow_log
+from log_analyzer import accumulate_log_sample, iter_sampled_url_stats
+from log_analyzer import accumulate_heavy_hitters, iter_heavy_hitter_url_stats
+from log_analyzer import accumulate_with_spilling, iter_spilled_url_stats
+from log_analyzer import accumulate_partial_aggregate, generate_partial_aggregate, reduce_partial_aggregates
+from live_tail import LogFollower
+from log_dir_index import LogDirIndex
+from external_sort import MAX_MERGE_RUNS, RUN_RECORD_OVERHEAD, SPILL_HEADROOM, write_duration_run, write_run
+from heavy_hitters import HyperLogLog
+from log_sampling import MIN_BLOCKS_TO_ABORT
+from log_format import LogFormatError, compile_log_format, parse_lines_by_format
+from gzip_index import load_or_build_gzip_index, read_gzip_lines_pipelined, read_gzip_region, split_gzip_index
+from numpy_backend import is_numpy_available
+from partial_aggregate import PartialAggregateError, load_partial_aggregate, merge_partial_aggregates
+from quantiles import ExactQuantiles, HdrHistogram, select_quantiles
+from time_buckets import TimeLocalParser
+from url_normalizer import UrlNormalizationRules, UrlNormalizer
+from warehouse import open_warehouse, query_top, query_trend
+from metrics import get_peak_rss
+from benchmark.generate_log import LogGeneratorSettings, write_log
+from benchmark.run_benchmark import run_benchmark
 
 
 class TestLatestLogFileFinder(unittest.TestCase):
@@ -219,3 +226,1656 @@ class TestUrlStatsCalculator(unittest.TestCase):
                 self.assertIn("time_max", single_url_stat)
                 self.assertIn("time_med", single_url_stat)
 
+    def test_accumulator_coincides_with_dict_stats(self):
+
+        """
+        Tests that url stats kept in slots of accumulator arrays are the same as stats kept in dict by url
+        and that accumulators of two parts of log merged into one give the same stats
+        """
+
+        parsed_lines = list(parse_log_file(log_file=TestUrlStatsCalculator.LOG_FILE, log_file_opener=open))
+        durations_by_url = dict()
+        for url, duration, is_failed in parsed_lines:
+            if not is_failed:
+                durations_by_url.setdefault(url, list()).append(duration)
+
+        whole_accumulator = UrlStatsAccumulator()
+        whole_accumulator.consume(parsed_line_gen=parsed_lines)
+        first_accumulator, second_accumulator = UrlStatsAccumulator(), UrlStatsAccumulator()
+        first_accumulator.consume(parsed_line_gen=parsed_lines[:len(parsed_lines) // 3])
+        second_accumulator.consume(parsed_line_gen=parsed_lines[len(parsed_lines) // 3:])
+        first_accumulator.merge(second_accumulator)
+
+        for name, accumulator in (("whole", whole_accumulator), ("merged", first_accumulator)):
+            time_estimators = accumulator.time_estimators_for(slots=range(len(accumulator.urls)))
+            with self.subTest(accumulator=name):
+                self.assertEqual(len(parsed_lines), accumulator.num_requests)
+                self.assertEqual(
+                    sum(is_failed for _, _, is_failed in parsed_lines),
+                    accumulator.num_failures
+                )
+                self.assertEqual(set(durations_by_url), set(accumulator.urls))
+            for url, durations in durations_by_url.items():
+                slot = accumulator.slot_by_url[url]
+                with self.subTest(accumulator=name, url=url):
+                    self.assertEqual(len(durations), accumulator.counts[slot])
+                    self.assertAlmostEqual(sum(durations), accumulator.time_sums[slot], places=9)
+                    self.assertEqual(max(durations), accumulator.time_maxes[slot])
+                    self.assertEqual(statistics.median(durations), time_estimators[slot].quantile(0.5))
+
+
+class TestParallelUrlStatsCalculator(unittest.TestCase):
+
+    """
+    Class for testing parallel calculator of url stats
+    """
+
+    TEST_CONFIG = Config(
+        report_size=50,
+        report_dir="./reports",
+        log_dir="./nginx_logs",
+        log_file="./script_logs/test.log",
+        failures_percent_threshold=50.0,
+        workers=3
+    )
+
+    LOG_FILE = LatestLogFile(
+        path="./nginx_logs/test_sample.txt",
+        date_of_creation=datetime.date(year=2019, month=11, day=5),
+        extension=".txt"
+    )
+
+    def test_log_ranges_are_aligned_to_lines(self):
+
+        """
+        Tests that byte ranges cover the whole file and start at line beginnings
+        """
+
+        log_ranges = split_log_file(log_file_path=TestParallelUrlStatsCalculator.LOG_FILE.path, num_chunks=7)
+
+        with open(TestParallelUrlStatsCalculator.LOG_FILE.path, "rb") as log_file:
+            content = log_file.read()
+
+        with self.subTest():
+            self.assertEqual(0, log_ranges[0][0])
+        with self.subTest():
+            self.assertEqual(len(content), log_ranges[-1][1])
+        with self.subTest():
+            for (_, previous_end), (start, _) in zip(log_ranges[:-1], log_ranges[1:]):
+                self.assertEqual(previous_end, start)
+                self.assertEqual(b"\n"[0], content[start - 1])
+
+    def test_parallel_stats_coincide_with_serial(self):
+
+        """
+        Tests that stats calculated in process pool are the same as stats calculated serially
+        """
+
+        parsed_line_gen = parse_log_file(
+            log_file=TestParallelUrlStatsCalculator.LOG_FILE,
+            log_file_opener=open
+        )
+        serial_url_stats = calculate_url_stats(
+            parsed_line_gen=parsed_line_gen,
+            cfg=TestParallelUrlStatsCalculator.TEST_CONFIG
+        )
+        parallel_url_stats = calculate_url_stats_in_parallel(
+            log_file=TestParallelUrlStatsCalculator.LOG_FILE,
+            cfg=TestParallelUrlStatsCalculator.TEST_CONFIG
+        )
+
+        self.assertEqual(serial_url_stats, parallel_url_stats)
+
+    def test_mapped_reader_coincides_with_buffered(self):
+
+        """
+        Tests that memory mapped reader yields the same lines as buffered reader for every byte range
+        """
+
+        log_file_path = TestParallelUrlStatsCalculator.LOG_FILE.path
+        for start, end in split_log_file(log_file_path=log_file_path, num_chunks=5):
+            with self.subTest(start=start, end=end):
+                self.assertEqual(
+                    list(read_log_file_range(log_file_path=log_file_path, start=start, end=end)),
+                    list(read_log_file_range(log_file_path=log_file_path, start=start, end=end, reader="mmap"))
+                )
+
+
+class TestQuantileBackends(unittest.TestCase):
+
+    """
+    Class for testing estimators of request time quantiles
+    """
+
+    LOG_FILE = LatestLogFile(
+        path="./nginx_logs/test_sample.txt",
+        date_of_creation=datetime.date(year=2019, month=11, day=5),
+        extension=".txt"
+    )
+
+    def test_hdr_histogram_relative_error(self):
+
+        """
+        Tests that quantiles estimated by histogram are within 1% of exact ones
+        """
+
+        exact_quantiles = ExactQuantiles()
+        histogram = HdrHistogram()
+        for value_number in range(1, 10001):
+            value = (value_number * 7919 % 10007) / 1000
+            exact_quantiles.add(value)
+            histogram.add(value)
+
+        for q in (0.5, 0.9, 0.95, 0.99):
+            with self.subTest(q=q):
+                exact_value = exact_quantiles.quantile(q)
+                self.assertLessEqual(abs(histogram.quantile(q) - exact_value), 0.01 * exact_value)
+
+    def test_hdr_histogram_merge(self):
+
+        """
+        Tests that merged histograms are the same as histogram of all values
+        """
+
+        first_histogram, second_histogram, whole_histogram = HdrHistogram(), HdrHistogram(), HdrHistogram()
+        for value_number in range(1000):
+            value = value_number / 100
+            (first_histogram if value_number % 2 else second_histogram).add(value)
+            whole_histogram.add(value)
+        first_histogram.merge(second_histogram)
+
+        self.assertEqual(whole_histogram.counts, first_histogram.counts)
+
+    def test_quantiles_selected_from_sorted_stream(self):
+
+        """
+        Tests that quantiles picked from sorted stream are exactly the same as exact ones for odd and even counts
+        """
+
+        levels = (0.5, 0.9, 0.95, 0.99, 1.0)
+        for count in (1, 2, 3, 10, 101, 1000):
+            exact_quantiles = ExactQuantiles()
+            for value_number in range(count):
+                exact_quantiles.add((value_number * 7919 % 10007) / 1000)
+            selected_quantiles = select_quantiles(
+                sorted_values=iter(sorted(exact_quantiles.values)),
+                count=count,
+                levels=levels
+            )
+            with self.subTest(count=count):
+                self.assertEqual({q: exact_quantiles.quantile(q) for q in levels}, selected_quantiles)
+
+    def test_report_percentiles_columns(self):
+
+        """
+        Tests that report has configured percentiles columns and exact sums with histogram backend
+        """
+
+        exact_config = Config(
+            report_size=50,
+            report_dir="./reports",
+            log_dir="./nginx_logs",
+            log_file="./script_logs/test.log",
+            failures_percent_threshold=50.0
+        )
+        hdr_config = exact_config._replace(quantile_backend="hdr", report_percentiles=(90, 99))
+
+        exact_url_stats = calculate_url_stats(
+            parsed_line_gen=parse_log_file(log_file=TestQuantileBackends.LOG_FILE, log_file_opener=open),
+            cfg=exact_config
+        )
+        hdr_url_stats = calculate_url_stats(
+            parsed_line_gen=parse_log_file(log_file=TestQuantileBackends.LOG_FILE, log_file_opener=open),
+            cfg=hdr_config
+        )
+
+        for exact_url_stat, hdr_url_stat in zip(exact_url_stats, hdr_url_stats):
+            with self.subTest(url=exact_url_stat["url"]):
+                self.assertIn("time_p90", hdr_url_stat)
+                self.assertIn("time_p99", hdr_url_stat)
+                self.assertEqual(exact_url_stat["time_sum"], hdr_url_stat["time_sum"])
+                self.assertEqual(exact_url_stat["time_max"], hdr_url_stat["time_max"])
+
+
+class TestLogFormatParser(unittest.TestCase):
+
+    """
+    Class for testing bytes-level parser driven by nginx log_format
+    """
+
+    LOG_FILE = LatestLogFile(
+        path="./nginx_logs/test_sample.txt",
+        date_of_creation=datetime.date(year=2019, month=11, day=5),
+        extension=".txt"
+    )
+
+    def test_format_parser_coincides_with_split_parser(self):
+
+        """
+        Tests that parser by default log_format gives the same results as whitespace split parser
+        """
+
+        format_config = get_config_parameters(default_config=CONFIG, config_from_file_={"PARSER": "format"})
+
+        split_results = list(parse_log_file(log_file=TestLogFormatParser.LOG_FILE, log_file_opener=open))
+        format_results = list(parse_log_file_by_config(log_file=TestLogFormatParser.LOG_FILE, cfg=format_config))
+
+        self.assertEqual(
+            [tuple(result) for result in split_results],
+            [(url if url is None else url.decode("utf-8"), duration, is_failed)
+             for url, duration, is_failed in format_results]
+        )
+
+    def test_extended_log_format(self):
+
+        """
+        Tests that fields after words with arbitrary width are found from the end of line
+        """
+
+        spec = compile_log_format(
+            '$remote_addr [$time_local] "$http_user_agent" "$request_uri" $status $request_time'
+        )
+        log_lines = [
+            b'1.2.3.4 [29/Jun/2017:03:50:22 +0300] "Mozilla/5.0 (X11; Linux)" "/api/v2/banner/1" 200 0.125\n',
+            b'broken line\n'
+        ]
+
+        self.assertEqual(
+            [(b"/api/v2/banner/1", 0.125, False), (None, None, True)],
+            list(parse_lines_by_format(log_lines=log_lines, spec=spec))
+        )
+
+    def test_raw_urls_are_decoded_for_report(self):
+
+        """
+        Tests that raw urls are aggregated as bytes, decoded for report rows and line with url
+        that isn't valid utf-8 is failed
+        """
+
+        config = get_config_parameters(default_config=CONFIG, config_from_file_={"REPORT_SIZE": 10})
+        parsed_lines = [(b"/api/\xd1\x82", 0.5, False), (b"/api/\xd1\x82", 1.5, False), (b"/api/\xff", 1.0, False)]
+        accumulator = UrlStatsAccumulator()
+        accumulator.consume(parsed_line_gen=parsed_lines)
+
+        with self.subTest():
+            self.assertEqual((3, 1), (accumulator.num_requests, accumulator.num_failures))
+        with self.subTest():
+            self.assertEqual(
+                [("/api/\u0442", 2)],
+                [
+                    (url_stat["url"], url_stat["count"])
+                    for url_stat in build_url_stats(accumulator=accumulator, cfg=config)
+                ]
+            )
+
+    def test_log_format_without_request_time(self):
+
+        """
+        Tests that log_format without $request_time is rejected
+        """
+
+        with self.assertRaises(LogFormatError):
+            compile_log_format('$remote_addr "$request" $status')
+
+
+class TestIncrementalUrlStatsCalculator(unittest.TestCase):
+
+    """
+    Class for testing incremental calculator of url stats resuming from checkpoint
+    """
+
+    SAMPLE_LOG_PATH = "./nginx_logs/test_sample.txt"
+
+    def setUp(self) -> NoReturn:
+
+        """
+        Creates temporary folder for growing log and checkpoint
+        """
+
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        self.log_file = LatestLogFile(
+            path=os.path.join(self.temporary_folder.name, "nginx-access-ui.log-20191105.log"),
+            date_of_creation=datetime.date(year=2019, month=11, day=5),
+            extension=".log"
+        )
+        self.checkpoint_name = os.path.join(self.temporary_folder.name, "report-2019.11.05.checkpoint")
+        self.config = get_config_parameters(default_config=CONFIG, config_from_file_={"REPORT_SIZE": 50})
+
+    def tearDown(self) -> NoReturn:
+
+        """
+        Deletes temporary folder
+        """
+
+        self.temporary_folder.cleanup()
+
+    def test_resumed_stats_coincide_with_full_pass(self):
+
+        """
+        Tests that stats for log appended between runs are the same as for full pass,
+        line that is being written isn't analyzed until it is complete
+        """
+
+        with open(TestIncrementalUrlStatsCalculator.SAMPLE_LOG_PATH, "rb") as sample_log:
+            sample_content = sample_log.read()
+        split_position = len(sample_content) // 2
+
+        with open(self.log_file.path, "wb") as growing_log:
+            growing_log.write(sample_content[:split_position])
+        calculate_url_stats_incrementally(
+            log_file=self.log_file,
+            cfg=self.config,
+            checkpoint_name=self.checkpoint_name
+        )
+
+        with open(self.log_file.path, "ab") as growing_log:
+            growing_log.write(sample_content[split_position:])
+        resumed_url_stats = calculate_url_stats_incrementally(
+            log_file=self.log_file,
+            cfg=self.config,
+            checkpoint_name=self.checkpoint_name
+        )
+
+        full_url_stats = calculate_url_stats(
+            parsed_line_gen=parse_log_file_by_config(log_file=self.log_file, cfg=self.config),
+            cfg=self.config
+        )
+
+        with self.subTest():
+            self.assertEqual(full_url_stats, resumed_url_stats)
+        with self.subTest():
+            self.assertIsNone(
+                calculate_url_stats_incrementally(
+                    log_file=self.log_file,
+                    cfg=self.config,
+                    checkpoint_name=self.checkpoint_name
+                )
+            )
+
+
+class TestBacklogReportsGenerator(unittest.TestCase):
+
+    """
+    Class for testing generation of reports for every unreported log
+    """
+
+    def setUp(self) -> NoReturn:
+
+        """
+        Creates temporary folders with logs and reports
+        """
+
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        log_dir = os.path.join(self.temporary_folder.name, "logs")
+        report_dir = os.path.join(self.temporary_folder.name, "reports")
+        os.mkdir(log_dir)
+        os.mkdir(report_dir)
+        shutil.copy("./reports/report.html", report_dir)
+
+        for log_file_name in ("nginx-access-ui.log-20191103.txt",
+                              "nginx-access-ui.log-20191104.gz",
+                              "nginx-access-ui.log-20191105.log"):
+            shutil.copy("./nginx_logs/test_sample.txt", os.path.join(log_dir, log_file_name))
+        with open(os.path.join(report_dir, "report-2019.11.03.html"), "w", encoding="utf-8"):
+            pass
+
+        self.config = get_config_parameters(
+            default_config=CONFIG,
+            config_from_file_={"LOG_DIR": log_dir, "REPORT_DIR": report_dir, "BACKLOG_CONCURRENCY": 2}
+        )
+
+    def tearDown(self) -> NoReturn:
+
+        """
+        Deletes temporary folders
+        """
+
+        self.temporary_folder.cleanup()
+
+    def test_backlog_reports(self):
+
+        """
+        Tests that reports are generated for unreported logs only, broken log doesn't stop others
+        """
+
+        unreported_logs = find_unreported_logs(cfg=self.config, log_file_pattern=LOG_FILE_PATTERN)
+
+        with self.subTest():
+            self.assertEqual(
+                [datetime.datetime(2019, 11, 4), datetime.datetime(2019, 11, 5)],
+                [log_file.date_of_creation for log_file in unreported_logs]
+            )
+
+        generate_backlog_reports(config=self.config, log_file_pattern=LOG_FILE_PATTERN)
+
+        with self.subTest():
+            # Not gzipped file with .gz extension can't be analyzed
+            self.assertFalse(os.path.exists(os.path.join(self.config.report_dir, "report-2019.11.04.html")))
+        with self.subTest():
+            self.assertTrue(os.path.exists(os.path.join(self.config.report_dir, "report-2019.11.05.html")))
+
+
+class TestGzipIndex(unittest.TestCase):
+
+    """
+    Class for testing seek points index of gzip logs
+    """
+
+    SAMPLE_LOG_PATH = "./nginx_logs/test_sample.txt"
+
+    def setUp(self) -> NoReturn:
+
+        """
+        Creates gzip log of several members cut in the middle of lines
+        """
+
+        self.temporary_folder = tempfile.TemporaryDirectory()
+        self.gzip_file_path = os.path.join(self.temporary_folder.name, "nginx-access-ui.log-20191105.gz")
+
+        with open(TestGzipIndex.SAMPLE_LOG_PATH, "rb") as sample_log:
+            self.sample_content = sample_log.read()
+        member_boundaries = [0, 1000, 50000, 50001, 120000, len(self.sample_content)]
+        with open(self.gzip_file_path, "wb") as gzip_file:
+            for member_start, member_end in zip(member_boundaries[:-1], member_boundaries[1:]):
+                gzip_file.write(gzip.compress(self.sample_content[member_start:member_end]))
+
+    def tearDown(self) -> NoReturn:
+
+        """
+        Deletes temporary folder
+        """
+
+        self.temporary_folder.cleanup()
+
+    def test_regions_cover_every_line_once(self):
+
+        """
+        Tests that lines read by regions are exactly the lines of decompressed log
+        """
+
+        gzip_index = load_or_build_gzip_index(gzip_file_path=self.gzip_file_path)
+        gzip_regions = split_gzip_index(gzip_index=gzip_index, num_regions=5)
+
+        region_lines = list()
+        for first_member, end_member in gzip_regions:
+            region_lines.extend(
+                read_gzip_region(
+                    gzip_file_path=self.gzip_file_path,
+                    gzip_index=gzip_index,
+                    first_member=first_member,
+                    end_member=end_member
+                )
+            )
+
+        with self.subTest():
+            self.assertEqual(5, len(gzip_index.members))
+        with self.subTest():
+            self.assertEqual(3, len(gzip_regions))
+        with self.subTest():
+            self.assertEqual(self.sample_content.splitlines(keepends=True), region_lines)
+        with self.subTest():
+            self.assertEqual(gzip_index, load_or_build_gzip_index(gzip_file_path=self.gzip_file_path))
+
+    def test_pipelined_decompression(self):
+
+        """
+        Tests that lines decompressed in separate thread are lines of decompressed log with line breaks
+        """
+
+        with gzip.open(self.gzip_file_path, "rb") as gzip_file:
+            self.assertEqual(list(gzip_file), list(read_gzip_lines_pipelined(gzip_file_path=self.gzip_file_path)))
+
+    def test_pipelined_decompression_of_truncated_member(self):
+
+        """
+        Tests that gzip log cut in the middle of member fails like with gzip.open instead of ending silently
+        """
+
+        with open(self.gzip_file_path, "rb+") as gzip_file:
+            gzip_file.truncate(os.path.getsize(self.gzip_file_path) - 100)
+
+        with self.subTest(reader="gzip.open"):
+            with self.assertRaises(EOFError):
+                with gzip.open(self.gzip_file_path, "rb") as gzip_file:
+                    list(gzip_file)
+        with self.subTest(reader="pipelined"):
+            with self.assertRaises(EOFError):
+                list(read_gzip_lines_pipelined(gzip_file_path=self.gzip_file_path))
+
+
+class TestReportRenderer(unittest.TestCase):
+
+    """
+    Class for testing streaming renderer of report
+    """
+
+    LOG_FILE = LatestLogFile(
+        path="./nginx_logs/test_sample.txt",
+        date_of_creation=datetime.date(year=2019, month=11, day=5),
+        extension=".txt"
+    )
+
+    def test_streamed_report_coincides_with_substituted_template(self):
+
+        """
+        Tests that report streamed from generator of rows is the same as template substituted with json
+        """
+
+        config = get_config_parameters(default_config=CONFIG, config_from_file_={"REPORT_SIZE": 100})
+        url_stats = calculate_url_stats(
+            parsed_line_gen=parse_log_file(log_file=TestReportRenderer.LOG_FILE, log_file_opener=open),
+            cfg=config
+        )
+
+        with open("./reports/report.html", "rt", encoding="utf-8") as report_template:
+            expected_report = Template(report_template.read()).safe_substitute(table_json=json.dumps(url_stats))
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            report_name = os.path.join(temporary_folder, "report-2019.11.05.html")
+            render_report(url_stats_for_json=iter(url_stats), cfg=config, report_name=report_name)
+            with open(report_name, "rt", encoding="utf-8") as report:
+                self.assertEqual(expected_report, report.read())
+
+    def test_chunked_report_data(self):
+
+        """
+        Tests that rows of report streamed into chunk files are the same as inlined ones
+        and that report describes chunks instead of rows
+        """
+
+        for compress in (False, True):
+            config = get_config_parameters(
+                default_config=CONFIG,
+                config_from_file_={"REPORT_SIZE": 100, "REPORT_CHUNK_SIZE": 30, "REPORT_CHUNK_GZIP": compress}
+            )
+            url_stats = calculate_url_stats(
+                parsed_line_gen=parse_log_file(log_file=TestReportRenderer.LOG_FILE, log_file_opener=open),
+                cfg=config
+            )
+            with tempfile.TemporaryDirectory() as temporary_folder:
+                report_name = os.path.join(temporary_folder, "report-2019.11.05.html")
+                render_report(url_stats_for_json=iter(url_stats), cfg=config, report_name=report_name)
+                with open(report_name, "rt", encoding="utf-8") as report:
+                    report_html = report.read()
+                chunks_name = os.path.join(temporary_folder, "report-2019.11.05.chunks")
+                chunk_names = sorted(os.listdir(chunks_name))
+                chunked_url_stats = list()
+                for chunk_name in chunk_names:
+                    chunk_opener = gzip.open if compress else open
+                    with chunk_opener(os.path.join(chunks_name, chunk_name), "rt") as chunk:
+                        chunked_url_stats.extend(json.load(chunk))
+            extension = ".json.gz" if compress else ".json"
+            with self.subTest(compress=compress):
+                self.assertEqual([f"{number:05d}{extension}" for number in range(4)], chunk_names)
+                self.assertEqual(url_stats, chunked_url_stats)
+                self.assertIn(
+                    json.dumps(
+                        {"chunks": "report-2019.11.05.chunks", "extension": extension, "rows": 100, "num_chunks": 4}
+                    ),
+                    report_html
+                )
+
+
+class TestUrlNormalizer(unittest.TestCase):
+
+    """
+    Class for testing normalization of high-cardinality urls
+    """
+
+    LOG_FILE = LatestLogFile(
+        path="./nginx_logs/test_sample.txt",
+        date_of_creation=datetime.date(year=2019, month=11, day=5),
+        extension=".txt"
+    )
+
+    def test_normalization_rules(self):
+
+        """
+        Tests that ids, uuids, hashes and query strings are collapsed by rules
+        """
+
+        normalizer = UrlNormalizer(
+            rules=UrlNormalizationRules(
+                query="keys",
+                numeric_ids=True,
+                uuids=True,
+                hashes=True,
+                rewrites=((r"^/export/[^/]+/", "/export/{name}/"),)
+            )
+        )
+
+        for raw_url, normalized_url in (
+                ("/api/v2/banner/25019354", "/api/v2/banner/{id}"),
+                ("/api/1/photogenic_banners/list/?server_name=WIN7RB4&id=5",
+                 "/api/{id}/photogenic_banners/list/?server_name={value}&id={value}"),
+                ("/api/v2/slot/4705/groups", "/api/v2/slot/{id}/groups"),
+                ("/agency/outstanding/7ab5b3e2-4f6a-4e6a-8d6b-0f4c2ad3c1e5/", "/agency/outstanding/{uuid}/"),
+                ("/static/3b81f63526fa8a91/app.js", "/static/{hash}/app.js"),
+                ("/export/appinstall_raw/2017-06-29/", "/export/{name}/2017-06-29/"),
+        ):
+            with self.subTest(url=raw_url):
+                self.assertEqual(normalized_url, normalizer.normalize(raw_url))
+
+    def test_normalized_report(self):
+
+        """
+        Tests that normalized urls are aggregated together
+        """
+
+        config = get_config_parameters(
+            default_config=CONFIG,
+            config_from_file_={"REPORT_SIZE": 5000, "URL_NORMALIZATION": {"QUERY": "strip", "NUMERIC_IDS": True}}
+        )
+        raw_config = config._replace(url_normalization=UrlNormalizationRules())
+
+        normalized_url_stats = calculate_url_stats(
+            parsed_line_gen=parse_log_file_by_config(log_file=TestUrlNormalizer.LOG_FILE, cfg=config),
+            cfg=config
+        )
+        raw_url_stats = calculate_url_stats(
+            parsed_line_gen=parse_log_file_by_config(log_file=TestUrlNormalizer.LOG_FILE, cfg=raw_config),
+            cfg=raw_config
+        )
+
+        with self.subTest():
+            self.assertLess(len(normalized_url_stats), len(raw_url_stats))
+        with self.subTest():
+            self.assertEqual(
+                sum(url_stat["count"] for url_stat in raw_url_stats),
+                sum(url_stat["count"] for url_stat in normalized_url_stats)
+            )
+        with self.subTest():
+            self.assertIn("/api/v2/banner/{id}", [url_stat["url"] for url_stat in normalized_url_stats])
+
+
+class TestSyntheticLogGenerator(unittest.TestCase):
+
+    """
+    Class for testing generator of synthetic logs for benchmarks
+    """
+
+    def test_generated_log_is_analyzable(self):
+
+        """
+        Tests that generated log has requested number of lines, urls and malformed lines share
+        and gzip log is written as several members
+        """
+
+        config = get_config_parameters(default_config=CONFIG, config_from_file_={"REPORT_SIZE": 1000})
+        settings = LogGeneratorSettings(num_lines=5000, num_urls=50, malformed_ratio=0.1)
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            for compress in (False, True):
+                log_name = write_log(
+                    output_dir=temporary_folder,
+                    settings=settings._replace(compress=compress, gzip_member_size=100 * 1024)
+                )
+                log_file = find_latest_log(log_dir=temporary_folder, log_file_pattern=LOG_FILE_PATTERN)
+                parsed_lines = list(parse_log_file_by_config(log_file=log_file, cfg=config))
+                num_failures = sum(is_failed for _, _, is_failed in parsed_lines)
+                with self.subTest(compress=compress):
+                    self.assertEqual(log_name, log_file.path)
+                    self.assertEqual(settings.num_lines, len(parsed_lines))
+                    self.assertEqual(settings.num_urls, len({url for url, _, _ in parsed_lines if url is not None}))
+                    self.assertAlmostEqual(settings.malformed_ratio, num_failures / len(parsed_lines), delta=0.02)
+                if compress:
+                    with self.subTest():
+                        self.assertGreater(len(load_or_build_gzip_index(gzip_file_path=log_name).members), 1)
+                os.remove(log_name)
+
+
+class TestBenchmarkRunner(unittest.TestCase):
+
+    """
+    Class for testing runner of analyzer benchmarks
+    """
+
+    def test_benchmark_results_for_configs(self):
+
+        """
+        Tests that benchmark counts lines, failed lines and urls of generated log with every parser output shape
+        and measures aggregation that normal run chooses for config
+        """
+
+        settings = LogGeneratorSettings(num_lines=1000, num_urls=20, malformed_ratio=0.1)
+        for config_from_file, mode in (
+                ({}, "in_memory"),
+                ({"TIME_BUCKETS": "minute"}, "in_memory"),
+                ({"HEAVY_HITTERS_CAPACITY": 100}, "heavy_hitters"),
+                ({"MEMORY_LIMIT": get_peak_rss() + SPILL_HEADROOM + 64 * 1024 * 1024}, "spilling")
+        ):
+            with tempfile.TemporaryDirectory() as temporary_folder:
+                shutil.copy("./reports/report.html", temporary_folder)
+                write_log(output_dir=temporary_folder, settings=settings)
+                config = get_config_parameters(
+                    default_config=CONFIG,
+                    config_from_file_=dict(config_from_file, LOG_DIR=temporary_folder, REPORT_DIR=temporary_folder)
+                )
+                results = run_benchmark(cfg=config)
+            with self.subTest(config=config_from_file):
+                self.assertEqual(settings.num_lines, results["lines"])
+                self.assertGreater(results["failed_lines"], 0)
+                self.assertEqual(settings.num_urls, results["unique_urls"])
+                self.assertIn("render_report", results["stage_times"])
+                self.assertEqual(mode, results["aggregation_mode"])
+
+
+class TestRunMetrics(unittest.TestCase):
+
+    """
+    Class for testing metrics of analyzer run saved next to report
+    """
+
+    def test_metrics_of_successful_and_failed_runs(self):
+
+        """
+        Tests that metrics file has stage times and counters of run and failed run is marked as failed
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            shutil.copy("./reports/report.html", temporary_folder)
+            log_name = write_log(
+                output_dir=temporary_folder,
+                settings=LogGeneratorSettings(num_lines=1000, num_urls=20, malformed_ratio=0.1)
+            )
+            log_file = find_latest_log(log_dir=temporary_folder, log_file_pattern=LOG_FILE_PATTERN)
+
+            for threshold, status in ((50.0, "ok"), (1.0, "failed")):
+                config = get_config_parameters(
+                    default_config=CONFIG,
+                    config_from_file_={"REPORT_DIR": temporary_folder, "FAILURES_PERCENT_THRESHOLD": threshold}
+                )
+                try:
+                    generate_report_for_log(config=config, log_file=log_file)
+                except FailuresPercentageError:
+                    pass
+                report_name = generate_report_name(cfg=config, log_file=log_file)
+                with open(generate_metrics_name(report_name=report_name), "rt", encoding="utf-8") as metrics_file:
+                    metrics = json.load(metrics_file)
+                os.remove(generate_metrics_name(report_name=report_name))
+                if os.path.exists(report_name):
+                    os.remove(report_name)
+
+                with self.subTest(status=status):
+                    self.assertEqual(status, metrics["status"])
+                    self.assertEqual(status == "ok", "render_report" in metrics["stage_times"])
+                    self.assertIn("calculate_url_stats", metrics["stage_times"])
+                    self.assertEqual(1000, metrics["counters"]["lines_read"])
+                    self.assertEqual(os.path.getsize(log_name), metrics["counters"]["bytes_read"])
+                    self.assertEqual(20, metrics["counters"]["unique_urls"])
+                    self.assertGreater(metrics["counters"]["failed_lines"], 0)
+
+
+class TestLogDirIndex(unittest.TestCase):
+
+    """
+    Class for testing persistent index of log directory
+    """
+
+    def test_index_lookups_and_refresh(self):
+
+        """
+        Tests that index finds the same logs as directory scan and notices new logs and reports
+        """
+
+        with tempfile.TemporaryDirectory() as log_dir, tempfile.TemporaryDirectory() as report_dir:
+            for file_name in (
+                    "nginx-access-ui.log-20170630.gz",
+                    "nginx-access-ui.log-20170701.log",
+                    "nginx-access-ui.log-20170702.txt",
+                    "nginx-access-ui.log-20170703.bz2",
+                    "report-2017.07.01.html"
+            ):
+                with open(os.path.join(log_dir, file_name), "w", encoding="utf-8"):
+                    pass
+            with open(os.path.join(report_dir, "report-2017.07.02.html"), "w", encoding="utf-8"):
+                pass
+            config = get_config_parameters(
+                default_config=CONFIG,
+                config_from_file_={"LOG_DIR": log_dir, "REPORT_DIR": report_dir, "LOG_DIR_INDEX": True}
+            )
+            scan_config = config._replace(log_dir_index=False)
+
+            with self.subTest():
+                self.assertEqual(
+                    find_latest_log(log_dir=log_dir, log_file_pattern=LOG_FILE_PATTERN),
+                    find_latest_log_by_config(cfg=config, log_file_pattern=LOG_FILE_PATTERN)
+                )
+            with self.subTest():
+                self.assertEqual(
+                    find_unreported_logs(cfg=scan_config, log_file_pattern=LOG_FILE_PATTERN),
+                    find_unreported_logs(cfg=config, log_file_pattern=LOG_FILE_PATTERN)
+                )
+
+            log_dir_index = open_indexed_log_dir(cfg=config, log_file_pattern=LOG_FILE_PATTERN)
+            with self.subTest():
+                self.assertEqual(
+                    ["nginx-access-ui.log-20170701.log", "nginx-access-ui.log-20170702.txt"],
+                    [
+                        log_file.name
+                        for log_file in log_dir_index.logs_between(
+                            first_date=datetime.date(year=2017, month=7, day=1),
+                            last_date=datetime.date(year=2017, month=7, day=3)
+                        )
+                    ]
+                )
+            with self.subTest():
+                self.assertEqual("nginx-access-ui.log-20170701.log", log_dir_index.latest_unreported_log().name)
+
+            with open(os.path.join(log_dir, "nginx-access-ui.log-20170704.gz"), "w", encoding="utf-8"):
+                pass
+            with open(os.path.join(report_dir, "report-2017.07.01.html"), "w", encoding="utf-8"):
+                pass
+            # Directories changed in the same second as the index was made are rescanned
+            log_dir_index = open_indexed_log_dir(cfg=config, log_file_pattern=LOG_FILE_PATTERN)
+            with self.subTest():
+                self.assertEqual("nginx-access-ui.log-20170704.gz", log_dir_index.latest_unreported_log().name)
+            with self.subTest():
+                self.assertEqual(
+                    ["nginx-access-ui.log-20170630.gz", "nginx-access-ui.log-20170704.gz"],
+                    [log_file.name for log_file in log_dir_index.unreported_logs()]
+                )
+
+            # Directories with old mtime are trusted, file added without changing mtime isn't noticed
+            old_time = os.stat(log_dir).st_mtime - 60
+            os.utime(log_dir, (old_time, old_time))
+            os.utime(report_dir, (old_time, old_time))
+            open_indexed_log_dir(cfg=config, log_file_pattern=LOG_FILE_PATTERN)
+            # Unchanged directories are not rescanned and sorted lists are loaded from index file as they are
+            with unittest.mock.patch.object(LogDirIndex, "_build_lookup") as build_lookup:
+                log_dir_index = open_indexed_log_dir(cfg=config, log_file_pattern=LOG_FILE_PATTERN)
+            with self.subTest():
+                build_lookup.assert_not_called()
+            with self.subTest():
+                self.assertEqual("nginx-access-ui.log-20170704.gz", log_dir_index.latest_unreported_log().name)
+            with self.subTest():
+                self.assertEqual(
+                    ["nginx-access-ui.log-20170630.gz", "nginx-access-ui.log-20170704.gz"],
+                    [log_file.name for log_file in log_dir_index.unreported_logs()]
+                )
+            with open(os.path.join(log_dir, "nginx-access-ui.log-20170705.gz"), "w", encoding="utf-8"):
+                pass
+            os.utime(log_dir, (old_time, old_time))
+            with self.subTest():
+                self.assertEqual(
+                    "nginx-access-ui.log-20170704.gz",
+                    os.path.basename(find_latest_log_by_config(cfg=config, log_file_pattern=LOG_FILE_PATTERN).path)
+                )
+
+
+class TestParsedLogCache(unittest.TestCase):
+
+    """
+    Class for testing columnar cache of parsed logs
+    """
+
+    LOG_FILE = LatestLogFile(
+        path="./nginx_logs/test_sample.txt",
+        date_of_creation=datetime.date(year=2019, month=11, day=5),
+        extension=".txt"
+    )
+
+    def test_cached_stats_coincide_with_parsed(self):
+
+        """
+        Tests that stats loaded from cache are the same as parsed ones for every quantile backend
+        and that cache is made of valid .npy files
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            for quantile_backend in ("exact", "hdr"):
+                config = get_config_parameters(
+                    default_config=CONFIG,
+                    config_from_file_={
+                        "PARSER": "format",
+                        "QUANTILE_BACKEND": quantile_backend,
+                        "REPORT_PERCENTILES": [90],
+                        "PARSED_CACHE_DIR": temporary_folder
+                    }
+                )
+                parsed_url_stats = build_url_stats(
+                    accumulator=accumulate_log_file(log_file=TestParsedLogCache.LOG_FILE, cfg=config),
+                    cfg=config
+                )
+                cache_name = generate_parsed_cache_name(cfg=config, log_file=TestParsedLogCache.LOG_FILE)
+                cached_url_stats = build_url_stats(
+                    accumulator=accumulate_log_file(log_file=TestParsedLogCache.LOG_FILE, cfg=config),
+                    cfg=config
+                )
+                with self.subTest(quantile_backend=quantile_backend):
+                    self.assertTrue(os.path.isdir(cache_name))
+                    self.assertEqual(parsed_url_stats, cached_url_stats)
+                    self.assertEqual(
+                        calculate_url_stats(
+                            parsed_line_gen=parse_log_file(log_file=TestParsedLogCache.LOG_FILE, log_file_opener=open),
+                            cfg=config
+                        ),
+                        cached_url_stats
+                    )
+
+            with open(os.path.join(cache_name, "request_times.npy"), "rb") as npy_file:
+                npy_data = npy_file.read()
+            header_size = int.from_bytes(npy_data[8:10], "little")
+            with self.subTest():
+                self.assertEqual(b"\x93NUMPY\x01\x00", npy_data[:8])
+            with self.subTest():
+                self.assertEqual(0, (10 + header_size) % 64)
+            with self.subTest():
+                self.assertEqual(
+                    ["0.390", "0.133"],
+                    [f"{request_time:.3f}" for request_time in memoryview(npy_data[10 + header_size:]).cast("d")[:2]]
+                )
+
+
+class TestLiveTail(unittest.TestCase):
+
+    """
+    Class for testing live mode following active log
+    """
+
+    LOG_FILE_PATH = "./nginx_logs/test_sample.txt"
+
+    def test_follower_handles_rotation(self):
+
+        """
+        Tests that follower reads only complete appended lines and reads rotated log to the end
+        """
+
+        with open(TestLiveTail.LOG_FILE_PATH, "rb") as log_file:
+            log_lines = log_file.readlines()[:6]
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            log_file_path = os.path.join(temporary_folder, "access.log")
+            with open(log_file_path, "wb") as log_file:
+                log_file.write(log_lines[0])
+            follower = LogFollower(log_file_path=log_file_path)
+
+            polled_lines = list(follower.poll())
+            with open(log_file_path, "ab") as log_file:
+                log_file.write(log_lines[1] + log_lines[2][:10])
+            polled_lines += list(follower.poll())
+            with open(log_file_path, "ab") as log_file:
+                log_file.write(log_lines[2][10:] + log_lines[3])
+            os.rename(log_file_path, f"{log_file_path}.1")
+            polled_lines += list(follower.poll())
+            with open(log_file_path, "wb") as log_file:
+                log_file.write(log_lines[4] + log_lines[5])
+            polled_lines += list(follower.poll())
+            follower.close()
+
+        self.assertEqual(log_lines[1:], polled_lines)
+
+    def test_sliding_windows_snapshots(self):
+
+        """
+        Tests that windows contain lines of their last seconds and old buckets are dropped
+        """
+
+        with open(TestLiveTail.LOG_FILE_PATH, "rb") as log_file:
+            log_lines = log_file.readlines()[:60]
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            shutil.copy("./reports/report.html", os.path.join(temporary_folder, "report.html"))
+            log_file_path = os.path.join(temporary_folder, "access.log")
+            open(log_file_path, "wb").close()
+            config = get_config_parameters(
+                default_config=CONFIG,
+                config_from_file_={
+                    "REPORT_DIR": temporary_folder,
+                    "LIVE_WINDOWS": [20, 60],
+                    "LIVE_BUCKET_SECONDS": 10,
+                    "LIVE_SNAPSHOT_INTERVAL": 10,
+                    "LIVE_POLL_INTERVAL": 10
+                }
+            )
+            clock = [1000.0]
+
+            def write_lines_and_tick(_: float) -> NoReturn:
+                with open(log_file_path, "ab") as log_file:
+                    log_file.writelines(log_lines[:10])
+                del log_lines[:10]
+                clock[0] += 10
+
+            follow_log(
+                config=config,
+                log_file_path=log_file_path,
+                max_snapshots=5,
+                clock=lambda: clock[0],
+                sleep=write_lines_and_tick
+            )
+            with open(os.path.join(temporary_folder, "live.json"), "rt", encoding="utf-8") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+            reports = sorted(file_name for file_name in os.listdir(temporary_folder) if file_name.startswith("report-"))
+
+        with self.subTest():
+            self.assertEqual(["report-live-1m.html", "report-live-20s.html"], reports)
+        with self.subTest():
+            self.assertEqual(
+                [("20s", 20), ("1m", 50)],
+                [(window["window"], window["requests"]) for window in snapshot["windows"]]
+            )
+        with self.subTest():
+            self.assertEqual(
+                20,
+                sum(url_stat["count"] for url_stat in snapshot["windows"][0]["url_stats"])
+            )
+
+
+class TestTimeBuckets(unittest.TestCase):
+
+    """
+    Class for testing url time series parsed from $time_local
+    """
+
+    LOG_LINE_TEMPLATE = Template(
+        '1.196.116.32 -  - [$time_local +0300] "GET $url HTTP/1.1" 200 927 "-" "Lynx/2.8.8dev.9" "-" '
+        '"1498697422-2190034393-4708-9752759" "dc7161be3" $request_time\n'
+    )
+
+    def test_time_local_parser(self):
+
+        """
+        Tests that cached prefix parser coincides with strptime across date change
+        """
+
+        time_parser = TimeLocalParser(bucket_seconds=60)
+        for time_local in ("30/Jun/2017:23:59:59", "01/Jul/2017:00:00:01", "01/Jul/2017:13:07:00"):
+            with self.subTest(time_local=time_local):
+                self.assertEqual(
+                    int(datetime.datetime.strptime(time_local, "%d/%b/%Y:%H:%M:%S").replace(
+                        tzinfo=datetime.timezone.utc
+                    ).timestamp()) // 60,
+                    time_parser.bucket(time_local.encode())
+                )
+        with self.subTest():
+            with self.assertRaises(ValueError):
+                time_parser.bucket(b"01/Jux/2017:13:07:00")
+
+    def test_url_time_series(self):
+
+        """
+        Tests that time series of url sum up to its totals with both parsers and with workers
+        and that line with outlier $time_local adds only one bucket to series
+        """
+
+        log_lines = [
+            TestTimeBuckets.LOG_LINE_TEMPLATE.substitute(time_local=time_local, url=url, request_time=request_time)
+            for time_local, url, request_time in (
+                ("29/Jun/2017:03:50:22", "/api/1", "0.100"),
+                ("29/Jun/2017:03:50:40", "/api/1", "0.300"),
+                ("29/Jun/2017:03:52:01", "/api/1", "2.000"),
+                ("29/Jun/2017:03:52:02", "/api/2", "0.500"),
+                ("29/Jun/2017:03:52:02", "/api/1", "0.200"),
+                ("29/Jun/2027:03:52:02", "/api/2", "0.100"),
+            )
+        ]
+        log_lines.append("broken line\n")
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            log_file = LatestLogFile(
+                path=os.path.join(temporary_folder, "nginx-access-ui.log-20170629.txt"),
+                date_of_creation=datetime.date(year=2017, month=6, day=29),
+                extension=".txt"
+            )
+            with open(log_file.path, "wt", encoding="utf-8") as log:
+                log.writelines(log_lines)
+
+            for config_from_file in ({"PARSER": "split"}, {"PARSER": "format", "WORKERS": 2}):
+                config = get_config_parameters(
+                    default_config=CONFIG,
+                    config_from_file_=dict(config_from_file, TIME_BUCKETS="minute")
+                )
+                accumulator = accumulate_log_file(log_file=log_file, cfg=config)
+                url_stats = build_url_stats(accumulator=accumulator, cfg=config)
+                with self.subTest(**config_from_file):
+                    self.assertEqual(1, accumulator.num_failures)
+                    self.assertEqual(
+                        {
+                            "start": int(
+                                datetime.datetime(2017, 6, 29, 3, 50, tzinfo=datetime.timezone.utc).timestamp()
+                            ),
+                            "step": 60,
+                            "offset": [0, 2],
+                            "count": [2, 2],
+                            "time_sum": [0.4, 2.2],
+                            "time_med": [0.2, 1.1]
+                        },
+                        url_stats[0]["time_series"]
+                    )
+                    self.assertEqual(
+                        [0, (datetime.date(2027, 6, 29) - datetime.date(2017, 6, 29)).days * 24 * 60],
+                        url_stats[1]["time_series"]["offset"]
+                    )
+                    self.assertEqual(["/api/1", "/api/2"], [url_stat["url"] for url_stat in url_stats])
+
+
+@unittest.skipUnless(is_numpy_available(), "NumPy isn't installed")
+class TestNumpyAggregationBackend(unittest.TestCase):
+
+    """
+    Class for testing vectorized aggregation backend
+    """
+
+    LOG_FILE = LatestLogFile(
+        path="./nginx_logs/test_sample.txt",
+        date_of_creation=datetime.date(year=2019, month=11, day=5),
+        extension=".txt"
+    )
+
+    def test_numpy_stats_coincide_with_python(self):
+
+        """
+        Tests that url stats of numpy backend are the same as pure Python ones,
+        including order of urls with equal total request time
+        """
+
+        for report_size in (1, 10, 100, 10000):
+            python_config, numpy_config = (
+                get_config_parameters(
+                    default_config=CONFIG,
+                    config_from_file_={
+                        "REPORT_SIZE": report_size,
+                        "REPORT_PERCENTILES": [25, 50, 90, 99],
+                        "AGGREGATION_BACKEND": aggregation_backend
+                    }
+                )
+                for aggregation_backend in ("python", "numpy")
+            )
+            accumulator = UrlStatsAccumulator()
+            accumulator.consume(
+                parsed_line_gen=parse_log_file(log_file=TestNumpyAggregationBackend.LOG_FILE, log_file_opener=open)
+            )
+            accumulator.consume(parsed_line_gen=[(f"/tie/{number}", 0.0005, False) for number in range(20)])
+            with self.subTest(report_size=report_size):
+                self.assertEqual(
+                    build_url_stats(accumulator=accumulator, cfg=python_config),
+                    build_url_stats(accumulator=accumulator, cfg=numpy_config)
+                )
+
+
+class TestLogSampling(unittest.TestCase):
+
+    """
+    Class for testing approximate reports of sampled log blocks
+    """
+
+    def test_sampled_stats(self):
+
+        """
+        Tests that sampling of every block gives exact stats with collapsed confidence intervals
+        and that sampled stats of a part of blocks are scaled up to the whole log
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            write_log(output_dir=temporary_folder, settings=LogGeneratorSettings(num_lines=20000, num_urls=20))
+            log_file = find_latest_log(log_dir=temporary_folder, log_file_pattern=LOG_FILE_PATTERN)
+            config = get_config_parameters(default_config=CONFIG, config_from_file_={"REPORT_SIZE": 5})
+            full_url_stats = build_url_stats(accumulator=accumulate_log_file(log_file=log_file, cfg=config), cfg=config)
+
+            for sample_rate in (1, 0.3):
+                sample_config = config._replace(sample_rate=sample_rate, sample_block_size=16 * 1024, sample_seed=1)
+                sample = accumulate_log_sample(log_file=log_file, cfg=sample_config)
+                sampled_url_stats = list(iter_sampled_url_stats(sample=sample, cfg=sample_config))
+                with self.subTest(sample_rate=sample_rate):
+                    self.assertEqual(round(sample.ranges.num_blocks * sample_rate), len(sample.ranges.ranges))
+                    self.assertEqual(len(full_url_stats), len(sampled_url_stats))
+                for full_url_stat, sampled_url_stat in zip(full_url_stats, sampled_url_stats):
+                    count_perc_low, count_perc_high = sampled_url_stat.pop("count_perc_ci")
+                    time_perc_low, time_perc_high = sampled_url_stat.pop("time_perc_ci")
+                    with self.subTest(sample_rate=sample_rate, url=full_url_stat["url"]):
+                        if sample_rate == 1:
+                            self.assertEqual(full_url_stat, sampled_url_stat)
+                            self.assertEqual(count_perc_low, count_perc_high)
+                        else:
+                            self.assertAlmostEqual(full_url_stat["count"], sampled_url_stat["count"], delta=500)
+                            self.assertLessEqual(count_perc_low, sampled_url_stat["count_perc"])
+                            self.assertGreaterEqual(count_perc_high, sampled_url_stat["count_perc"])
+                            self.assertLessEqual(time_perc_low, sampled_url_stat["time_perc"])
+                            self.assertGreaterEqual(time_perc_high, sampled_url_stat["time_perc"])
+
+    def test_early_abort_by_failures_percentage(self):
+
+        """
+        Tests that sampling stops as soon as failures percentage surely exceeds threshold
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            write_log(output_dir=temporary_folder, settings=LogGeneratorSettings(num_lines=20000, malformed_ratio=0.8))
+            log_file = find_latest_log(log_dir=temporary_folder, log_file_pattern=LOG_FILE_PATTERN)
+            config = get_config_parameters(
+                default_config=CONFIG,
+                config_from_file_={"SAMPLE_RATE": 1, "SAMPLE_BLOCK_SIZE": 16 * 1024}
+            )
+            consumed_ranges = list()
+            with unittest.mock.patch("log_analyzer.read_log_file_range", wraps=read_log_file_range) as reader:
+                with self.assertRaises(FailuresPercentageError):
+                    accumulate_log_sample(log_file=log_file, cfg=config)
+                consumed_ranges.extend(reader.call_args_list)
+
+        self.assertEqual(MIN_BLOCKS_TO_ABORT, len(consumed_ranges))
+
+
+class TestPartialAggregates(unittest.TestCase):
+
+    """
+    Class for testing map/reduce of url stats of logs of several hosts
+    """
+
+    def test_map_reduce(self):
+
+        """
+        Tests that merged partial aggregates of several logs give the same stats as accumulators of logs merged
+        in one process, that merge order doesn't matter and that report is rendered of merged aggregates
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            report_dir = os.path.join(temporary_folder, "reports")
+            os.makedirs(report_dir)
+            shutil.copy("./reports/report.html", report_dir)
+            partial_aggregate_names = list()
+            expected_accumulator = UrlStatsAccumulator(quantile_backend="hdr")
+            for host in range(3):
+                log_dir = os.path.join(temporary_folder, f"host{host}")
+                write_log(output_dir=log_dir, settings=LogGeneratorSettings(num_lines=3000, num_urls=50, seed=host))
+                config = get_config_parameters(
+                    default_config=CONFIG,
+                    config_from_file_={"LOG_DIR": log_dir, "REPORT_DIR": report_dir, "REPORT_SIZE": 20}
+                )
+                partial_aggregate_names.append(
+                    generate_partial_aggregate(
+                        config=config,
+                        log_file_pattern=LOG_FILE_PATTERN,
+                        partial_aggregate_name=os.path.join(temporary_folder, f"partial{host}.json.gz")
+                    )
+                )
+                expected_accumulator.merge(
+                    accumulate_log_file(
+                        log_file=find_latest_log(log_dir=log_dir, log_file_pattern=LOG_FILE_PATTERN),
+                        cfg=config._replace(quantile_backend="hdr")
+                    )
+                )
+
+            first, second, third = (
+                load_partial_aggregate(partial_aggregate_name=partial_aggregate_name)
+                for partial_aggregate_name in partial_aggregate_names
+            )
+            left = merge_partial_aggregates([merge_partial_aggregates([first, second]), third])
+            right = merge_partial_aggregates([first, merge_partial_aggregates([second, third])])
+            report_config = config._replace(quantile_backend="hdr")
+            self.assertEqual(
+                build_url_stats(accumulator=expected_accumulator, cfg=report_config),
+                build_url_stats(accumulator=accumulate_partial_aggregate(partial_aggregate=left), cfg=report_config)
+            )
+            self.assertEqual(
+                build_url_stats(accumulator=accumulate_partial_aggregate(partial_aggregate=left), cfg=report_config),
+                build_url_stats(accumulator=accumulate_partial_aggregate(partial_aggregate=right), cfg=report_config)
+            )
+            self.assertEqual(3, len(left.sources))
+            self.assertEqual(["2017-06-30"], left.log_dates)
+
+            merged_partial_aggregate_name = os.path.join(temporary_folder, "merged.json.gz")
+            reduce_partial_aggregates(
+                config=config,
+                partial_aggregate_names=partial_aggregate_names[:2],
+                merged_partial_aggregate_name=merged_partial_aggregate_name
+            )
+            reduce_partial_aggregates(
+                config=config,
+                partial_aggregate_names=[merged_partial_aggregate_name, partial_aggregate_names[2]]
+            )
+            self.assertTrue(os.path.isfile(os.path.join(report_dir, "report-2017.06.30.html")))
+
+    def test_incompatible_partial_aggregates(self):
+
+        """
+        Tests that partial aggregates of unsupported version or with different settings aren't merged
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            write_log(output_dir=temporary_folder, settings=LogGeneratorSettings(num_lines=100, num_urls=5))
+            config = get_config_parameters(
+                default_config=CONFIG,
+                config_from_file_={"LOG_DIR": temporary_folder, "REPORT_DIR": temporary_folder}
+            )
+            partial_aggregate_name = generate_partial_aggregate(config=config, log_file_pattern=LOG_FILE_PATTERN)
+            partial_aggregate = load_partial_aggregate(partial_aggregate_name=partial_aggregate_name)
+            self.assertEqual(100, partial_aggregate.num_requests + partial_aggregate.num_failures)
+
+            with self.assertRaises(PartialAggregateError):
+                merge_partial_aggregates([partial_aggregate, partial_aggregate._replace(settings=dict())])
+
+            with gzip.open(partial_aggregate_name, "rt", encoding="utf-8") as partial_aggregate_file:
+                raw_partial_aggregate = json.load(partial_aggregate_file)
+            raw_partial_aggregate["version"] += 1
+            with gzip.open(partial_aggregate_name, "wt", encoding="utf-8") as partial_aggregate_file:
+                json.dump(raw_partial_aggregate, partial_aggregate_file)
+            with self.assertRaises(PartialAggregateError):
+                load_partial_aggregate(partial_aggregate_name=partial_aggregate_name)
+
+
+class TestWarehouse(unittest.TestCase):
+
+    """
+    Class for testing daily url aggregates saved to SQLite warehouse
+    """
+
+    def test_cross_day_queries(self):
+
+        """
+        Tests that trend and top queries over date range give the same stats as daily reports
+        and that aggregates of day are replaced when its report is generated again
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            log_dir = os.path.join(temporary_folder, "logs")
+            report_dir = os.path.join(temporary_folder, "reports")
+            os.makedirs(report_dir)
+            shutil.copy("./reports/report.html", report_dir)
+            for day in range(1, 4):
+                write_log(
+                    output_dir=log_dir,
+                    settings=LogGeneratorSettings(
+                        num_lines=2000,
+                        num_urls=30,
+                        date=datetime.date(2017, 6, day),
+                        seed=day
+                    )
+                )
+            warehouse_name = os.path.join(temporary_folder, "warehouse.sqlite")
+            config = get_config_parameters(
+                default_config=CONFIG,
+                config_from_file_={
+                    "LOG_DIR": log_dir,
+                    "REPORT_DIR": report_dir,
+                    "REPORT_SIZE": 5,
+                    "BACKLOG_CONCURRENCY": 2,
+                    "WAREHOUSE_DB": warehouse_name,
+                    # Synthetic urls differ from day to day, their templates are the same
+                    "URL_NORMALIZATION": {
+                        "QUERY": "strip",
+                        "NUMERIC_IDS": True,
+                        "REWRITES": [["^/export/[^/]+/", "/export/{name}/"]]
+                    }
+                }
+            )
+            generate_backlog_reports(config=config, log_file_pattern=LOG_FILE_PATTERN)
+
+            url_stats_by_date = dict()
+            for log_file in find_unreported_logs(cfg=config._replace(report_dir=temporary_folder),
+                                                 log_file_pattern=LOG_FILE_PATTERN):
+                accumulator = accumulate_log_file(log_file=log_file, cfg=config)
+                url_stats_by_date[log_file.date_of_creation.strftime("%Y-%m-%d")] = (
+                    accumulator,
+                    {url_stat["url"]: url_stat for url_stat in build_url_stats(accumulator=accumulator, cfg=config)}
+                )
+            top_url = next(iter(url_stats_by_date["2017-06-02"][1]))
+
+            connection = open_warehouse(warehouse_name=warehouse_name)
+            try:
+                trend = query_trend(connection=connection, url=top_url, date_from="2017-06-02", date_to="2017-06-03")
+                top = query_top(connection=connection, date_from="2017-06-01", date_to="2017-06-03", size=3)
+                generate_report_for_log(config=config._replace(incremental=True), log_file=log_file)
+                num_rows = connection.execute("SELECT COUNT(*) FROM url_days").fetchone()[0]
+            finally:
+                connection.close()
+
+        self.assertEqual(["2017-06-02", "2017-06-03"], [row["log_date"] for row in trend])
+        for row in trend:
+            accumulator, url_stats = url_stats_by_date[row["log_date"]]
+            url_stat = url_stats.get(top_url)
+            with self.subTest(log_date=row["log_date"]):
+                self.assertEqual(accumulator.counts[accumulator.slot_by_url[top_url]], row["count"])
+                if url_stat is not None:
+                    self.assertEqual(
+                        {column: url_stat[column] for column in row if column != "log_date"},
+                        {column: value for column, value in row.items() if column != "log_date"}
+                    )
+
+        expected_time_sums = dict()
+        for accumulator, _ in url_stats_by_date.values():
+            for slot, url in enumerate(accumulator.urls):
+                expected_time_sums[url] = expected_time_sums.get(url, 0) + accumulator.time_sums[slot]
+        expected_top = sorted(expected_time_sums, key=expected_time_sums.get, reverse=True)[:3]
+        self.assertEqual(expected_top, [row["url"] for row in top])
+        for row in top:
+            self.assertEqual(3, row["days"])
+            self.assertAlmostEqual(expected_time_sums[row["url"]], row["time_sum"], places=2)
+        self.assertEqual(
+            sum(len(accumulator.urls) for accumulator, _ in url_stats_by_date.values()),
+            num_rows
+        )
+
+
+class TestHeavyHitters(unittest.TestCase):
+
+    """
+    Class for testing bounded memory mode with heavy hitters summary and distinct count estimators
+    """
+
+    def test_hyper_log_log(self):
+
+        """
+        Tests that distinct counts are estimated within a few standard errors
+        """
+
+        for num_values, precision in ((50, 10), (20000, 10), (200000, 14)):
+            estimator = HyperLogLog(precision=precision)
+            for value in range(num_values):
+                estimator.add(f"10.0.{value // 256}.{value % 256}")
+                estimator.add(f"10.0.{value // 256}.{value % 256}")
+            with self.subTest(num_values=num_values, precision=precision):
+                standard_error = 1.04 / 2 ** (precision / 2)
+                self.assertAlmostEqual(num_values, estimator.estimate(), delta=4 * standard_error * num_values)
+
+    def test_heavy_hitter_url_stats(self):
+
+        """
+        Tests that heavy hitters report rows bound exact url stats with their errors
+        and that every url with total request time above error bound is tracked
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            write_log(output_dir=temporary_folder, settings=LogGeneratorSettings(num_lines=30000, num_urls=5000))
+            log_file = find_latest_log(log_dir=temporary_folder, log_file_pattern=LOG_FILE_PATTERN)
+            for parser in ("split", "format"):
+                config = get_config_parameters(
+                    default_config=CONFIG,
+                    config_from_file_={"REPORT_SIZE": 10, "PARSER": parser, "HEAVY_HITTERS_CAPACITY": 300}
+                )
+                exact_accumulator = accumulate_log_file(
+                    log_file=log_file,
+                    cfg=config._replace(heavy_hitters_capacity=None)
+                )
+                clients_by_url = dict()
+                with open(log_file.path, "rt", encoding="utf-8") as log:
+                    for line_ in log:
+                        words = line_.split()
+                        if len(words) > 6:
+                            clients_by_url.setdefault(words[6], set()).add(words[0])
+
+                heavy_hitters = accumulate_heavy_hitters(log_file=log_file, cfg=config)
+                url_stats = list(iter_heavy_hitter_url_stats(heavy_hitters=heavy_hitters, cfg=config))
+
+                with self.subTest(parser=parser):
+                    self.assertEqual(exact_accumulator.num_requests, heavy_hitters.num_requests)
+                    self.assertEqual(300, len(heavy_hitters.urls))
+                    self.assertAlmostEqual(
+                        len(exact_accumulator.urls),
+                        heavy_hitters.distinct_urls.estimate(),
+                        delta=150
+                    )
+                    max_time_error = heavy_hitters.max_time_error()
+                    tracked_urls = {heavy_hitters.url(slot=slot) for slot in range(len(heavy_hitters.urls))}
+                    for slot in range(len(exact_accumulator.urls)):
+                        if exact_accumulator.time_sums[slot] > max_time_error:
+                            self.assertIn(exact_accumulator.url(slot=slot), tracked_urls)
+
+                for url_stat in url_stats:
+                    slot = exact_accumulator.slot_by_url.get(url_stat["url"])
+                    if slot is None:
+                        slot = exact_accumulator.slot_by_url[url_stat["url"].encode()]
+                    with self.subTest(parser=parser, url=url_stat["url"]):
+                        self.assertLessEqual(url_stat["time_sum_error"], round(max_time_error, 3))
+                        self.assertLessEqual(
+                            url_stat["count"] - url_stat["count_error"],
+                            exact_accumulator.counts[slot]
+                        )
+                        self.assertGreaterEqual(url_stat["count"], exact_accumulator.counts[slot])
+                        self.assertLessEqual(
+                            url_stat["time_sum"] - url_stat["time_sum_error"],
+                            round(exact_accumulator.time_sums[slot], 3) + 0.002
+                        )
+                        self.assertGreaterEqual(
+                            url_stat["time_sum"],
+                            round(exact_accumulator.time_sums[slot], 3) - 0.002
+                        )
+                        if not url_stat["count_error"]:
+                            self.assertAlmostEqual(
+                                len(clients_by_url[url_stat["url"]]),
+                                url_stat["clients"],
+                                delta=0.15 * len(clients_by_url[url_stat["url"]]) + 2
+                            )
+
+    def test_other_modes_ignore_heavy_hitters_capacity(self):
+
+        """
+        Tests that live tail, partial aggregates and sampling parse lines without client addresses
+        and give the same stats when heavy hitters capacity is configured
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            write_log(output_dir=temporary_folder, settings=LogGeneratorSettings(num_lines=3000, num_urls=20))
+            log_file = find_latest_log(log_dir=temporary_folder, log_file_pattern=LOG_FILE_PATTERN)
+            shutil.copy("./reports/report.html", os.path.join(temporary_folder, "report.html"))
+            config = get_config_parameters(
+                default_config=CONFIG,
+                config_from_file_={"LOG_DIR": temporary_folder, "REPORT_DIR": temporary_folder, "REPORT_SIZE": 5}
+            )
+            with open(log_file.path, "rb") as log:
+                first_log_lines = log.readlines()[:30]
+            results_by_mode = dict()
+
+            for cfg in (config, config._replace(heavy_hitters_capacity=100)):
+                sample_config = cfg._replace(sample_rate=1, sample_block_size=16 * 1024, sample_seed=1)
+                results_by_mode.setdefault("sample", list()).append(
+                    list(iter_sampled_url_stats(
+                        sample=accumulate_log_sample(log_file=log_file, cfg=sample_config),
+                        cfg=sample_config
+                    ))
+                )
+
+                partial_aggregate = load_partial_aggregate(
+                    partial_aggregate_name=generate_partial_aggregate(
+                        config=cfg,
+                        log_file_pattern=LOG_FILE_PATTERN,
+                        partial_aggregate_name=os.path.join(temporary_folder, "partial.json.gz")
+                    )
+                )
+                results_by_mode.setdefault("map", list()).append(
+                    (partial_aggregate.num_requests, partial_aggregate.num_failures, partial_aggregate.counts)
+                )
+
+                live_log_file_path = os.path.join(temporary_folder, "access.log")
+                open(live_log_file_path, "wb").close()
+                log_lines = list(first_log_lines)
+                clock = [1000.0]
+
+                def write_lines_and_tick(_: float) -> NoReturn:
+                    with open(live_log_file_path, "ab") as live_log:
+                        live_log.writelines(log_lines[:10])
+                    del log_lines[:10]
+                    clock[0] += 10
+
+                follow_log(
+                    config=cfg._replace(
+                        live_windows=(60,),
+                        live_bucket_seconds=10,
+                        live_snapshot_interval=10,
+                        live_poll_interval=10
+                    ),
+                    log_file_path=live_log_file_path,
+                    max_snapshots=3,
+                    clock=lambda: clock[0],
+                    sleep=write_lines_and_tick
+                )
+                with open(os.path.join(temporary_folder, "live.json"), "rt", encoding="utf-8") as snapshot_file:
+                    results_by_mode.setdefault("follow", list()).append(json.load(snapshot_file)["windows"])
+
+        for mode, (exact_result, heavy_hitters_capacity_result) in results_by_mode.items():
+            with self.subTest(mode=mode):
+                self.assertEqual(exact_result, heavy_hitters_capacity_result)
+        with self.subTest(mode="follow"):
+            self.assertEqual(30, results_by_mode["follow"][1][0]["requests"])
+
+
+class TestSpillingAggregation(unittest.TestCase):
+
+    """
+    Class for testing exact url stats calculated in memory budget with sorted runs spilled to disk
+    """
+
+    def test_spilled_url_stats(self):
+
+        """
+        Tests that report rows calculated with many spilled runs merged in several passes
+        are the same as ones calculated in memory
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            write_log(output_dir=temporary_folder, settings=LogGeneratorSettings(num_lines=20000, num_urls=300))
+            log_file = find_latest_log(log_dir=temporary_folder, log_file_pattern=LOG_FILE_PATTERN)
+            for parser in ("split", "format"):
+                config = get_config_parameters(
+                    default_config=CONFIG,
+                    config_from_file_={"REPORT_SIZE": 50, "PARSER": parser, "REPORT_PERCENTILES": [90, 99]}
+                )
+                expected_url_stats = build_url_stats(accumulator=accumulate_log_file(log_file=log_file, cfg=config),
+                                                     cfg=config)
+                # Budget of about 250 records makes 80 runs, they are merged in two passes of 64 runs at most
+                spilling_config = config._replace(
+                    memory_limit=get_peak_rss() + SPILL_HEADROOM + 2 * 250 * (RUN_RECORD_OVERHEAD + 80),
+                    spill_dir=temporary_folder
+                )
+                with unittest.mock.patch("external_sort.write_run", wraps=write_run) as run_writer:
+                    spilled_url_stats = accumulate_with_spilling(log_file=log_file, cfg=spilling_config)
+                url_stats = list(iter_spilled_url_stats(spilled_url_stats=spilled_url_stats, cfg=spilling_config))
+
+                with self.subTest(parser=parser):
+                    self.assertGreater(run_writer.call_count, MAX_MERGE_RUNS)
+                    self.assertEqual(expected_url_stats, url_stats)
+                    self.assertEqual(300, spilled_url_stats.num_urls)
+                    self.assertEqual([log_file.path], glob.glob(os.path.join(temporary_folder, "*")))
+
+    def test_hot_url_request_times_are_spilled(self):
+
+        """
+        Tests that request times of url with more lines than memory budget holds are spilled as sorted runs
+        and its quantiles are the same as ones calculated in memory
+        """
+
+        with tempfile.TemporaryDirectory() as temporary_folder:
+            write_log(output_dir=temporary_folder, settings=LogGeneratorSettings(num_lines=20000, num_urls=3))
+            log_file = find_latest_log(log_dir=temporary_folder, log_file_pattern=LOG_FILE_PATTERN)
+            config = get_config_parameters(
+                default_config=CONFIG,
+                config_from_file_={"REPORT_SIZE": 3, "REPORT_PERCENTILES": [90, 99]}
+            )
+            expected_url_stats = build_url_stats(accumulator=accumulate_log_file(log_file=log_file, cfg=config),
+                                                 cfg=config)
+            # Budget of about 250 records holds request times of about 1350 lines of url
+            spilling_config = config._replace(
+                memory_limit=get_peak_rss() + SPILL_HEADROOM + 2 * 250 * (RUN_RECORD_OVERHEAD + 80),
+                spill_dir=temporary_folder
+            )
+            with unittest.mock.patch("external_sort.write_duration_run", wraps=write_duration_run) as run_writer:
+                spilled_url_stats = accumulate_with_spilling(log_file=log_file, cfg=spilling_config)
+            url_stats = list(iter_spilled_url_stats(spilled_url_stats=spilled_url_stats, cfg=spilling_config))
+
+            with self.subTest():
+                self.assertGreater(max(url_stat["count"] for url_stat in url_stats), 5 * 1350)
+            with self.subTest():
+                self.assertGreater(run_writer.call_count, 5)
+            with self.subTest():
+                self.assertEqual(expected_url_stats, url_stats)
+            with self.subTest():
+                self.assertEqual([log_file.path], glob.glob(os.path.join(temporary_folder, "*")))
@@ -0,0 +1,132 @@
+import datetime
+from typing import Dict, List, Optional, Union
+
+TIME_BUCKET_SECONDS = {
+    "minute": 60,
+    "hour": 3600,
+}
+
+MONTHS = {
+    "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
+    "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12,
+}
+
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+SECONDS_PER_DAY = 24 * 60 * 60
+# Length of $time_local without time zone: 29/Jun/2017:03:50:22
+TIME_LOCAL_LENGTH = 20
+
+
+class TimeLocalParser:
+
+    """
+    Parses $time_local of nginx log into time bucket. Lines of log come in time order,
+    so date part of timestamp is parsed only when it differs from date of previous line,
+    and only hours, minutes and seconds are parsed for other lines. Time zone is ignored:
+    buckets are counted in local time of log, as it is written to log file
+    """
+
+    __slots__ = ("bucket_seconds", "cached_date", "cached_day_seconds")
+
+    def __init__(self, bucket_seconds: int):
+        self.bucket_seconds = bucket_seconds
+        self.cached_date: Union[str, bytes, None] = None
+        self.cached_day_seconds = 0
+
+    @staticmethod
+    def parse_date(date: Union[str, bytes]) -> int:
+
+        """
+        Parses date part of $time_local
+        :param date: date like 29/Jun/2017
+        :return: seconds from epoch to the beginning of date
+        """
+
+        if isinstance(date, bytes):
+            date = date.decode("ascii")
+        day, month, year = date.split("/")
+
+        return (datetime.date(int(year), MONTHS[month], int(day)).toordinal() - EPOCH_ORDINAL) * SECONDS_PER_DAY
+
+    def bucket(self, time_local: Union[str, bytes]) -> int:
+
+        """
+        Finds time bucket of timestamp
+        :param time_local: $time_local without brackets and time zone, e.g. 29/Jun/2017:03:50:22
+        :return: number of bucket since epoch
+        :raise ValueError: if timestamp is malformed
+        """
+
+        if len(time_local) != TIME_LOCAL_LENGTH:
+            raise ValueError(f"Wrong $time_local: {time_local!r}")
+
+        date = time_local[:11]
+        if date != self.cached_date:
+            try:
+                self.cached_day_seconds = self.parse_date(date=date)
+            except (KeyError, UnicodeDecodeError) as error:
+                raise ValueError(f"Wrong $time_local: {time_local!r}") from error
+            self.cached_date = date
+
+        seconds = (
+            self.cached_day_seconds
+            + int(time_local[12:14]) * 3600
+            + int(time_local[15:17]) * 60
+            + int(time_local[18:20])
+        )
+
+        return seconds // self.bucket_seconds
+
+
+def make_time_series(
+        bucket_stats: Dict[int, List],
+        bucket_seconds: int,
+        num_signs: int
+) -> Dict[str, Union[int, List[Union[int, float]]]]:
+
+    """
+    Makes compact time series of url for report: only buckets with requests are kept, each with
+    its offset from the first bucket of url, so that lines with outlier $time_local don't make series longer
+    :param bucket_stats: [count, time sum, quantile estimator] by bucket number
+    :param bucket_seconds: length of bucket in seconds
+    :param num_signs: number of decimal signs of time values
+    :return: start (local time in seconds since epoch), step in seconds, bucket offsets from start
+    in ascending order, counts, time sums and medians of these buckets
+    """
+
+    first_bucket = min(bucket_stats)
+    offsets = list()
+    counts = list()
+    time_sums = list()
+    time_medians = list()
+    for bucket in sorted(bucket_stats):
+        count, time_sum, time_estimator = bucket_stats[bucket]
+        offsets.append(bucket - first_bucket)
+        counts.append(count)
+        time_sums.append(round(time_sum, num_signs))
+        time_medians.append(round(time_estimator.quantile(0.5), num_signs))
+
+    return {
+        "start": first_bucket * bucket_seconds,
+        "step": bucket_seconds,
+        "offset": offsets,
+        "count": counts,
+        "time_sum": time_sums,
+        "time_med": time_medians
+    }
+
+
+def get_time_bucket_seconds(time_buckets: Optional[str]) -> Optional[int]:
+
+    """
+    Gets length of time bucket
+    :param time_buckets: TIME_BUCKETS config parameter: "minute", "hour" or None
+    :return: length of bucket in seconds or None if time buckets are disabled
+    """
+
+    if time_buckets is None:
+        return None
+    if time_buckets not in TIME_BUCKET_SECONDS:
+        raise ValueError(f"Unknown time buckets: {time_buckets}")
+
+    return TIME_BUCKET_SECONDS[time_buckets]
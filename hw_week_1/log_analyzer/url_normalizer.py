@@ -0,0 +1,161 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple, Union
+
+NUMERIC_SEGMENT_PATTERN = re.compile(r"^\d+$")
+UUID_SEGMENT_PATTERN = re.compile(r"^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$")
+HASH_SEGMENT_PATTERN = re.compile(r"^(?=.*\d)[0-9a-fA-F]{16,}$")
+
+DEFAULT_CACHE_SIZE = 100_000
+
+
+class UrlNormalizationRules(NamedTuple):
+
+    """
+    Class with rules of url normalization such as:
+    - query: "keep" query string, "strip" it or keep only "keys" of parameters
+    - numeric_ids: replace numeric path segments with {id}
+    - uuids: replace uuid path segments with {uuid}
+    - hashes: replace hex hash path segments (16+ hex digits) with {hash}
+    - rewrites: (regular expression, replacement) pairs applied to raw url one after another
+    - cache_size: number of raw urls with memoized normalized url
+    """
+
+    query: str = "keep"
+    numeric_ids: bool = False
+    uuids: bool = False
+    hashes: bool = False
+    rewrites: Tuple[Tuple[str, str], ...] = ()
+    cache_size: int = DEFAULT_CACHE_SIZE
+
+    @property
+    def is_enabled(self) -> bool:
+
+        """
+        Checks if any rule changes urls
+        """
+
+        return self.query != "keep" or self.numeric_ids or self.uuids or self.hashes or bool(self.rewrites)
+
+
+def get_url_normalization_rules(raw_rules: Dict[str, Union[str, bool, int, list]]) -> UrlNormalizationRules:
+
+    """
+    Makes url normalization rules from config
+    :param raw_rules: URL_NORMALIZATION config parameter
+    :return: url normalization rules
+    """
+
+    rules = UrlNormalizationRules(**{key.lower(): value for key, value in raw_rules.items()})
+    if rules.query not in ("keep", "strip", "keys"):
+        raise ValueError(f"Unknown query normalization: {rules.query}")
+
+    return rules._replace(rewrites=tuple(tuple(rewrite) for rewrite in rules.rewrites))
+
+
+class UrlNormalizer:
+
+    """
+    Collapses high-cardinality urls into templates, e.g. /api/v2/banner/25019354 -> /api/v2/banner/{id}.
+    Normalized urls are memoized in bounded LRU cache, so repeated raw urls are normalized once
+    """
+
+    def __init__(self, rules: UrlNormalizationRules):
+        self.rules = rules
+        self.rewrites = [(re.compile(pattern), replacement) for pattern, replacement in rules.rewrites]
+        self.segment_patterns = list()
+        if rules.numeric_ids:
+            self.segment_patterns.append((NUMERIC_SEGMENT_PATTERN, "{id}"))
+        if rules.uuids:
+            self.segment_patterns.append((UUID_SEGMENT_PATTERN, "{uuid}"))
+        if rules.hashes:
+            self.segment_patterns.append((HASH_SEGMENT_PATTERN, "{hash}"))
+        self.normalize = lru_cache(maxsize=rules.cache_size)(self._normalize)
+
+    def _normalize_segment(self, segment: str) -> str:
+
+        """
+        Replaces path segment with placeholder if it is id, uuid or hash
+        :param segment: path segment
+        :return: normalized segment
+        """
+
+        for pattern, placeholder in self.segment_patterns:
+            if pattern.match(segment):
+                return placeholder
+
+        return segment
+
+    def _normalize(self, url: Union[str, bytes]) -> str:
+
+        """
+        Normalizes url by rules
+        :param url: raw url, bytes are decoded as utf-8
+        :return: normalized url
+        """
+
+        if isinstance(url, bytes):
+            url = url.decode("utf-8")
+
+        for pattern, replacement in self.rewrites:
+            url = pattern.sub(replacement, url)
+
+        path, question_mark, query = url.partition("?")
+
+        if self.segment_patterns:
+            path = "/".join(self._normalize_segment(segment) for segment in path.split("/"))
+
+        if self.rules.query == "strip":
+            question_mark, query = "", ""
+        elif self.rules.query == "keys" and query:
+            query = "&".join(
+                f"{parameter.partition('=')[0]}={{value}}" if "=" in parameter else parameter
+                for parameter in query.split("&")
+            )
+
+        return f"{path}{question_mark}{query}"
+
+
+@lru_cache(maxsize=None)
+def make_url_normalizer(rules: UrlNormalizationRules) -> Optional[UrlNormalizer]:
+
+    """
+    Makes url normalizer, one per process for the same rules so that its cache is shared
+    :param rules: url normalization rules
+    :return: url normalizer or None if rules don't change urls
+    """
+
+    if not rules.is_enabled:
+        return None
+
+    return UrlNormalizer(rules=rules)
+
+
+def normalize_urls(
+        parsed_line_gen: Iterable[Tuple[Union[str, bytes, None], Optional[float], bool]],
+        normalizer: UrlNormalizer
+) -> Iterable[Tuple[Optional[str], Optional[float], bool]]:
+
+    """
+    Normalizes urls of parsed lines, line with url that isn't valid utf-8 is failed.
+    Items after url (request time, is failed and time bucket if it is parsed) are passed as they are
+    :param parsed_line_gen: generator of parsed lines result
+    :param normalizer: url normalizer
+    :return: generator of parsed lines result with normalized urls
+    """
+
+    normalize = normalizer.normalize
+
+    for parsed_line in parsed_line_gen:
+        url, _, is_failed = parsed_line[:3]
+        if is_failed:
+            yield parsed_line
+            continue
+        try:
+            normalized_url = normalize(url)
+        except UnicodeDecodeError:
+            logging.error("Failed decoding url: %r", url)
+            yield (None, None, True) + tuple(parsed_line[3:])
+            continue
+        yield (normalized_url,) + tuple(parsed_line[1:])
@@ -0,0 +1,265 @@
+import datetime
+import json
+import os
+import sqlite3
+import sys
+from argparse import ArgumentParser
+from typing import Dict, Iterable, List, NamedTuple, NoReturn, Optional, Tuple, Union
+
+WAREHOUSE_VERSION = 1
+WAREHOUSE_LOCK_TIMEOUT = 60.0
+NUM_SIGNS_FOR_STATS = 3
+
+WAREHOUSE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS days (
+    log_date TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    num_requests INTEGER NOT NULL,
+    num_failures INTEGER NOT NULL,
+    all_requests_time REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS url_days (
+    log_date TEXT NOT NULL REFERENCES days (log_date),
+    url_id INTEGER NOT NULL REFERENCES urls (id),
+    count INTEGER NOT NULL,
+    time_sum REAL NOT NULL,
+    time_max REAL NOT NULL,
+    time_med REAL,
+    PRIMARY KEY (log_date, url_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS url_days_by_url ON url_days (url_id, log_date);
+"""
+
+UrlDayRow = Tuple[str, int, float, float, Optional[float]]
+
+
+class WarehouseError(Exception):
+    pass
+
+
+class DailyTotals(NamedTuple):
+
+    """
+    Class with totals of one day log such as:
+    - log_date: date of log in ISO format, e.g. 2017-06-30
+    - source: log file (or hosts of merged partial aggregates) the day is aggregated from
+    - num_requests: number of parsed lines
+    - num_failures: number of failed lines
+    - all_requests_time: total request time of all lines
+    """
+
+    log_date: str
+    source: str
+    num_requests: int
+    num_failures: int
+    all_requests_time: float
+
+
+def open_warehouse(warehouse_name: str) -> sqlite3.Connection:
+
+    """
+    Opens SQLite database of daily aggregates, creates its tables and indexes if database is new
+    :param warehouse_name: path to database file
+    :return: connection to database
+    :raise WarehouseError: if database is made by another version of analyzer
+    """
+
+    # Backlog mode saves days from several processes, they wait for each other's transactions
+    connection = sqlite3.connect(warehouse_name, timeout=WAREHOUSE_LOCK_TIMEOUT)
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, WAREHOUSE_VERSION):
+        connection.close()
+        raise WarehouseError(f"Unsupported version {version} of warehouse {warehouse_name}")
+    if version == 0:
+        with connection:
+            connection.executescript(WAREHOUSE_SCHEMA)
+            connection.execute(f"PRAGMA user_version = {WAREHOUSE_VERSION}")
+
+    return connection
+
+
+def save_daily_stats(connection: sqlite3.Connection, totals: DailyTotals, url_rows: Iterable[UrlDayRow]) -> int:
+
+    """
+    Saves url aggregates of one day in single transaction, previously saved aggregates of the day are replaced.
+    Urls are kept once in urls table, aggregates refer to them by id
+    :param connection: connection to warehouse
+    :param totals: totals of day log
+    :param url_rows: (url, count, time sum, time max, time median or None) of every url of log
+    :return: number of saved urls
+    """
+
+    url_rows = list(url_rows)
+    with connection:
+        connection.execute("DELETE FROM url_days WHERE log_date = ?", (totals.log_date,))
+        connection.execute(
+            "INSERT OR REPLACE INTO days (log_date, source, num_requests, num_failures, all_requests_time) "
+            "VALUES (?, ?, ?, ?, ?)",
+            totals
+        )
+        connection.executemany("INSERT OR IGNORE INTO urls (url) VALUES (?)", ((row[0],) for row in url_rows))
+        connection.executemany(
+            "INSERT INTO url_days (log_date, url_id, count, time_sum, time_max, time_med) "
+            "SELECT ?, id, ?, ?, ?, ? FROM urls WHERE url = ?",
+            (
+                (totals.log_date, count, time_sum, time_max, time_med, url)
+                for url, count, time_sum, time_max, time_med in url_rows
+            )
+        )
+
+    return len(url_rows)
+
+
+def query_trend(
+        connection: sqlite3.Connection,
+        url: str,
+        date_from: str,
+        date_to: str
+) -> List[Dict[str, Union[int, float, str, None]]]:
+
+    """
+    Gets daily stats of url over date range
+    :param connection: connection to warehouse
+    :param url: url (or url template with URL_NORMALIZATION) as it is in report
+    :param date_from: first date of range in ISO format, inclusive
+    :param date_to: last date of range in ISO format, inclusive
+    :return: rows of days with url requests in date order
+    """
+
+    cursor = connection.execute(
+        "SELECT url_days.log_date, url_days.count, "
+        "100.0 * url_days.count / days.num_requests, url_days.time_sum, "
+        "COALESCE(100.0 * url_days.time_sum / NULLIF(days.all_requests_time, 0), 0), "
+        "url_days.time_sum / url_days.count, "
+        "url_days.time_max, url_days.time_med "
+        "FROM url_days JOIN days ON days.log_date = url_days.log_date "
+        "WHERE url_days.url_id = (SELECT id FROM urls WHERE url = ?) AND url_days.log_date BETWEEN ? AND ? "
+        "ORDER BY url_days.log_date",
+        (url, date_from, date_to)
+    )
+
+    return [
+        {
+            "log_date": log_date,
+            "count": count,
+            "count_perc": round(count_perc, NUM_SIGNS_FOR_STATS),
+            "time_sum": round(time_sum, NUM_SIGNS_FOR_STATS),
+            "time_perc": round(time_perc, NUM_SIGNS_FOR_STATS),
+            "time_avg": round(time_avg, NUM_SIGNS_FOR_STATS),
+            "time_max": round(time_max, NUM_SIGNS_FOR_STATS),
+            "time_med": None if time_med is None else round(time_med, NUM_SIGNS_FOR_STATS)
+        }
+        for log_date, count, count_perc, time_sum, time_perc, time_avg, time_max, time_med in cursor
+    ]
+
+
+def query_top(
+        connection: sqlite3.Connection,
+        date_from: str,
+        date_to: str,
+        size: int
+) -> List[Dict[str, Union[int, float, str]]]:
+
+    """
+    Gets urls with the biggest total request time over date range
+    :param connection: connection to warehouse
+    :param date_from: first date of range in ISO format, inclusive
+    :param date_to: last date of range in ISO format, inclusive
+    :param size: number of urls
+    :return: url stats rows in descending order of total request time
+    """
+
+    num_requests, all_requests_time = connection.execute(
+        "SELECT SUM(num_requests), SUM(all_requests_time) FROM days WHERE log_date BETWEEN ? AND ?",
+        (date_from, date_to)
+    ).fetchone()
+    if not num_requests or not all_requests_time:
+        return list()
+
+    cursor = connection.execute(
+        "SELECT urls.url, top.num_days, top.count, top.time_sum, top.time_max "
+        "FROM ("
+        "SELECT url_id, COUNT(*) AS num_days, SUM(count) AS count, SUM(time_sum) AS time_sum, "
+        "MAX(time_max) AS time_max "
+        "FROM url_days WHERE log_date BETWEEN ? AND ? "
+        "GROUP BY url_id ORDER BY time_sum DESC LIMIT ?"
+        ") AS top JOIN urls ON urls.id = top.url_id "
+        "ORDER BY top.time_sum DESC",
+        (date_from, date_to, size)
+    )
+
+    return [
+        {
+            "url": url,
+            "days": num_days,
+            "count": count,
+            "count_perc": round(100 * count / num_requests, NUM_SIGNS_FOR_STATS),
+            "time_sum": round(time_sum, NUM_SIGNS_FOR_STATS),
+            "time_perc": round(100 * time_sum / all_requests_time, NUM_SIGNS_FOR_STATS),
+            "time_avg": round(time_sum / count, NUM_SIGNS_FOR_STATS),
+            "time_max": round(time_max, NUM_SIGNS_FOR_STATS)
+        }
+        for url, num_days, count, time_sum, time_max in cursor
+    ]
+
+
+def format_table(rows: List[Dict[str, Union[int, float, str, None]]]) -> str:
+
+    """
+    Formats query rows as text table with aligned columns
+    :param rows: query rows with the same keys
+    :return: table with header line
+    """
+
+    if not rows:
+        return "No data"
+    columns = list(rows[0])
+    cells = [columns] + [["-" if row[column] is None else str(row[column]) for column in columns] for row in rows]
+    widths = [max(len(line[position]) for line in cells) for position in range(len(columns))]
+
+    return "\n".join(
+        "  ".join(cell.ljust(width) for cell, width in zip(line, widths)).rstrip()
+        for line in cells
+    )
+
+
+def main() -> NoReturn:
+    parser = ArgumentParser(description="Queries daily url aggregates saved by log analyzer with WAREHOUSE_DB")
+    parser.add_argument("--db", required=True, help="Path to warehouse database")
+    parser.add_argument("--from", dest="date_from", default="0001-01-01", help="First date, e.g. 2017-06-01")
+    parser.add_argument("--to", dest="date_to", default="9999-12-31", help="Last date, e.g. 2017-06-30")
+    parser.add_argument("--json", action="store_true", help="Print rows as JSON instead of table")
+    queries = parser.add_subparsers(dest="query", required=True)
+    trend_parser = queries.add_parser("trend", help="Daily stats of url")
+    trend_parser.add_argument("url", help="Url as it is in report")
+    top_parser = queries.add_parser("top", help="Urls with the biggest total request time over date range")
+    top_parser.add_argument("--size", type=int, default=10, help="Number of urls")
+    args = parser.parse_args()
+
+    for date in (args.date_from, args.date_to):
+        try:
+            datetime.date.fromisoformat(date)
+        except ValueError:
+            parser.error(f"Wrong date {date}, dates are expected in ISO format, e.g. 2017-06-30")
+    if not os.path.isfile(args.db):
+        parser.error(f"There is no warehouse {args.db}")
+
+    connection = open_warehouse(warehouse_name=args.db)
+    try:
+        if args.query == "trend":
+            rows = query_trend(connection=connection, url=args.url, date_from=args.date_from, date_to=args.date_to)
+        else:
+            rows = query_top(connection=connection, date_from=args.date_from, date_to=args.date_to, size=args.size)
+    finally:
+        connection.close()
+
+    sys.stdout.write(json.dumps(rows, indent=2) if args.json else format_table(rows=rows))
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import hashlib
+import json
+import time
+from http.client import HTTPConnection
+from multiprocessing import Pool
+from optparse import OptionParser
+from server import HOST, PORT, SALT
+
+CLIENTS = 8
+DURATION = 10
+
+ACCOUNT = "horns&hoofs"
+LOGIN = "h&f"
+REQUEST = {
+    "account": ACCOUNT,
+    "login": LOGIN,
+    "method": "online_score",
+    "token": hashlib.sha512((ACCOUNT + LOGIN + SALT).encode('utf-8')).hexdigest(),
+    "arguments": {"phone": "79175002040", "email": "stupnikov@otus.ru", "first_name": "Стансилав",
+                  "last_name": "Ступников", "birthday": "01.01.1990", "gender": 1},
+}
+HEADERS = {"Content-type": "application/json"}
+
+
+def run_client(args):
+    """Sends online_score requests one after another for duration seconds, every request on new connection
+    as server closes it after response. Returns number of requests, number of errors and latencies"""
+    port, duration = args
+    body = json.dumps(REQUEST)
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        conn = HTTPConnection(HOST, port, timeout=10)
+        try:
+            conn.request("POST", "/method/", body, HEADERS)
+            r = conn.getresponse()
+            if json.load(r).get("code") != 200:
+                errors += 1
+        except OSError:
+            errors += 1
+        finally:
+            conn.close()
+        latencies.append(time.monotonic() - started)
+    return len(latencies), errors, latencies
+
+
+if __name__ == "__main__":
+    op = OptionParser(description="Measures throughput of online_score of running server")
+    op.add_option("-p", "--port", action="store", type=int, default=PORT)
+    op.add_option("-c", "--clients", action="store", type=int, default=CLIENTS,
+                  help="number of client processes sending requests concurrently")
+    op.add_option("-d", "--duration", action="store", type=float, default=DURATION, help="seconds of load")
+    (opts, args) = op.parse_args()
+    with Pool(opts.clients) as pool:
+        results = pool.map(run_client, [(opts.port, opts.duration)] * opts.clients)
+    requests = sum(result[0] for result in results)
+    errors = sum(result[1] for result in results)
+    latencies = sorted(latency for result in results for latency in result[2])
+    print(f"requests: {requests}, errors: {errors}")
+    print(f"throughput: {requests / opts.duration:.1f} req/s")
+    if latencies:
+        print(f"latency p50: {1000 * latencies[len(latencies) // 2]:.2f} ms, "
+              f"p99: {1000 * latencies[int(len(latencies) * 0.99)]:.2f} ms")
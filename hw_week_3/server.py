@@ -2,8 +2,14 @@
 # -*- coding: utf-8 -*-
 import json
 import logging
+import os
+import signal
+import socket
+import threading
+import time
 import uuid
 import redis
+from concurrent.futures import ThreadPoolExecutor
 from optparse import OptionParser
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from api import method_handler
@@ -11,6 +17,14 @@ from store import Store
 
 HOST = "localhost"
 PORT = 8080
+# 0 workers serve in the current process, 0 threads handle requests in the accepting thread
+WORKERS = 0
+THREADS = 0
+# Seconds given to workers to finish requests in flight on shutdown before they are killed
+SHUTDOWN_TIMEOUT = 10
+# Worker that dies sooner than MIN_WORKER_LIFETIME after start is restarted after RESTART_DELAY
+MIN_WORKER_LIFETIME = 1.0
+RESTART_DELAY = 1.0
 
 SALT = "Otus"
 ADMIN_LOGIN = "admin"
@@ -87,17 +101,168 @@ class MainHTTPHandler(BaseHTTPRequestHandler):
         return
 
 
+class ScoringHTTPServer(HTTPServer):
+    """HTTP server of scoring API. Socket bound with SO_REUSEPORT lets every worker process
+    have its own listening socket on the same port, and kernel balances connections between them"""
+
+    supervisor_pid = None
+
+    def __init__(self, server_address, handler_class, reuse_port=False):
+        self.reuse_port = reuse_port
+        super().__init__(server_address, handler_class)
+
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+
+    def service_actions(self):
+        # Worker left by killed supervisor is adopted by another process and stops serving
+        if self.supervisor_pid is not None and os.getppid() != self.supervisor_pid:
+            logging.info("Supervisor %s is gone, worker %s stops" % (self.supervisor_pid, os.getpid()))
+            self.supervisor_pid = None
+            threading.Thread(target=self.shutdown).start()
+
+
+class ThreadPoolHTTPServer(ScoringHTTPServer):
+    """HTTP server handling requests in fixed pool of threads. Accepting stops while all threads are busy,
+    so that waiting connections stay in the kernel queue of the socket"""
+
+    def __init__(self, server_address, handler_class, threads, reuse_port=False):
+        self.pool = ThreadPoolExecutor(max_workers=threads)
+        self.free_threads = threading.BoundedSemaphore(threads)
+        super().__init__(server_address, handler_class, reuse_port)
+
+    def process_request(self, request, client_address):
+        self.free_threads.acquire()
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.free_threads.release()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+def make_server(port, threads, reuse_port=False):
+    if threads > 0:
+        return ThreadPoolHTTPServer((HOST, port), MainHTTPHandler, threads, reuse_port)
+    return ScoringHTTPServer((HOST, port), MainHTTPHandler, reuse_port)
+
+
+def serve(server):
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+def run_worker(port, threads, supervisor_pid):
+    """Serves in forked worker until SIGTERM, then finishes requests in flight and exits"""
+    # Supervisor stops workers itself, Ctrl-C sent to the whole process group is ignored
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Connections to redis are not shared with supervisor and other workers
+    MainHTTPHandler.store = Store()
+    server = make_server(port, threads, reuse_port=True)
+    server.supervisor_pid = supervisor_pid
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    logging.info("Worker %s is serving at %s" % (os.getpid(), port))
+    serve(server)
+    logging.info("Worker %s stopped" % os.getpid())
+
+
+def start_worker(port, threads):
+    supervisor_pid = os.getpid()
+    pid = os.fork()
+    if pid == 0:
+        # Handlers of supervisor are not run in worker, SIGTERM kills worker until it is serving
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGALRM, signal.SIG_DFL)
+        code = 0
+        try:
+            run_worker(port, threads, supervisor_pid)
+        except Exception as e:
+            logging.exception("Worker %s failed: %s" % (os.getpid(), e))
+            code = 1
+        finally:
+            logging.shutdown()
+            os._exit(code)
+    return pid
+
+
+def signal_workers(pids, signum):
+    for pid in pids:
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+
+def supervise(port, workers, threads):
+    """Pre-forks workers accepting on their own SO_REUSEPORT sockets and restarts dead ones.
+    SIGTERM or SIGINT stops workers gracefully, workers that are not done in SHUTDOWN_TIMEOUT are killed"""
+    # Port taken by another server fails here rather than in every restarted worker
+    make_server(port, 0, reuse_port=True).server_close()
+    started_at = {}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        if stopping:
+            return
+        stopping = True
+        logging.info("Stopping %s workers" % len(started_at))
+        signal_workers(started_at, signal.SIGTERM)
+        signal.alarm(SHUTDOWN_TIMEOUT)
+
+    def kill(signum, frame):
+        logging.info("Killing %s workers not stopped in %s seconds" % (len(started_at), SHUTDOWN_TIMEOUT))
+        signal_workers(started_at, signal.SIGKILL)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGALRM, kill)
+    for _ in range(workers):
+        started_at[start_worker(port, threads)] = time.monotonic()
+    logging.info("Starting server at %s with %s workers" % (port, workers))
+
+    while started_at:
+        pid, status = os.wait()
+        lifetime = time.monotonic() - started_at.pop(pid)
+        if stopping:
+            continue
+        code = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        logging.error("Worker %s exited with code %s, restarting" % (pid, code))
+        if lifetime < MIN_WORKER_LIFETIME:
+            time.sleep(RESTART_DELAY)
+        if not stopping:
+            started_at[start_worker(port, threads)] = time.monotonic()
+    signal.alarm(0)
+    logging.info("Server stopped")
+
+
 if __name__ == "__main__":
     op = OptionParser()
     op.add_option("-p", "--port", action="store", type=int, default=PORT)
     op.add_option("-l", "--log", action="store", default=None)
+    op.add_option("-w", "--workers", action="store", type=int, default=WORKERS,
+                  help="number of pre-forked worker processes, 0 serves in the current process")
+    op.add_option("-t", "--threads", action="store", type=int, default=THREADS,
+                  help="size of thread pool of every worker, 0 handles requests in the accepting thread")
     (opts, args) = op.parse_args()
     logging.basicConfig(filename=opts.log, level=logging.INFO,
-                        format='[%(asctime)s] %(levelname).1s %(message)s', datefmt='%Y.%m.%d %H:%M:%S')
-    server = HTTPServer((HOST, opts.port), MainHTTPHandler)
-    logging.info("Starting server at %s" % opts.port)
-    try:
-        server.serve_forever()
-    except KeyboardInterrupt:
-        pass
-    server.server_close()
+                        format='[%(asctime)s] %(process)d %(levelname).1s %(message)s', datefmt='%Y.%m.%d %H:%M:%S')
+    if opts.workers > 0:
+        supervise(opts.port, opts.workers, opts.threads)
+    else:
+        server = make_server(opts.port, opts.threads)
+        logging.info("Starting server at %s" % opts.port)
+        serve(server)
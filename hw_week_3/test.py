@@ -115,11 +115,19 @@ class TestFields(unittest.TestCase):
                                               ) is None)
 
 
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+from time import monotonic
+from unittest import mock
 from server import HOST, PORT
 from threading import Thread
 from http.server import HTTPServer
 from http.client import HTTPConnection
-from server import MainHTTPHandler
+from server import MainHTTPHandler, ScoringHTTPServer, ThreadPoolHTTPServer, start_worker
 
 
 class TestHTTP(unittest.TestCase):
@@ -274,6 +282,148 @@ class TestHTTP(unittest.TestCase):
             self.assertEqual(type(value), list)
 
 
+SLOW_REQUEST_TIME = 0.5
+
+
+def slow_method_handler(request, ctx, store):
+    sleep(SLOW_REQUEST_TIME)
+    return 200, {"slept": SLOW_REQUEST_TIME}
+
+
+class SlowHTTPHandler(MainHTTPHandler):
+    router = {
+        "method": slow_method_handler,
+    }
+
+
+def post(port, request):
+    conn = HTTPConnection(HOST, port, timeout=10)
+    try:
+        conn.request("POST", "/method/", json.dumps(request), {"Content-type": "application/json"})
+        return json.load(conn.getresponse())
+    finally:
+        conn.close()
+
+
+def wait_for(condition, timeout=10):
+    deadline = monotonic() + timeout
+    while monotonic() < deadline:
+        result = condition()
+        if result:
+            return result
+        sleep(0.1)
+    raise AssertionError("Condition is not met in %s seconds" % timeout)
+
+
+def is_serving(port):
+    try:
+        socket.create_connection((HOST, port), timeout=1).close()
+    except OSError:
+        return False
+    return True
+
+
+def read_log(log_name):
+    if not os.path.exists(log_name):
+        return ""
+    with open(log_name, encoding="utf-8") as log_file:
+        return log_file.read()
+
+
+def serving_worker_pids(log_name):
+    return [int(line.split("Worker ")[1].split()[0]) for line in read_log(log_name).splitlines()
+            if " is serving at " in line]
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    return True
+
+
+class TestServing(unittest.TestCase):
+    port = TEST_PORT + 1
+
+    def test_thread_pool_handles_requests_concurrently(self):
+        server = ThreadPoolHTTPServer((HOST, self.port), SlowHTTPHandler, 4)
+        thread = Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            responses = []
+            clients = [Thread(target=lambda: responses.append(post(self.port, {"slow": True}))) for _ in range(4)]
+            started = monotonic()
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+            elapsed = monotonic() - started
+        finally:
+            server.shutdown()
+            server.server_close()
+            thread.join()
+        self.assertEqual([200] * 4, [response["code"] for response in responses])
+        self.assertLess(elapsed, 2 * SLOW_REQUEST_TIME)
+
+    def test_reuse_port_sockets_share_port(self):
+        first = ScoringHTTPServer((HOST, self.port), MainHTTPHandler, reuse_port=True)
+        try:
+            second = ScoringHTTPServer((HOST, self.port), MainHTTPHandler, reuse_port=True)
+            second.server_close()
+            with self.assertRaises(OSError):
+                ScoringHTTPServer((HOST, self.port), MainHTTPHandler)
+        finally:
+            first.server_close()
+
+    def test_worker_finishes_request_on_sigterm(self):
+        with mock.patch.object(MainHTTPHandler, "router", SlowHTTPHandler.router):
+            pid = start_worker(self.port, 2)
+        try:
+            wait_for(lambda: is_serving(self.port))
+            responses = []
+            client = Thread(target=lambda: responses.append(post(self.port, {"slow": True})))
+            client.start()
+            sleep(SLOW_REQUEST_TIME / 2)
+            os.kill(pid, signal.SIGTERM)
+            client.join()
+            _, status = os.waitpid(pid, 0)
+        except BaseException:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            raise
+        self.assertEqual([200], [response["code"] for response in responses])
+        self.assertTrue(os.WIFEXITED(status))
+        self.assertEqual(0, os.WEXITSTATUS(status))
+        self.assertFalse(is_serving(self.port))
+
+    def test_supervisor_restarts_dead_worker_and_stops_on_sigterm(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_name = os.path.join(log_dir, "server.log")
+            supervisor = subprocess.Popen(
+                [sys.executable, "server.py", "-p", str(self.port), "-w", "2", "-l", log_name],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL
+            )
+            try:
+                workers = wait_for(lambda: len(serving_worker_pids(log_name)) == 2 and serving_worker_pids(log_name))
+                os.kill(workers[0], signal.SIGKILL)
+                all_workers = wait_for(
+                    lambda: len(serving_worker_pids(log_name)) == 3 and serving_worker_pids(log_name)
+                )
+                self.assertIn("Worker %s exited with code -9, restarting" % workers[0], read_log(log_name))
+                self.assertIn("code", post(self.port, {"account": "horns&hoofs"}))
+
+                supervisor.send_signal(signal.SIGTERM)
+                self.assertEqual(0, supervisor.wait(timeout=10))
+            finally:
+                if supervisor.poll() is None:
+                    supervisor.kill()
+                    supervisor.wait()
+            self.assertIn("Server stopped", read_log(log_name))
+            self.assertEqual([], [pid for pid in all_workers if is_alive(pid)])
+
+
 class TestStore(unittest.TestCase):
     store = Store()
 